@@ -0,0 +1,158 @@
+"""Loan EMIs, repayment schedules and outstanding balances as array math.
+
+Every function takes scalars or equal-length arrays (one entry per loan),
+so the whole approved portfolio is priced in a handful of NumPy operations
+instead of a Python loop per loan and installment. Installment ``k`` (from
+0) of a loan falls due ``k`` months after its application date, like the
+schedule shown on the EMI page.
+"""
+import os
+import numpy as np
+import pandas as pd
+from tables import loans_table
+from summaries import loan_payments
+
+# Terms for loans that don't carry their own interest_rate / tenure_months
+DEFAULT_ANNUAL_RATE = float(os.environ.get("BANK_LOAN_RATE", "10"))
+DEFAULT_TENURE_MONTHS = int(os.environ.get("BANK_LOAN_TENURE_MONTHS", "12"))
+
+
+def loan_terms(loans):
+    """``(principal, annual rate %, tenure months)`` arrays for ``loans``, defaults filled in."""
+    def column(name, default):
+        if name not in loans.columns:
+            return np.full(len(loans), default, dtype=float)
+        return pd.to_numeric(loans[name], errors="coerce").fillna(default).to_numpy(dtype=float)
+
+    principal = pd.to_numeric(loans["amount"], errors="coerce").fillna(0).to_numpy(dtype=float)
+    return principal, column("interest_rate", DEFAULT_ANNUAL_RATE), column("tenure_months", DEFAULT_TENURE_MONTHS).astype(int)
+
+
+def emi(principal, annual_rate, tenure_months):
+    """Equal monthly installment; a 0% loan is just principal / tenure."""
+    principal, rate, n = np.broadcast_arrays(np.asarray(principal, float), np.asarray(annual_rate, float) / 1200,
+                                             np.maximum(np.asarray(tenure_months, float), 1))
+    growth = (1 + rate) ** n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payment = np.where(rate > 0, principal * rate * growth / (growth - 1), principal / n)
+    return np.round(payment, 2)
+
+
+def balance_after(principal, annual_rate, tenure_months, payments):
+    """Principal still owed after ``payments`` installments (0 once the loan is repaid)."""
+    principal, rate, n, k = np.broadcast_arrays(np.asarray(principal, float), np.asarray(annual_rate, float) / 1200,
+                                                np.asarray(tenure_months, float), np.asarray(payments, float))
+    k = np.clip(k, 0, n)
+    installment = emi(principal, annual_rate, tenure_months)
+    growth = (1 + rate) ** k
+    with np.errstate(divide="ignore", invalid="ignore"):
+        owed = np.where(rate > 0, principal * growth - installment * (growth - 1) / rate, principal - installment * k)
+    return np.where(k >= n, 0.0, np.maximum(owed, 0.0))
+
+
+def _calendar(start):
+    # Months since 1970-01 and zero-based day of month, as plain integers
+    dates = pd.DatetimeIndex(start)
+    return ((dates.year - 1970) * 12 + dates.month - 1).to_numpy(), (dates.day - 1).to_numpy()
+
+
+def _due_days(month, day, installments):
+    # Days since the epoch; datetime64 month arithmetic is slow, so the first
+    # day of every month in range comes from one small lookup table
+    month = month + np.asarray(installments, dtype=int)
+    lo = int(month.min()) if month.size else 0
+    firsts = np.arange(lo, (int(month.max()) if month.size else 0) + 2).astype("datetime64[M]").astype("datetime64[D]").astype(int)
+    first = firsts[month - lo]
+    return first + np.minimum(day, firsts[month - lo + 1] - first - 1)
+
+
+def due_dates(start, installments):
+    """Due date of installment ``installments`` for loans applied for on ``start``.
+
+    Months are added like ``pd.DateOffset``: the 31st falls back to the last
+    day of shorter months.
+    """
+    month, day = _calendar(np.atleast_1d(start))
+    return _due_days(month, day, installments).astype("datetime64[D]")
+
+
+def schedule(principal, annual_rate, tenure_months, start, paid=0):
+    """Full principal/interest schedule of one loan, one row per installment."""
+    n = int(tenure_months)
+    k = np.arange(n)
+    installment = float(emi(principal, annual_rate, n))
+    opening = balance_after(principal, annual_rate, n, k)
+    interest = np.round(opening * annual_rate / 1200, 2)
+    # Whole cents throughout, and the last installment clears whatever rounding left over
+    principal_part = np.round(np.minimum(installment - interest, opening), 2)
+    if n:
+        principal_part[-1] = round(float(principal) - principal_part[:-1].sum(), 2)
+    return pd.DataFrame({
+        "Installment #": k + 1,
+        "Due Date": pd.to_datetime(due_dates(pd.Timestamp(start), k)).date,
+        "EMI Amount": installment,
+        "Principal": principal_part,
+        "Interest": interest,
+        "Balance": np.maximum(np.round(float(principal) - np.cumsum(principal_part), 2), 0),
+        "Status": np.where(k < paid, "Paid", np.where(k == paid, "Due", "Upcoming")),
+    })
+
+
+def portfolio(loans=None, today=None, horizon_days=30):
+    """Outstanding balances and expected inflows across approved loans.
+
+    Returns ``(totals, per_loan)``: ``totals`` is a dict of portfolio-wide
+    figures, ``per_loan`` has one row per approved loan with its EMI, EMIs
+    paid, outstanding principal, overdue installments and what falls due in
+    the next ``horizon_days``.
+    """
+    if loans is None:
+        loans = loans_table.rows("status", "approved")
+    today = np.datetime64(pd.Timestamp(pd.Timestamp.today() if today is None else today).date(), "D")
+    horizon = today + np.timedelta64(horizon_days, "D")
+
+    principal, rate, n = loan_terms(loans)
+    paid = np.minimum(loan_payments.counts(loans["user_id"], loans["loan_id"]), n)
+    installment = emi(principal, rate, n)
+    outstanding = balance_after(principal, rate, n, paid)
+
+    start = pd.to_datetime(loans["application_date"], errors="coerce")
+    known = start.notna().to_numpy()
+    month, day = _calendar(start.fillna(pd.Timestamp(today)))
+    today_month, today_day = _calendar([today])
+    today, horizon = int(today.astype(int)), int(horizon.astype(int))
+    # Installments due by today: one per month since the start month, plus this month's once its day has come
+    months = today_month[0] - month
+    due_now = np.clip(months + (_due_days(month, day, months) <= today), 0, n) * known
+    overdue = np.maximum(due_now - paid, 0)
+
+    # A due date comes at least 28 days after the previous one
+    upcoming = np.zeros(len(loans))
+    for step in range(horizon_days // 28 + 1):
+        k = due_now + step
+        when = _due_days(month, day, k)
+        falls_due = known & (k < n) & (k >= paid) & (when > today) & (when <= horizon)
+        upcoming += np.where(falls_due, installment, 0.0)
+
+    per_loan = loans[[col for col in ("loan_id", "user_id", "purpose") if col in loans.columns]].reset_index(drop=True)
+    per_loan = per_loan.assign(**{
+        "principal": principal,
+        "interest_rate": rate,
+        "tenure_months": n,
+        "emi": installment,
+        "emis_paid": paid,
+        "outstanding": np.round(outstanding, 2),
+        "overdue_emis": overdue,
+        "overdue_amount": np.round(overdue * installment, 2),
+        f"due_next_{horizon_days}_days": np.round(upcoming, 2),
+    })
+    totals = {
+        "loans": len(per_loan),
+        "principal": float(principal.sum()),
+        "outstanding": float(outstanding.sum()),
+        "monthly_inflow": float(installment[paid < n].sum()),
+        "due_next_days": float(upcoming.sum()),
+        "overdue_amount": float((overdue * installment).sum()),
+        "overdue_loans": int((overdue > 0).sum()),
+    }
+    return totals, per_loan
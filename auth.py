@@ -0,0 +1,271 @@
+"""Password hashing, login checks, login rate limits and session tokens.
+
+Passwords are stored as ``pbkdf2_sha256$<iterations>$<salt>$<hash>``. Rows
+still holding a plaintext password keep working: they're upgraded to a hash
+the next time that user logs in, or all at once with
+
+    python auth.py hash-passwords
+"""
+import os
+import hmac
+import time
+import base64
+import hashlib
+import secrets
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from tables import TableView, users_table
+
+# PBKDF2 rounds for new hashes; stored hashes keep the count they were made with
+# and are rehashed at the next login when it's lower
+PASSWORD_ITERATIONS = int(os.environ.get("BANK_PASSWORD_ITERATIONS", "200000"))
+HASH_SCHEME = "pbkdf2_sha256"
+
+# Login attempts allowed per username and per client address within the window
+LOGIN_ATTEMPTS_PER_USER = int(os.environ.get("BANK_LOGIN_ATTEMPTS_PER_USER", "5"))
+LOGIN_ATTEMPTS_PER_IP = int(os.environ.get("BANK_LOGIN_ATTEMPTS_PER_IP", "20"))
+LOGIN_WINDOW_SECONDS = float(os.environ.get("BANK_LOGIN_WINDOW_SECONDS", "300"))
+
+# Signed-in sessions last this long without logging in again
+SESSION_SECONDS = float(os.environ.get("BANK_SESSION_SECONDS", str(8 * 3600)))
+
+
+# Hashing
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password, iterations=None):
+    iterations = iterations or PASSWORD_ITERATIONS
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", str(password).encode(), salt, iterations)
+    return f"{HASH_SCHEME}${iterations}${_b64(salt)}${_b64(digest)}"
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and stored.startswith(HASH_SCHEME + "$")
+
+
+def verify_password(password, stored):
+    """``(matches, needs_rehash)``; plaintext entries match by constant-time comparison and always need a rehash."""
+    if stored is None or pd.isna(stored):
+        return False, False
+    if not is_hashed(stored):
+        return hmac.compare_digest(str(password).encode(), str(stored).encode()), True
+    try:
+        _, iterations, salt, digest = stored.split("$")
+        iterations = int(iterations)
+        expected = _unb64(digest)
+        actual = hashlib.pbkdf2_hmac("sha256", str(password).encode(), _unb64(salt), iterations)
+    except ValueError:
+        return False, False
+    matches = hmac.compare_digest(actual, expected)
+    return matches, matches and iterations < PASSWORD_ITERATIONS
+
+
+# Username index
+class Credentials(TableView):
+    """``{username: (user_id, role, stored password)}``, kept in step with the users table.
+
+    The first row wins if a username appears more than once.
+    """
+
+    def __init__(self, table):
+        super().__init__(table)
+        self._users = {}
+
+    def build(self, df):
+        self._users = {}
+        self._apply_rows(df)
+
+    def _apply_rows(self, rows):
+        for username, user_id, role, stored in zip(rows["username"].tolist(), rows["user_id"].tolist(),
+                                                   rows["role"].tolist(), rows["password"].tolist()):
+            if username not in self._users:
+                self._users[username] = (user_id, role, stored)
+
+    def inserted(self, rows):
+        self._apply_rows(rows)
+
+    def updated(self, before, after):
+        for username, user_id in zip(before["username"].tolist(), before["user_id"].tolist()):
+            if self._users.get(username, (None,))[0] == user_id:
+                del self._users[username]
+        self._apply_rows(after)
+
+    def get(self, username):
+        with self.table._lock:
+            self.ensure()
+            return self._users.get(username)
+
+
+# Rate limiting
+class RateLimiter:
+    """Sliding-window limit of ``limit`` events per ``window`` seconds for each key."""
+
+    def __init__(self, limit, window, max_keys=10_000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        events = self._events.get(key)
+        if events is None:
+            return deque()
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        if not events:
+            del self._events[key]
+        return events
+
+    def retry_after(self, key):
+        """Seconds until ``key`` may try again; 0 if it may now."""
+        now = time.monotonic()
+        with self._lock:
+            events = self._recent(key, now)
+            return max(0.0, events[0] + self.window - now) if len(events) >= self.limit else 0.0
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._events) >= self.max_keys:
+                # A flood of distinct keys: drop every key with nothing left in its window
+                for stale in list(self._events):
+                    self._recent(stale, now)
+            self._recent(key, now)
+            self._events.setdefault(key, deque()).append(now)
+
+    def clear(self, key):
+        with self._lock:
+            self._events.pop(key, None)
+
+    def release(self, key):
+        """Take back one hit on ``key``, for an attempt that turned out not to count."""
+        with self._lock:
+            events = self._events.get(key)
+            if events:
+                events.pop()
+                if not events:
+                    del self._events[key]
+
+
+# Session tokens
+class SessionTokens:
+    """Tokens for signed-in sessions, so a rerun doesn't verify the password again.
+
+    A token stops working when it expires, on logout, or once the user's
+    stored password changes (e.g. a reset), in any process.
+    """
+
+    def __init__(self, credentials, seconds=SESSION_SECONDS):
+        self.credentials = credentials
+        self.seconds = seconds
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def issue(self, username):
+        token = secrets.token_urlsafe(32)
+        user_id, role, stored = self.credentials.get(username)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = {t: s for t, s in self._tokens.items() if s[2] > now}
+            self._tokens[token] = (username, stored, now + self.seconds)
+        return token
+
+    def user(self, token):
+        """The signed-in user for ``token`` as ``{"user_id", "username", "role"}``, or None."""
+        with self._lock:
+            session = self._tokens.get(token)
+        if session is None:
+            return None
+        username, stamp, expires = session
+        current = self.credentials.get(username)
+        if time.monotonic() >= expires or current is None or current[2] != stamp:
+            self.revoke(token)
+            return None
+        return {"user_id": current[0], "username": username, "role": current[1]}
+
+    def revoke(self, token):
+        with self._lock:
+            self._tokens.pop(token, None)
+
+
+credentials = Credentials(users_table)
+sessions = SessionTokens(credentials)
+user_attempts = RateLimiter(LOGIN_ATTEMPTS_PER_USER, LOGIN_WINDOW_SECONDS)
+ip_attempts = RateLimiter(LOGIN_ATTEMPTS_PER_IP, LOGIN_WINDOW_SECONDS)
+
+
+class LoginError(ValueError):
+    """A login that was turned away; the message is shown to the user."""
+
+
+def login(username, password, ip=None):
+    """Check a username and password; returns a session token or raises LoginError.
+
+    Over-limit attempts are turned away before any hashing is done. Every
+    attempt counts against the username until one succeeds. Only failed
+    ones count against the client address, since many users may sign in
+    from behind one proxy.
+    """
+    limits = [(user_attempts, username)] + ([(ip_attempts, ip)] if ip else [])
+    wait = max(limiter.retry_after(key) for limiter, key in limits)
+    if wait:
+        raise LoginError(f"Too many login attempts. Try again in {int(wait) + 1} seconds.")
+    for limiter, key in limits:
+        limiter.hit(key)
+
+    entry = credentials.get(username)
+    if entry is None:
+        # Hash anyway, so unknown usernames take as long as wrong passwords
+        hashlib.pbkdf2_hmac("sha256", str(password).encode(), b"unknown user", PASSWORD_ITERATIONS)
+        raise LoginError("Invalid username or password")
+    matches, needs_rehash = verify_password(password, entry[2])
+    if not matches:
+        raise LoginError("Invalid username or password")
+    user_attempts.clear(username)
+    if ip:
+        ip_attempts.release(ip)
+    if needs_rehash:
+        users_table.update("username", username, {"password": hash_password(password)})
+    return sessions.issue(username)
+
+
+def set_password(username, password):
+    """Store a new password for ``username``; sessions signed in with the old one end."""
+    users_table.update("username", username, {"password": hash_password(password)})
+
+
+def hash_plaintext_passwords(workers=None):
+    """Replace every plaintext password in the users table with its hash; returns how many were hashed."""
+    users = users_table.load()
+    plain = users[~users["password"].map(is_hashed) & users["password"].notna()]
+    if plain.empty:
+        return 0
+    # hashlib releases the GIL while it hashes, so threads use every core
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        hashes = list(pool.map(hash_password, plain["password"].astype(str).tolist()))
+    users_table.update_many("user_id", pd.DataFrame({"user_id": plain["user_id"].to_numpy(), "password": hashes}))
+    return len(hashes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("hash-passwords", help="hash every plaintext password in the users table")
+    args = parser.parse_args()
+    if args.command == "hash-passwords":
+        print(f"{hash_plaintext_passwords():,} plaintext password(s) hashed")
+
+
+if __name__ == "__main__":
+    main()
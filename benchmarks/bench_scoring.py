@@ -0,0 +1,100 @@
+"""Throughput of pending-loan auto-decisioning against queue size.
+
+Compares the batch path used by the admin dashboard (one predict_proba call
+plus one bulk update) with the old per-row loop. Run from the repo root:
+
+    python -m benchmarks.bench_scoring --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import score_loans, auto_decisions  # noqa: E402
+from storage import loan_columns  # noqa: E402
+from tables import Table  # noqa: E402
+
+
+def make_loans(n_pending, n_history=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    n = n_pending + n_history
+    amount = rng.integers(1000, 100000, n)
+    income = rng.integers(5000, 50000, n)
+    status = np.where(amount / income < 3, "approved", "declined").astype(object)
+    status[:n_pending] = "pending"
+    return pd.DataFrame({
+        "loan_id": [f"L{i:07d}" for i in range(1, n + 1)],
+        "user_id": rng.integers(1, 10000, n),
+        "amount": amount,
+        "purpose": rng.choice(["Education", "Medical", "Vehicle", "Business", "Personal"], n),
+        "income": income,
+        "status": status,
+        "application_date": "2025-01-01",
+        "remarks": "Awaiting review",
+    })
+
+
+def train(loans):
+    history = loans[loans["status"] != "pending"]
+    model = LogisticRegression()
+    model.fit(history[["amount", "income"]], (history["status"] == "approved").astype(int))
+    return model
+
+
+# The loop the admin dashboard used to run: one predict_proba and four masked writes per loan
+def legacy_decide(model, loans_df):
+    for _, row in loans_df[loans_df["status"] == "pending"].iterrows():
+        prob = model.predict_proba(pd.DataFrame([[row["amount"], row["income"]]], columns=["amount", "income"]))[0][1]
+        risk_score = round((1 - prob) * 100, 2)
+        loan_id = row["loan_id"]
+        if risk_score <= 39:
+            loans_df.loc[loans_df["loan_id"] == loan_id, "status"] = "approved"
+            loans_df.loc[loans_df["loan_id"] == loan_id, "remarks"] = f"Auto-approved. Predicted Risk Score: {risk_score}%"
+        elif risk_score >= 61:
+            loans_df.loc[loans_df["loan_id"] == loan_id, "status"] = "declined"
+            loans_df.loc[loans_df["loan_id"] == loan_id, "remarks"] = f"Auto-declined. Predicted Risk Score: {risk_score}%"
+
+
+def batch_decide(model, table):
+    pending = table.rows("status", "pending")
+    decisions, _ = auto_decisions(pending, score_loans(model, pending))
+    table.update_many("loan_id", decisions, persist=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=2000, help="largest queue to run the per-row loop on")
+    args = parser.parse_args()
+
+    print(f"{'pending':>10} {'batch s':>10} {'batch loans/s':>15} {'legacy s':>10} {'legacy loans/s':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            loans = make_loans(size)
+            model = train(loans)
+
+            path = os.path.join(tmp, f"loans_{size}.csv")
+            loans.to_csv(path, index=False)
+            table = Table(path, loan_columns, key="loan_id", indexes=["status"])
+            table.load()
+            start = time.perf_counter()
+            batch_decide(model, table)
+            batch = time.perf_counter() - start
+
+            legacy = legacy_rate = "-"
+            if size <= args.legacy_max:
+                start = time.perf_counter()
+                legacy_decide(model, loans.copy())
+                seconds = time.perf_counter() - start
+                legacy, legacy_rate = f"{seconds:.3f}", f"{size / seconds:,.0f}"
+            print(f"{size:>10} {batch:>10.3f} {size / batch:>15,.0f} {legacy:>10} {legacy_rate:>15}")
+
+
+if __name__ == "__main__":
+    main()
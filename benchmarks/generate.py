@@ -0,0 +1,178 @@
+"""Deterministic synthetic bank data in the app's CSV schemas.
+
+The same seed and sizes always produce byte-identical files. Columns follow
+the sample files in data/, plus the columns the app reads that the samples
+lack (account_no/address on accounts, loan_id/method on transactions), so
+every page has real rows to work on. Loan status lives on the loan rows
+only; the risk levels the samples keep in loan_status.csv are a column
+there. Rows are written in chunks, so memory stays flat from 10k up to 10M
+rows. From the repo root:
+
+    python -m benchmarks.generate /tmp/bank-1m --users 1m
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+CHUNK = 250_000
+
+purposes = np.array(["Business", "Car", "Education", "Home", "Medical"])
+cities = np.array(["Sandraport", "Tommyberg", "Lakeview", "Eastfield", "Northgate", "Riverton", "Westbrook", "Hillcrest"])
+methods = np.array(["UPI", "Net Banking"])
+first_day = pd.Timestamp("2024-07-01")
+days = 365
+
+# About 1% of users are admins, like the samples
+ADMIN_EVERY = 100
+
+
+def parse_count(text):
+    """'10k', '2.5m' or '10000' -> int."""
+    text = str(text).strip().lower().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+# Credentials are a pure function of the user id, so scenarios can log in as anyone
+def username_for(user_id):
+    return "admin" if user_id == 0 else f"user{user_id}"
+
+
+def password_for(user_id):
+    return f"pw{(int(user_id) * 2654435761) % 2**32:08x}"
+
+
+def account_no_for(user_id):
+    return f"AC{int(user_id):09d}"
+
+
+def _chunks(n):
+    for start in range(0, n, CHUNK):
+        yield start, min(n, start + CHUNK)
+
+
+table_ids = {"users": 1, "accounts": 2, "loans": 3, "loan_status": 4, "transactions": 5}
+
+
+def _rng(seed, table, chunk_start):
+    # One stream per table and chunk: changing one size doesn't reshuffle the other tables
+    return np.random.default_rng([seed, table_ids[table], chunk_start])
+
+
+def _dates(rng, n):
+    return (first_day + pd.to_timedelta(rng.integers(0, days, n), unit="D")).strftime("%Y-%m-%d")
+
+
+def _write(df, path, first):
+    df.to_csv(path, mode="w" if first else "a", header=first, index=False)
+
+
+def users(seed, start, stop):
+    ids = np.arange(start, stop)
+    return pd.DataFrame({
+        "user_id": ids,
+        "username": [username_for(i) for i in ids],
+        "password": [password_for(i) for i in ids],
+        "role": np.where(ids % ADMIN_EVERY == 0, "admin", "user"),
+    })
+
+
+def accounts(seed, start, stop):
+    rng = _rng(seed, "accounts", start)
+    ids = np.arange(start, stop)
+    n = len(ids)
+    city = cities[rng.integers(0, len(cities), n)]
+    account_no = [account_no_for(i) for i in ids]
+    return pd.DataFrame({
+        "user_id": ids,
+        "username": [username_for(i) for i in ids],
+        "balance": np.round(rng.uniform(1_000, 100_000, n), 2),
+        "account_opened": _dates(rng, n),
+        "city": city,
+        "mobile": [f"xxxxxxx{m:03d}" for m in rng.integers(0, 1000, n)],
+        "account_number": account_no,
+        "account_no": account_no,
+        "address": city,
+    })
+
+
+def loans(seed, start, stop, n_users):
+    rng = _rng(seed, "loans", start)
+    n = stop - start
+    amount = rng.integers(1_000, 100_000, n)
+    income = rng.integers(1_000, 50_000, n)
+    # Risk rises with amount/income, so the risk model has signal to learn; the
+    # thresholds give roughly the samples' 40% approved / 37% declined / 23% pending
+    risk = 1 / (1 + np.exp(-(np.log(amount / income) - 0.75) * 1.2 + rng.normal(0, 0.5, n)))
+    status = np.select([risk < 0.4, risk > 0.6], ["approved", "declined"], "pending")
+    score = np.round(risk * 100).astype(int)
+    remarks = np.select(
+        [status == "approved", status == "declined"],
+        [np.char.add(np.char.add("Auto-approved. Risk Score: ", score.astype(str)), "%"),
+         np.char.add(np.char.add("Auto-declined. Risk Score: ", score.astype(str)), "%")],
+        "Awaiting review.",
+    )
+    return pd.DataFrame({
+        "loan_id": [f"L{i:08d}" for i in range(start + 1, stop + 1)],
+        "user_id": rng.integers(1, n_users, n),
+        "amount": amount,
+        "income": income,
+        "purpose": purposes[rng.integers(0, len(purposes), n)],
+        "application_date": _dates(rng, n),
+        "status": status,
+        "remarks": remarks,
+        "risk_level": np.array(["Low", "Medium", "High"])[_rng(seed, "loan_status", start).integers(0, 3, n)],
+    })
+
+
+def transactions(seed, start, stop, n_users, n_loans):
+    rng = _rng(seed, "transactions", start)
+    n = stop - start
+    kind = np.array(["deposit", "withdrawal", "emi"])[rng.choice(3, n, p=[0.45, 0.45, 0.10])]
+    is_emi = kind == "emi"
+    loan_id = np.where(is_emi, np.char.add("L", np.char.zfill(rng.integers(1, max(n_loans, 1) + 1, n).astype(str), 8)), "")
+    return pd.DataFrame({
+        "transaction_id": [f"T{i:09d}" for i in range(start + 1, stop + 1)],
+        "user_id": rng.integers(1, n_users, n),
+        "date": _dates(rng, n),
+        "type": kind,
+        "amount": np.round(rng.uniform(10, 5_000, n), 2),
+        "description": np.where(is_emi, "EMI payment", np.where(kind == "deposit", "Deposit", "Withdrawal")),
+        "loan_id": loan_id,
+        "method": np.where(is_emi, methods[rng.integers(0, 2, n)], ""),
+    })
+
+
+def generate(directory, n_users, loans_per_user=1.0, tx_per_user=5.0, seed=0):
+    """Write users/accounts/loans/transactions CSVs under ``directory``/data."""
+    data = os.path.join(directory, "data")
+    os.makedirs(data, exist_ok=True)
+    n_loans = int(n_users * loans_per_user)
+    n_tx = int(n_users * tx_per_user)
+
+    for start, stop in _chunks(n_users):
+        first = start == 0
+        _write(users(seed, start, stop), os.path.join(data, "users.csv"), first)
+        _write(accounts(seed, start, stop), os.path.join(data, "accounts.csv"), first)
+    for start, stop in _chunks(n_loans):
+        _write(loans(seed, start, stop, n_users), os.path.join(data, "loan_applications.csv"), start == 0)
+    for start, stop in _chunks(n_tx):
+        _write(transactions(seed, start, stop, n_users, n_loans), os.path.join(data, "transactions.csv"), start == 0)
+    return {"users": n_users, "loans": n_loans, "transactions": n_tx, "seed": seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="output directory; files go to <directory>/data")
+    parser.add_argument("--users", default="10k", help="number of users/accounts, e.g. 10k, 1m")
+    parser.add_argument("--loans-per-user", type=float, default=1.0)
+    parser.add_argument("--tx-per-user", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sizes = generate(args.directory, parse_count(args.users), args.loans_per_user, args.tx_per_user, args.seed)
+    print(", ".join(f"{k}={v:,}" for k, v in sizes.items()))
+
+
+if __name__ == "__main__":
+    main()
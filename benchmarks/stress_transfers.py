@@ -0,0 +1,136 @@
+"""Concurrent transfer stress test: no lost updates, no overdrafts.
+
+Seeds a scratch data directory with funded accounts, then runs random
+transfers from several worker processes with several threads each, the way
+a multi-worker deployment would. Afterwards it checks that money was
+conserved, no balance went negative and every balance matches its ledger
+rows. Run from the repo root:
+
+    python -m benchmarks.stress_transfers --processes 4 --threads 4 --transfers 200
+    python -m benchmarks.stress_transfers --backend sqlite
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_root)
+
+OPENING_BALANCE = 1000
+
+
+def account_no(i):
+    return f"AC{i:05d}"
+
+
+def seed_accounts(directory, n_accounts):
+    os.makedirs(os.path.join(directory, "data"))
+    ids = np.arange(1, n_accounts + 1)
+    pd.DataFrame({
+        "user_id": ids,
+        "account_no": [account_no(i) for i in ids],
+        "address": "",
+        "mobile": "",
+        "balance": float(OPENING_BALANCE),
+    }).to_csv(os.path.join(directory, "data", "accounts.csv"), index=False)
+
+
+# Runs in a worker process, with the scratch directory as its working directory
+def worker(args):
+    seed, n_accounts, threads, transfers = args
+    from transfers import transfer, TransferError
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        done = rejected = 0
+        latencies = []
+        for _ in range(transfers):
+            sender, recipient = rng.sample(range(1, n_accounts + 1), 2)
+            start = time.perf_counter()
+            try:
+                transfer(sender, account_no(recipient), float(rng.randint(1, 400)))
+                done += 1
+            except TransferError:
+                rejected += 1
+            latencies.append(time.perf_counter() - start)
+        return done, rejected, latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(run, [seed * 1000 + t for t in range(threads)]))
+    seconds = time.perf_counter() - start
+    return sum(r[0] for r in results), sum(r[1] for r in results), [x for r in results for x in r[2]], seconds
+
+
+def verify(n_accounts, transferred):
+    from storage import backend, accounts_file, transactions_file, transaction_columns
+
+    accounts = backend.load(accounts_file).set_index("user_id")["balance"]
+    tx = backend.load(transactions_file, transaction_columns)
+    failures = []
+    if not np.isclose(accounts.sum(), n_accounts * OPENING_BALANCE):
+        failures.append(f"total balance {accounts.sum():,.2f} != {n_accounts * OPENING_BALANCE:,.2f}")
+    if (accounts < 0).any():
+        failures.append(f"{int((accounts < 0).sum())} accounts overdrawn")
+    if len(tx) != 2 * transferred:
+        failures.append(f"{len(tx)} transaction rows for {transferred} transfers")
+    if tx["transaction_id"].duplicated().any():
+        failures.append("duplicate transaction ids")
+    expected = OPENING_BALANCE + tx.groupby(tx["user_id"].astype(int))["amount"].sum().reindex(accounts.index, fill_value=0)
+    drift = (expected - accounts).abs() > 1e-6
+    if drift.any():
+        failures.append(f"{int(drift.sum())} balances don't match their transaction rows")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--transfers", type=int, default=100, help="transfers per thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_accounts(tmp, args.accounts)
+        os.chdir(tmp)
+        os.environ["BANK_STORAGE_BACKEND"] = args.backend
+        if args.backend == "sqlite":
+            from storage import migrate_to_sqlite
+            migrate_to_sqlite()
+
+        jobs = [(p + 1, args.accounts, args.threads, args.transfers) for p in range(args.processes)]
+        pool = mp.get_context("spawn").Pool(args.processes)
+        results = pool.map(worker, jobs)
+        pool.close()
+        pool.join()
+        # Slowest worker's transfer loop; process start-up isn't counted
+        seconds = max(r[3] for r in results)
+
+        transferred = sum(r[0] for r in results)
+        rejected = sum(r[1] for r in results)
+        latencies = np.array([x for r in results for x in r[2]]) * 1000
+        print(f"backend={args.backend} workers={args.processes}x{args.threads} accounts={args.accounts}")
+        print(f"{transferred} transfers, {rejected} rejected in {seconds:.2f}s "
+              f"({(transferred + rejected) / seconds:,.0f} attempts/s)")
+        print("latency ms: p50 {:.2f}  p95 {:.2f}  p99 {:.2f}".format(*np.percentile(latencies, [50, 95, 99])))
+
+        failures = verify(args.accounts, transferred)
+        os.chdir(repo_root)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: balances conserved, no overdrafts, every balance matches its ledger")
+
+
+if __name__ == "__main__":
+    main()
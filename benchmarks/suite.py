@@ -0,0 +1,293 @@
+"""End-to-end benchmark scenarios run headless against main.py.
+
+Each scenario drives the real app through Streamlit's AppTest on its own
+copy of a generated data set, in its own process, and reports throughput,
+latency percentiles (the first, cold iteration separately) and peak RSS.
+Results are written to benchmarks/results/ so runs can be compared over
+time. From the repo root:
+
+    python -m benchmarks.suite --users 100k --iterations 30
+    python -m benchmarks.suite --users 1m --scenarios login transfer --backend sqlite
+    python -m benchmarks.suite --compare benchmarks/results/A.json benchmarks/results/B.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_root)
+
+from benchmarks.generate import generate, parse_count, username_for, password_for, account_no_for  # noqa: E402
+
+main_path = os.path.join(repo_root, "main.py")
+results_path = os.path.join(repo_root, "benchmarks", "results")
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 1024 if sys.platform != "darwin" else peak / 1024 / 1024
+
+
+def _app(username=None):
+    from streamlit.testing.v1 import AppTest
+    import auth
+    at = AppTest.from_file(main_path, default_timeout=600)
+    if username is not None:
+        # Signed in with a session token as after the login page, minus the password check
+        at.session_state.auth_token = auth.sessions.issue(username)
+        at.session_state.user = auth.sessions.user(at.session_state.auth_token)
+    return at
+
+
+def _username(user_id):
+    from tables import users_table
+    return users_table.rows("user_id", user_id).iloc[0]["username"]
+
+
+def _open(at, page):
+    at.run()
+    at.sidebar.radio[0].set_value(page).run()
+    return at
+
+
+def _button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def _timed(action):
+    start = time.perf_counter()
+    at = action()
+    seconds = time.perf_counter() - start
+    return seconds, not at.exception
+
+
+# Scenarios: prepare untimed, return (seconds, ok) for the timed step
+def login(rng, n_users):
+    user_id = rng.randrange(1, n_users)
+    at = _app()
+    at.run()
+    at.text_input[0].input(username_for(user_id))
+    at.text_input[1].input(password_for(user_id))
+    seconds, ok = _timed(lambda: _button(at, "Login").click().run())
+    return seconds, ok and at.session_state.user is not None
+
+
+def loan_apply(rng, n_users):
+    at = _open(_app(_username(rng.randrange(1, n_users))), "📝 Apply for Loan")
+    at.number_input[0].set_value(rng.randrange(1_000, 100_000))
+    at.number_input[1].set_value(rng.randrange(1_000, 50_000))
+    return _timed(lambda: _button(at, "Submit Application").click().run())
+
+
+def auto_decision(rng, n_users, batch=1000):
+    from tables import loans_table
+    today = pd.Timestamp.today().strftime("%Y-%m-%d")
+    tag = rng.getrandbits(32)
+    loans_table.insert([{
+        "loan_id": f"B{tag:08x}{i:05d}", "user_id": rng.randrange(1, n_users),
+        "amount": rng.randrange(1_000, 100_000), "purpose": "Business", "income": rng.randrange(1_000, 50_000),
+        "status": "pending", "application_date": today, "remarks": "Awaiting review",
+    } for i in range(batch)])
+    at = _app(_username(0))
+    at.run()
+    return _timed(lambda: at.sidebar.radio[0].set_value("✅ Pending Loans").run())
+
+
+def emi_payment(rng, n_users):
+    from tables import loans_table
+    approved = loans_table.rows("status", "approved")
+    user_id = approved["user_id"].iloc[rng.randrange(len(approved))]
+    at = _open(_app(_username(user_id)), "💳 Pay Monthly EMI")
+    if not any(b.label == "Pay EMI" for b in at.button):
+        return None
+    return _timed(lambda: _button(at, "Pay EMI").click().run())
+
+
+def transfer(rng, n_users):
+    sender, recipient = rng.sample(range(1, n_users), 2)
+    at = _open(_app(_username(sender)), "🏦 Transfer ammount")
+    at.text_input[0].input(account_no_for(recipient))
+    at.number_input[0].set_value(float(rng.randrange(1, 500)))
+    seconds, ok = _timed(lambda: _button(at, "Transfer").click().run())
+    return seconds, ok and bool(at.success)
+
+
+def analytics(rng, n_users):
+    at = _app(_username(0))
+    at.run()
+    return _timed(lambda: at.sidebar.radio[0].set_value("📊 Loan Summary & Analytics").run())
+
+
+scenarios = {
+    "login": login,
+    "loan_apply": loan_apply,
+    "auto_decision": auto_decision,
+    "emi_payment": emi_payment,
+    "transfer": transfer,
+    "analytics": analytics,
+}
+
+
+# Runs in a fresh process whose working directory is a private copy of the data
+def run_scenario(args):
+    name, n_users, iterations, seed = args
+    import warnings
+    warnings.filterwarnings("ignore")
+    from profiling import profiler
+
+    rng = random.Random(seed)
+    latencies, failures, skipped = [], 0, 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = scenarios[name](rng, n_users)
+        if result is None:
+            skipped += 1
+            continue
+        seconds, ok = result
+        latencies.append(seconds)
+        failures += not ok
+    wall = time.perf_counter() - start
+
+    warm = np.array(latencies[1:] or latencies) * 1000
+    return {
+        "iterations": len(latencies),
+        "failures": failures,
+        "skipped": skipped,
+        "throughput_per_s": len(latencies) / sum(latencies) if latencies else 0.0,
+        "wall_s": wall,
+        "cold_ms": latencies[0] * 1000 if latencies else None,
+        "p50_ms": float(np.percentile(warm, 50)) if len(warm) else None,
+        "p95_ms": float(np.percentile(warm, 95)) if len(warm) else None,
+        "p99_ms": float(np.percentile(warm, 99)) if len(warm) else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": profiler.snapshot()["stages"],
+    }
+
+
+def _in_directory(directory, backend, args):
+    # Spawned workers inherit the working directory and environment at start-up
+    os.chdir(directory)
+    os.environ["BANK_STORAGE_BACKEND"] = backend
+    if backend == "sqlite":
+        from storage import migrate_to_sqlite
+        migrate_to_sqlite()
+    return run_scenario(args)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_root,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names, n_users, iterations, seed, backend, data=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        source = data
+        if source is None:
+            source = os.path.join(tmp, "source")
+            started = time.perf_counter()
+            sizes = generate(source, n_users, seed=seed)
+            print(f"generated {', '.join(f'{k}={v:,}' for k, v in sizes.items())} in {time.perf_counter() - started:.1f}s")
+
+        results = {}
+        for name in names:
+            scratch = os.path.join(tmp, name)
+            shutil.copytree(os.path.join(source, "data"), os.path.join(scratch, "data"))
+            ctx = mp.get_context("spawn")
+            with ctx.Pool(1, maxtasksperchild=1) as pool:
+                results[name] = pool.apply(_in_directory, (scratch, backend, (name, n_users, iterations, seed)))
+            shutil.rmtree(scratch)
+            r = results[name]
+            print(f"{name:>14}  n={r['iterations']:<4} cold {r['cold_ms'] or 0:>9.1f} ms  p50 {r['p50_ms'] or 0:>8.1f}  "
+                  f"p95 {r['p95_ms'] or 0:>8.1f}  p99 {r['p99_ms'] or 0:>8.1f} ms  {r['throughput_per_s']:>7.1f}/s  "
+                  f"peak {r['peak_rss_mb'] or 0:>7.0f} MB  failures {r['failures']}")
+
+    return {
+        "timestamp": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "backend": backend,
+        "users": n_users,
+        "seed": seed,
+        "iterations": iterations,
+        "scenarios": results,
+    }
+
+
+def save(result, label=None):
+    os.makedirs(results_path, exist_ok=True)
+    stamp = result["timestamp"].replace(":", "").replace("-", "")
+    name = f"{stamp}-{result['commit'] or 'nogit'}-{result['backend']}-{result['users']}" + (f"-{label}" if label else "")
+    path = os.path.join(results_path, name + ".json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old_path} ({old['commit']}, {old['users']:,} users) -> {new_path} ({new['commit']}, {new['users']:,} users)")
+    print(f"{'scenario':>14} {'p50 ms':>17} {'p95 ms':>17} {'peak MB':>15} {'p50 change':>11}")
+    for name, r in new["scenarios"].items():
+        o = old["scenarios"].get(name)
+        if o is None or not o["p50_ms"] or not r["p50_ms"]:
+            continue
+        change = (r["p50_ms"] - o["p50_ms"]) / o["p50_ms"] * 100
+        print(f"{name:>14} {o['p50_ms']:>8.1f}{r['p50_ms']:>9.1f} {o['p95_ms']:>8.1f}{r['p95_ms']:>9.1f} "
+              f"{o['peak_rss_mb'] or 0:>7.0f}{r['peak_rss_mb'] or 0:>8.0f} {change:>+10.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", default="10k", help="generated data size, e.g. 10k, 1m (transactions are 5x)")
+    parser.add_argument("--data", help="use this directory's data/ instead of generating one")
+    parser.add_argument("--scenarios", nargs="+", choices=list(scenarios), default=list(scenarios))
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--label", help="suffix for the results file name")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--compare", nargs="*", metavar="RESULT",
+                        help="compare two result files (default: the two most recent)")
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        paths = args.compare or sorted(glob.glob(os.path.join(results_path, "*.json")))[-2:]
+        if len(paths) != 2:
+            parser.error("need two result files to compare")
+        compare(*paths)
+        return
+
+    n_users = parse_count(args.users)
+    if args.data:
+        n_users = sum(1 for _ in open(os.path.join(args.data, "data", "users.csv"))) - 1
+    result = run(args.scenarios, n_users, args.iterations, args.seed, args.backend, args.data)
+    if not args.no_save:
+        print(f"results written to {save(result, args.label)}")
+
+
+if __name__ == "__main__":
+    main()
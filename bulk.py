@@ -0,0 +1,198 @@
+"""Bulk import and export of whole tables in Parquet or Arrow IPC (Feather v2).
+
+Exports write the table in row groups of ``CHUNK_ROWS`` straight from its
+in-memory Arrow-backed columns. Imports read the file a record batch at a
+time, check its schema and values against the table's declared columns, and
+append each batch as it is read (or replace the table). Both take an
+optional list of columns to project. From the repo root:
+
+    python bulk.py export transactions /tmp/transactions.parquet --columns user_id amount date
+    python bulk.py import loans /tmp/loans.parquet
+    python bulk.py import users /tmp/users.arrow --mode replace
+"""
+import os
+import argparse
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from schema import conform
+from storage import backend, data_path
+from tables import users_table, accounts_table, loans_table, transactions_table
+
+tables = {"users": users_table, "accounts": accounts_table, "loans": loans_table, "transactions": transactions_table}
+formats = {"parquet": ".parquet", "arrow": ".arrow"}
+# Files uploaded on the Import / Export page, kept until their import job has run
+imports_path = os.path.join(data_path, "imports")
+
+# Rows per row group on export and per record batch on import
+CHUNK_ROWS = 100_000
+
+
+class SchemaError(ValueError):
+    """An import file that doesn't fit the table; the message lists every problem."""
+
+
+def _format(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(str(getattr(path, "name", path)))[1].lower()
+    return "arrow" if ext in (".arrow", ".feather", ".ipc") else "parquet"
+
+
+# Export
+def export_table(table, dest, columns=None, fmt=None, chunk_rows=CHUNK_ROWS):
+    """Write ``table`` (or just ``columns`` of it) to ``dest``, a path or binary file object.
+
+    Returns the number of rows written.
+    """
+    df = table.load()
+    columns = list(columns or df.columns)
+    unknown = [c for c in columns if c not in df.columns]
+    if unknown:
+        raise SchemaError(f"{os.path.basename(table.file)} has no column(s) {', '.join(unknown)}")
+    df = df[columns]
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    # Categories go out as text: a categorical that is all NaN has float categories and
+    # would be written as a double column, which the import check then rejects
+    schema = pa.schema([pa.field(f.name, pa.dictionary(pa.int32(), pa.string())) if pa.types.is_dictionary(f.type) else f
+                        for f in schema], metadata=schema.metadata)
+    fmt = _format(dest, fmt)
+    writer = pq.ParquetWriter(dest, schema) if fmt == "parquet" else pa.ipc.new_file(dest, schema)
+    with writer:
+        for start in range(0, len(df), chunk_rows):
+            # Arrow-backed string columns are handed over without copying
+            batch = pa.Table.from_pandas(df.iloc[start:start + chunk_rows], schema=schema, preserve_index=False)
+            writer.write_table(batch)
+    return len(df)
+
+
+# Import
+def _open(source, fmt=None):
+    # (schema, number of rows, function returning an iterator of record batches)
+    if _format(source, fmt) == "arrow":
+        reader = pa.ipc.open_file(pa.memory_map(source) if isinstance(source, str) else source)
+        total = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        # Batches are slices of the memory-mapped file; nothing is copied until to_pandas
+        return reader.schema, total, lambda columns, size: (
+            chunk for i in range(reader.num_record_batches)
+            for chunk in pa.Table.from_batches([reader.get_batch(i)]).select(columns or reader.schema.names).to_batches(size))
+    parquet = pq.ParquetFile(source)
+    return parquet.schema_arrow, parquet.metadata.num_rows, lambda columns, size: parquet.iter_batches(size, columns=columns)
+
+
+def describe(source, fmt=None):
+    """``(arrow schema, number of rows)`` of a Parquet/Arrow file, without reading its data."""
+    schema, total, _ = _open(source, fmt)
+    return schema, total
+
+
+type_checks = {
+    "id": lambda t: pa.types.is_integer(t) or pa.types.is_string(t) or pa.types.is_large_string(t),
+    "money": lambda t: pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t),
+    "date": lambda t: pa.types.is_timestamp(t) or pa.types.is_date(t) or pa.types.is_string(t) or pa.types.is_large_string(t),
+    "category": lambda t: pa.types.is_dictionary(t) or pa.types.is_string(t) or pa.types.is_large_string(t),
+}
+
+
+def check_schema(table, schema, columns=None):
+    """Problems with importing a file of ``schema`` into ``table``, as a list of messages."""
+    names = list(columns or schema.names)
+    problems = [f"no column {c!r} in the file" for c in names if c not in schema.names]
+    known = set(table.columns) | set(table.dtypes) | set(table.load().columns)
+    unknown = [c for c in names if c not in known]
+    if unknown:
+        problems.append(f"unknown column(s) {', '.join(unknown)}; pick the columns to import")
+    if table.key and table.key not in names:
+        problems.append(f"the key column {table.key!r} is required")
+    for col in names:
+        kind = table.dtypes.get(col)
+        if kind and col in schema.names:
+            arrow_type = schema.field(col).type
+            if not pa.types.is_null(arrow_type) and not type_checks[kind](arrow_type):
+                problems.append(f"column {col!r} is {arrow_type}, expected a {kind} column")
+    return problems
+
+
+def _conformed(batch, table):
+    # Declared column types applied to one batch; values that don't convert are errors
+    df = batch.to_pandas()
+    present = df.notna().sum()
+    df = conform(df, table.dtypes)
+    bad = [col for col, kind in table.dtypes.items() if col in df.columns and (
+        (kind == "money" and df[col].dtype != "float64") or df[col].notna().sum() < present[col])]
+    if bad:
+        raise SchemaError(f"values that don't convert to their column type in {', '.join(bad)}")
+    return df
+
+
+def import_table(table, source, columns=None, mode="append", fmt=None, batch_rows=CHUNK_ROWS, progress=None):
+    """Load a Parquet/Arrow file into ``table``; returns ``{"rows", "imported", "skipped"}``.
+
+    ``mode="append"`` adds the rows, skipping any whose key is already
+    stored or repeats within the file, so running the same import twice is
+    harmless. ``mode="replace"`` swaps the whole table for the file's rows.
+    ``progress(done, total)`` is called after every batch.
+    """
+    schema, total, batches = _open(source, fmt)
+    problems = check_schema(table, schema, columns)
+    if problems:
+        raise SchemaError("; ".join(problems))
+    if mode not in ("append", "replace"):
+        raise ValueError(f"mode must be 'append' or 'replace', not {mode!r}")
+
+    key = table.key
+    seen = set()
+    if key and mode == "append":
+        seen = set(table.load()[key].dropna().tolist())
+    counts = {"rows": 0, "imported": 0, "skipped": 0}
+
+    def frames():
+        for batch in batches(columns, batch_rows):
+            df = _conformed(batch, table)
+            counts["rows"] += len(df)
+            if key:
+                fresh = ~df[key].isin(seen) & ~df[key].duplicated()
+                seen.update(df.loc[fresh, key].tolist())
+                counts["skipped"] += int((~fresh).sum())
+                df = df[fresh]
+            counts["imported"] += len(df)
+            yield df
+            if progress is not None:
+                progress(counts["rows"], total)
+
+    if mode == "replace":
+        df = pd.concat(list(frames()), ignore_index=True)
+        table.save(df.reindex(columns=list(dict.fromkeys(list(df.columns) + table.columns))))
+    else:
+        backend.append_frames(table.file, frames())
+        table.invalidate()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write a table to a Parquet or Arrow file")
+    export.add_argument("table", choices=list(tables))
+    export.add_argument("path")
+    export.add_argument("--columns", nargs="+")
+    export.add_argument("--format", choices=list(formats), help="default: from the file extension")
+    imports = commands.add_parser("import", help="load a Parquet or Arrow file into a table")
+    imports.add_argument("table", choices=list(tables))
+    imports.add_argument("path")
+    imports.add_argument("--columns", nargs="+")
+    imports.add_argument("--format", choices=list(formats), help="default: from the file extension")
+    imports.add_argument("--mode", choices=["append", "replace"], default="append")
+    args = parser.parse_args()
+
+    table = tables[args.table]
+    if args.command == "export":
+        print(f"{export_table(table, args.path, args.columns, args.format):,} rows written to {args.path}")
+    else:
+        counts = import_table(table, args.path, args.columns, args.mode, args.format,
+                              progress=lambda done, total: print(f"\r{done:,} of {total:,} rows", end="", flush=True))
+        print(f"\n{counts['imported']:,} rows imported, {counts['skipped']:,} already stored or repeated")
+
+
+if __name__ == "__main__":
+    main()
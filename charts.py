@@ -0,0 +1,106 @@
+"""Charts of small aggregated frames, cached by the data they show.
+
+Each chart takes a wide frame: the index is the x axis, one series per
+column. The rendered result is cached per process, keyed on a hash of the
+frame, so a rerun with unchanged data redraws nothing:
+
+    plotly      the figure spec (a few KB of JSON with just the aggregated
+                points) is sent to the browser, where zooming, panning and
+                toggling series happen without a rerun
+    matplotlib  a PNG drawn on a standalone Figure, which isn't registered
+                with pyplot and is freed as soon as it has been saved
+"""
+import io
+import os
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict
+import pandas as pd
+import streamlit as st
+
+CHART_MODES = ("plotly", "matplotlib")
+
+
+def _chart_mode(value):
+    # An unknown setting falls back to the default instead of breaking every page with a chart
+    if value in CHART_MODES:
+        return value
+    warnings.warn(f"BANK_CHART_MODE={value!r} is not one of {', '.join(CHART_MODES)}; using {CHART_MODES[0]}")
+    return CHART_MODES[0]
+
+
+CHART_MODE = _chart_mode(os.environ.get("BANK_CHART_MODE", CHART_MODES[0]))
+# Rendered charts kept per process
+MAX_CACHED_CHARTS = 64
+
+
+def data_hash(df):
+    """Hash of a frame's values, index and column labels."""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(repr((list(df.columns), df.index.name)).encode())
+    return digest.hexdigest()
+
+
+class ChartCache:
+    """Least-recently-used map of rendered charts, shared by every session."""
+
+    def __init__(self, size=MAX_CACHED_CHARTS):
+        self.size = size
+        self._charts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, render):
+        with self._lock:
+            if key in self._charts:
+                self._charts.move_to_end(key)
+                return self._charts[key]
+        chart = render()
+        with self._lock:
+            self._charts[key] = chart
+            while len(self._charts) > self.size:
+                self._charts.popitem(last=False)
+        return chart
+
+
+chart_cache = ChartCache()
+
+
+def _plotly_spec(kind, df, title):
+    import plotly.graph_objects as go
+    x = df.index.astype(str).tolist()
+    fig = go.Figure()
+    for col in df.columns:
+        if kind == "line":
+            fig.add_trace(go.Scatter(x=x, y=df[col].tolist(), name=str(col), mode="lines+markers"))
+        else:
+            fig.add_trace(go.Bar(x=x, y=df[col].tolist(), name=str(col)))
+    fig.update_layout(title=title, barmode="stack", legend_title_text=df.columns.name or "")
+    if kind == "line":
+        fig.update_xaxes(rangeslider_visible=True)
+    return fig.to_plotly_json()
+
+
+def _matplotlib_png(kind, df, title):
+    from matplotlib.figure import Figure
+    # Not created through pyplot, so there's no global figure list to leak into
+    fig = Figure()
+    ax = fig.subplots()
+    if kind == "line":
+        df.plot(ax=ax, marker="o")
+    else:
+        df.plot(kind="bar", stacked=True, ax=ax)
+    ax.set_title(title)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def chart(kind, df, title, mode=None):
+    """Draw ``df`` as a ``"line"`` or stacked ``"bar"`` chart."""
+    mode = mode or CHART_MODE
+    key = (kind, title, mode, data_hash(df))
+    if mode == "plotly":
+        st.plotly_chart(chart_cache.get(key, lambda: _plotly_spec(kind, df, title)))
+    else:
+        st.image(chart_cache.get(key, lambda: _matplotlib_png(kind, df, title)))
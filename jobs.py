@@ -0,0 +1,309 @@
+"""Background jobs run by a small worker pool in every app process.
+
+Each job is a JSON record in ``data/jobs/`` that says what to run and how
+far it got. Any process's workers can claim a queued job; claiming happens
+under a file lock, so each job runs once. Submitting a job under a ``key``
+is idempotent: the same kind and key always map to the same record. A job
+whose worker died (its process is gone, or it stopped sending heartbeats)
+is put back in the queue, so handlers must be safe to run again from the
+start.
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import hashlib
+import threading
+import pandas as pd
+from storage import data_path, FileLock, backend, loans_file, _pid_alive
+from tables import loans_table, commit, file_version
+from scoring import risk_models, score_loans, auto_decisions
+from bulk import tables as bulk_tables, import_table
+
+jobs_path = os.path.join(data_path, "jobs")
+
+# Worker threads per process; 0 leaves jobs to other processes
+JOB_WORKERS = int(os.environ.get("BANK_JOB_WORKERS", "1"))
+POLL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 5.0
+# A running job that hasn't sent a heartbeat for this long is presumed dead
+STALE_SECONDS = 60.0
+MAX_ATTEMPTS = 3
+# Finished jobs kept on disk for the Jobs page
+KEEP_FINISHED = 200
+
+host = socket.gethostname()
+
+
+def _now():
+    return time.time()
+
+
+class JobQueue:
+    """Job records on disk plus the worker threads of this process.
+
+    Handlers are registered per kind with ``handler(kind)`` and called as
+    ``fn(params, progress)``; ``progress(done, total, message=None)``
+    reports how far they got. Their return value is stored as the job's
+    result.
+    """
+
+    def __init__(self, directory=jobs_path, workers=JOB_WORKERS):
+        self.directory = directory
+        self.workers = workers
+        self.lock = FileLock(os.path.join(directory, "queue.lock"))
+        self._handlers = {}
+        self._threads = []
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def handler(self, kind):
+        def register(fn):
+            self._handlers[kind] = fn
+            return fn
+        return register
+
+    # Records
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _write(self, job):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(job["id"])
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(job, f, default=str)
+        os.replace(tmp, path)
+
+    def get(self, job_id):
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def jobs(self, kind=None, limit=None):
+        """Job records, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        records = [self.get(name[:-len(".json")]) for name in os.listdir(self.directory) if name.endswith(".json")]
+        records = sorted((r for r in records if r and (kind is None or r["kind"] == kind)),
+                         key=lambda r: r["created"], reverse=True)
+        return records[:limit] if limit else records
+
+    def active(self, kind):
+        """The queued or running job of ``kind``, if there is one."""
+        return next((job for job in self.jobs(kind) if job["status"] in ("queued", "running")), None)
+
+    def submit(self, kind, params=None, key=None):
+        """Queue a job and return its record.
+
+        With a ``key``, a job of the same kind and key that is queued,
+        running or done is returned as it is instead of adding another;
+        a failed one is queued again.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler for job kind {kind!r}")
+        if key is None:
+            job_id = f"{kind}-{uuid.uuid4().hex[:12]}"
+        else:
+            job_id = f"{kind}-{hashlib.sha1(str(key).encode()).hexdigest()[:12]}"
+        with self.lock:
+            job = self.get(job_id)
+            if job is not None and job["status"] != "failed":
+                return job
+            job = {
+                "id": job_id, "kind": kind, "key": None if key is None else str(key), "params": params or {},
+                "status": "queued", "done": 0, "total": None, "message": "Queued", "result": None,
+                "error": None, "attempts": 0, "owner": None, "created": _now(), "started": None,
+                "finished": None, "heartbeat": None,
+            }
+            self._write(job)
+            self._prune()
+        self.start()
+        self._wake.set()
+        return job
+
+    def _prune(self):
+        finished = [job for job in self.jobs() if job["status"] in ("done", "failed")]
+        for job in finished[KEEP_FINISHED:]:
+            try:
+                os.remove(self._path(job["id"]))
+            except FileNotFoundError:
+                pass
+
+    # Claiming and recovery
+    def _abandoned(self, job):
+        owner = job.get("owner") or {}
+        if owner.get("host") == host and not _pid_alive(owner.get("pid", 0)):
+            return True
+        return _now() - (job.get("heartbeat") or 0) > STALE_SECONDS
+
+    def _claim(self):
+        with self.lock:
+            for job in reversed(self.jobs()):
+                if job["status"] == "running" and self._abandoned(job):
+                    if job["attempts"] >= MAX_ATTEMPTS:
+                        job.update(status="failed", finished=_now(), error="Worker died; gave up after "
+                                   f"{job['attempts']} attempts", message="Failed")
+                        self._write(job)
+                        continue
+                    job.update(status="queued", message="Re-queued after its worker stopped")
+                if job["status"] == "queued" and job["kind"] in self._handlers:
+                    job.update(status="running", attempts=job["attempts"] + 1, started=_now(), heartbeat=_now(),
+                               owner={"host": host, "pid": os.getpid()}, message="Running")
+                    self._write(job)
+                    return job
+        return None
+
+    # Running
+    def _run(self, job):
+        state = {"job": job, "reported": 0.0}
+        state_lock = threading.Lock()
+
+        def save(**changes):
+            with state_lock:
+                state["job"] = {**state["job"], **changes, "heartbeat": _now()}
+                self._write(state["job"])
+
+        def progress(done, total, message=None):
+            # Throttled: the record is rewritten at most a few times a second
+            if _now() - state["reported"] >= 0.25 or done == total:
+                state["reported"] = _now()
+                save(done=done, total=total, **({"message": message} if message else {}))
+
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(HEARTBEAT_SECONDS):
+                save()
+
+        heartbeat = threading.Thread(target=beat, daemon=True)
+        heartbeat.start()
+        try:
+            result = self._handlers[job["kind"]](job["params"], progress)
+        except Exception as e:
+            stop.set()
+            save(status="failed", finished=_now(), error=f"{type(e).__name__}: {e}", message="Failed")
+        else:
+            stop.set()
+            save(status="done", finished=_now(), result=result, message="Done")
+        heartbeat.join()
+
+    def _work(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def start(self):
+        """Start this process's workers (once)."""
+        with self._start_lock:
+            if self._threads or self.workers <= 0:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def wait(self, job_id, timeout=None):
+        """Block until ``job_id`` has finished; returns its record."""
+        deadline = None if timeout is None else _now() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in ("done", "failed"):
+                return job
+            if deadline is not None and _now() >= deadline:
+                return job
+            time.sleep(0.1)
+
+
+job_queue = JobQueue()
+
+
+# Job kinds
+
+# Loans decided per write; each write rewrites the loan file once on the csv backend
+DECISION_BATCH = 10_000
+
+
+def _store_decisions(updates):
+    # Raises on failure, unlike update_many, so the job is marked failed
+    commit([(loans_table, [], [("loan_id", updates)])])
+
+
+@job_queue.handler("auto_decide")
+def auto_decide(params, progress):
+    """Score every pending loan, decide the clear cases and note the risk score on the rest."""
+    progress(0, None, "Loading the risk model")
+    model = risk_models.get(loans_table)
+    if model is None:
+        return {"skipped": "Not enough historical data to train model."}
+    pending = loans_table.rows("status", "pending")
+    counts = {"approved": 0, "declined": 0, "review": 0}
+    for start in range(0, len(pending), DECISION_BATCH):
+        batch = pending.iloc[start:start + DECISION_BATCH]
+        # Loans decided since the job started (by an admin, or an earlier attempt of this job) are left alone
+        still_pending = loans_table.rows("status", "pending")["loan_id"]
+        batch = batch[batch["loan_id"].isin(still_pending)]
+        if not batch.empty:
+            risk_scores = score_loans(model, batch)
+            decisions, buckets = auto_decisions(batch, risk_scores)
+            review = buckets == "review"
+            remarks = [f"Average Risk. Risk Score: {score}%. Awaiting review." for score in risk_scores[review]]
+            notes = pd.DataFrame({"loan_id": batch["loan_id"].to_numpy()[review], "status": "pending", "remarks": remarks})
+            # Only rewrite remarks that change, so re-running the job is cheap
+            notes = notes[notes["remarks"].to_numpy() != batch["remarks"].astype(str).to_numpy()[review]]
+            updates = pd.concat([decisions, notes], ignore_index=True)
+            if not updates.empty:
+                _store_decisions(updates)
+            for bucket in counts:
+                counts[bucket] += int((buckets == bucket).sum())
+        progress(min(start + DECISION_BATCH, len(pending)), len(pending), "Deciding loans")
+    return counts
+
+
+def decision_key():
+    """Idempotency key for auto-decisioning: the loan data and the model it would use."""
+    model = risk_models.info()
+    return f"{file_version(loans_file)}:{model['version'] if model else 0}"
+
+
+@job_queue.handler("bulk_status")
+def bulk_status(params, progress):
+    """Set status and remarks on many loans: ``params["updates"]`` is a list of
+    ``{"loan_id", "status", "remarks"}`` records."""
+    updates = pd.DataFrame(params["updates"], columns=["loan_id", "status", "remarks"])
+    for start in range(0, len(updates), DECISION_BATCH):
+        _store_decisions(updates.iloc[start:start + DECISION_BATCH])
+        progress(min(start + DECISION_BATCH, len(updates)), len(updates), "Updating loans")
+    return {"updated": len(updates)}
+
+
+@job_queue.handler("compact")
+def compact(params, progress):
+    """Fold ledger segments into Parquet snapshots."""
+    ledgers = list(getattr(backend, "ledgers", {}).values())
+    compacted = {}
+    for i, ledger in enumerate(ledgers):
+        progress(i, len(ledgers), f"Compacting {ledger.file}")
+        compacted[ledger.file] = ledger.compact()
+    progress(len(ledgers), len(ledgers))
+    return compacted
+
+
+@job_queue.handler("bulk_import")
+def bulk_import(params, progress):
+    """Load a Parquet/Arrow file into a table: ``params`` has ``table``, ``path``
+    and optionally ``columns``, ``mode`` and ``format``."""
+    return import_table(bulk_tables[params["table"]], params["path"], params.get("columns"), params.get("mode", "append"),
+                        params.get("format"), progress=lambda done, total: progress(done, total, "Importing rows"))
+
+
+# Compaction due after a ledger append runs here instead of inside the write
+for _ledger in getattr(backend, "ledgers", {}).values():
+    _ledger.on_compact_due = lambda ledger: job_queue.submit("compact", key=f"{ledger.file}:{ledger.sealed_seq()}")
@@ -1,79 +1,57 @@
-
 import streamlit as st
 import pandas as pd
 import os
+import io
+import json
+import hashlib
 import random
-import numpy as np
-from sklearn.linear_model import LogisticRegression
-
-# Paths to CSV files
-data_path = "data"
-users_file = os.path.join(data_path, "users.csv")
-accounts_file = os.path.join(data_path, "accounts.csv")
-loans_file = os.path.join(data_path, "loan_applications.csv")
-loan_status_file = os.path.join(data_path, "loan_status.csv")
-transactions_file = os.path.join(data_path, "transactions.csv")
-
-# Load and Save CSV
-def load_csv(file, expected_columns=None):
-    try:
-        if os.path.exists(file):
-            df = pd.read_csv(file)
-            if expected_columns:
-                for col in expected_columns:
-                    if col not in df.columns:
-                        df[col] = np.nan
-            return df
-        else:
-            return pd.DataFrame(columns=expected_columns if expected_columns else [])
-    except Exception as e:
-        st.error(f"Error loading {file}: {e}")
-        return pd.DataFrame(columns=expected_columns if expected_columns else [])
-
-def save_csv(df, file):
-    try:
-        df.to_csv(file, index=False)
-    except Exception as e:
-        st.error(f"Error saving {file}: {e}")
-
-# Load data into session state
-def load_data_to_session():
-    st.session_state.users_df = load_csv(users_file, ["user_id", "username", "password", "role"])
-    st.session_state.accounts_df = load_csv(accounts_file, ["user_id", "account_no", "address", "mobile", "balance"])
-    st.session_state.loans_df = load_csv(loans_file, ["loan_id", "user_id", "amount", "purpose", "income", "status", "application_date", "remarks"])
-    st.session_state.loan_status_df = load_csv(loan_status_file, ["loan_id", "user_id", "amount", "purpose", "income", "status", "application_date", "remarks"])
-    st.session_state.transactions_df = load_csv(transactions_file, ["user_id", "loan_id", "amount", "method", "date"])
-
-load_data_to_session()
-
-users_df = st.session_state.users_df
-accounts_df = st.session_state.accounts_df
-loans_df = st.session_state.loans_df
-loan_status_df = st.session_state.loan_status_df
-transactions_df = st.session_state.transactions_df
-
+from analytics import loan_cube, loans_between
+from scoring import risk_score_from_remarks, decision_remarks
+from tables import users_table, accounts_table, loans_table, transactions_table, loan_status
+from transfers import transfer, TransferError
+from summaries import account_summary
+from amortization import DEFAULT_ANNUAL_RATE, DEFAULT_TENURE_MONTHS, loan_terms, emi as compute_emi, schedule, portfolio
+from storage import new_transaction_id, backend, loan_status_file, transactions_file
+from profiling import profiler, timed, EXPORT_TARGET
+import auth
+from jobs import job_queue, decision_key
+from charts import CHART_MODES, CHART_MODE, chart
+from bulk import tables as bulk_tables, formats as bulk_formats, imports_path, export_table, check_schema, describe
+
+# Time every stage of this rerun; the breakdown is kept for the Performance panel
+profiler.begin_request()
+
+# Nothing is loaded up front: each table is parsed (once per process, shared by
+# every session) the first time a page reads it, so the login page touches only users
 if "user" not in st.session_state:
     st.session_state.user = None
 
-# Ensure required columns exist
-def ensure_columns():
-    global users_df, accounts_df, loans_df
-
-    if 'status' not in loans_df.columns:
-        loans_df['status'] = 'pending'
-    if 'remarks' not in loans_df.columns:
-        loans_df['remarks'] = ''
-    for col in ['account_no', 'address', 'balance', 'mobile']:
-        if col not in accounts_df.columns:
-            accounts_df[col] = '' if col != 'balance' else 0
-    for col in ['username', 'user_id', 'password', 'role']:
-        if col not in users_df.columns:
-            users_df[col] = ''
-
-ensure_columns()
-
-if "user" not in st.session_state:
-    st.session_state.user = None
+# Paged table view: sorting, filtering and paging happen on the server, and only
+# the visible page is copied out of the table and sent to the browser
+def paged_grid(table, key, column=None, value=None, sort_by=None, ascending=True):
+    sort_col, order_col, size_col, page_col = st.columns([3, 2, 2, 2])
+    sort_options = list(table.columns)
+    sort_by = sort_col.selectbox("Sort by", sort_options, index=sort_options.index(sort_by) if sort_by in sort_options else 0, key=f"{key}_sort")
+    ascending = order_col.selectbox("Order", ["Ascending", "Descending"], index=0 if ascending else 1, key=f"{key}_order") == "Ascending"
+    page_size = size_col.selectbox("Rows per page", [25, 50, 100, 250], key=f"{key}_size")
+
+    page_key = f"{key}_page"
+    page_no = st.session_state.get(page_key, 1)
+    rows, total = table.page((page_no - 1) * page_size, page_size, column, value, sort_by, ascending)
+    pages = max(1, -(-total // page_size))
+    if page_no > pages:
+        # The filter or page size changed under us; go back to the last page
+        page_no = pages
+        rows, total = table.page((page_no - 1) * page_size, page_size, column, value, sort_by, ascending)
+    st.session_state[page_key] = page_no
+    page_col.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=page_key)
+
+    if total == 0:
+        st.info("No rows to show.")
+        return
+    first = (page_no - 1) * page_size
+    st.dataframe(rows.reset_index(drop=True))
+    st.caption(f"Rows {first + 1}–{first + len(rows)} of {total}")
 
 # User Registration
 # Create New User
@@ -86,18 +64,15 @@ def create_new_user():
     mobile = st.text_input("Mobile Number (e.g., xxxxxxx237)")
 
     if st.button("Create Account"):
-        if username in users_df["username"].values:
+        if not users_table.rows("username", username).empty:
             st.error("Username already exists. Please choose another.")
         else:
-            user_id = f"U{len(users_df)+1:04d}"
-            new_user = pd.DataFrame([{"user_id": user_id, "username": username, "password": password, "role": role}])
-            new_account = pd.DataFrame([{"user_id": user_id, "account_no": f"XXXXXXX{random.randint(100,999)}", "address": city, "mobile": mobile, "balance": 0}])
-
-            updated_users = pd.concat([users_df, new_user], ignore_index=True)
-            updated_accounts = pd.concat([accounts_df, new_account], ignore_index=True)
+            user_id = f"U{users_table.size()+1:04d}"
+            new_user = {"user_id": user_id, "username": username, "password": auth.hash_password(password), "role": role}
+            new_account = {"user_id": user_id, "account_no": f"XXXXXXX{random.randint(100,999)}", "address": city, "mobile": mobile, "balance": 0}
 
-            save_csv(updated_users, users_file)
-            save_csv(updated_accounts, accounts_file)
+            users_table.insert([new_user])
+            accounts_table.insert([new_account])
 
             st.success("Account created successfully!")
 # Login Function
@@ -117,22 +92,19 @@ def login():
         new_password = st.text_input("Enter your new password", type="password")
 
         if st.button("Reset Password"):
-            users_df = load_csv(users_file)
-            accounts_df = load_csv(accounts_file)
-
-            user_row = users_df[users_df["username"] == username]
+            user_row = users_table.rows("username", username)
             if user_row.empty:
                 st.error("❌ Username not found.")
                 return
 
             user_id = user_row.iloc[0]["user_id"]
-            acc_row = accounts_df[(accounts_df["user_id"] == user_id) & (accounts_df["mobile"] == mobile)]
+            acc_row = accounts_table.rows("user_id", user_id)
+            acc_row = acc_row[acc_row["mobile"] == mobile]
 
             if acc_row.empty:
                 st.error("❌ Mobile number does not match our records.")
             else:
-                users_df.loc[users_df["username"] == username, "password"] = hash_password(new_password)
-                save_csv(users_df, users_file)
+                auth.set_password(username, new_password)
                 st.success("✅ Password reset successful! You may now log in.")
         return
 
@@ -141,35 +113,28 @@ def login():
     password = st.text_input("Password", type="password")
 
     if st.button("Login"):
-        users_df = load_csv(users_file)
-
-        required_cols = {"username", "password", "role", "user_id"}
-        if not required_cols.issubset(set(users_df.columns)):
-            st.error("Error: 'users.csv' is missing required columns.")
-            st.stop()
-
-        user = users_df[
-            (users_df["username"] == username) &
-            (users_df["password"] == password)
-        ]
-
-        if not user.empty:
-            st.session_state.user = user.iloc[0].to_dict()
+        try:
+            st.session_state.auth_token = auth.login(username, password, st.context.ip_address)
+        except auth.LoginError as e:
+            st.error(str(e))
+        else:
+            st.session_state.user = auth.sessions.user(st.session_state.auth_token)
             st.success(f"Logged in as {username}")
             st.rerun()
-        else:
-            st.error("Invalid username or password")
 
 
 # Admin Dashboard
 def admin_dashboard():
-    import matplotlib.pyplot as plt
     st.sidebar.title("Admin Panel")
     option = st.sidebar.radio("Select", [
         "📃 All Applications",
         "✅ Pending Loans",
         "🔍 Fetch User Info",
-        "📊 Loan Summary & Analytics"
+        "📊 Loan Summary & Analytics",
+        "💼 Loan Portfolio",
+        "🧵 Background Jobs",
+        "📦 Import / Export",
+        "⏱️ Performance"
     ])
 
     if option == "📃 All Applications":
@@ -178,143 +143,142 @@ def admin_dashboard():
     # Add sorting/filtering option by loan status
         sort_option = st.selectbox("🔍 Filter by Loan Status", ["All", "approved", "pending", "declined"])
         if sort_option == "All":
-            filtered_loans = loans_df
+            paged_grid(loans_table, "all_loans", sort_by="application_date", ascending=False)
         else:
-            filtered_loans = loans_df[loans_df["status"] == sort_option]
-
-        st.dataframe(filtered_loans.reset_index(drop=True))
+            paged_grid(loans_table, "all_loans", "status", sort_option, sort_by="application_date", ascending=False)
+        # Status is derived from the loan rows; the CSV is only built when the button is clicked
+        st.download_button("📥 Download Loan Status", lambda: loan_status.frame().to_csv(index=False), "loan_status.csv", "text/csv")
+        if backend.exists(loan_status_file):
+            st.warning("An old loan status table is still stored and isn't used. "
+                       "Fold it into the loans with `python storage.py reconcile-loans`.")
 
 
     elif option == "✅ Pending Loans":
         st.subheader(" Manual Loan Approvals")
-        train_df = loans_df[loans_df["status"] != "pending"]
-        if train_df.empty or len(train_df["status"].unique()) < 2:
-            st.warning("Not enough historical data to train model.")
-            return
-
-        train_df = train_df[["amount", "income", "status"]].dropna()
-        X = train_df[["amount", "income"]]
-        y = (train_df["status"] == "approved").astype(int)
-
-        model = LogisticRegression()
-        model.fit(X, y)
-
-        pending_loans = loans_df[loans_df["status"] == "pending"]
-        if pending_loans.empty:
+        if loans_table.count("status", "pending") == 0:
             st.info("No pending loan applications.")
             return
 
-        review_required = []
-        for idx, row in pending_loans.iterrows():
-            X_test = np.array([[row["amount"], row["income"]]])
-            prob = model.predict_proba(X_test)[0][1]
-            risk_score = round((1 - prob) * 100, 2)
-            loan_id = row['loan_id']
-            remark = f"Predicted Risk Score: {risk_score}%"
-
-            if risk_score <= 39:
-                loans_df.loc[loans_df["loan_id"] == loan_id, "status"] = "approved"
-                loans_df.loc[loans_df["loan_id"] == loan_id, "remarks"] = f"Auto-approved. {remark}"
-                loan_status_df.loc[loan_status_df["loan_id"] == loan_id, "status"] = "approved"
-                loan_status_df.loc[loan_status_df["loan_id"] == loan_id, "remarks"] = f"Auto-approved. {remark}"
-                st.success(f"✅ Loan {loan_id} auto-approved (Low Risk)")
-            elif risk_score >= 61:
-                loans_df.loc[loans_df["loan_id"] == loan_id, "status"] = "declined"
-                loans_df.loc[loans_df["loan_id"] == loan_id, "remarks"] = f"Auto-declined. {remark}"
-                loan_status_df.loc[loan_status_df["loan_id"] == loan_id, "status"] = "declined"
-                loan_status_df.loc[loan_status_df["loan_id"] == loan_id, "remarks"] = f"Auto-declined. {remark}"
-                st.error(f"❌ Loan {loan_id} auto-declined (High Risk)")
-            else:
-                review_required.append((row, risk_score))
-
-        save_csv(loans_df, loans_file)
-        save_csv(loan_status_df, loan_status_file)
-
-        if review_required:
-            st.warning("⚠️ Loans requiring admin review (Average Risk)")
-            if "loan_action_taken" not in st.session_state:
-                st.session_state.loan_action_taken = False
-
-            for row, risk_score in review_required:
-                st.markdown(f"### Loan ID: {row['loan_id']}")
-                st.write(row)
-                st.info(f"Predicted Risk Score: {risk_score}%")
-
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button(f"Approve {row['loan_id']}", key=f"approve_{row['loan_id']}"):
-                        loans_df.loc[loans_df["loan_id"] == row["loan_id"], "status"] = "approved"
-                        loans_df.loc[loans_df["loan_id"] == row["loan_id"], "remarks"] = f"Admin-approved. Risk Score: {risk_score}%"
-                        loan_status_df.loc[loan_status_df["loan_id"] == row["loan_id"], "status"] = "approved"
-                        loan_status_df.loc[loan_status_df["loan_id"] == row["loan_id"], "remarks"] = f"Admin-approved. Risk Score: {risk_score}%"
-                        save_csv(loans_df, loans_file)
-                        save_csv(loan_status_df, loan_status_file)
-                        st.session_state.loan_action_taken = True
-                with col2:
-                    if st.button(f"Decline {row['loan_id']}", key=f"decline_{row['loan_id']}"):
-                        loans_df.loc[loans_df["loan_id"] == row["loan_id"], "status"] = "declined"
-                        loans_df.loc[loans_df["loan_id"] == row["loan_id"], "remarks"] = f"Admin-declined. Risk Score: {risk_score}%"
-                        loan_status_df.loc[loan_status_df["loan_id"] == row["loan_id"], "status"] = "declined"
-                        loan_status_df.loc[loan_status_df["loan_id"] == row["loan_id"], "remarks"] = f"Admin-declined. Risk Score: {risk_score}%"
-                        save_csv(loans_df, loans_file)
-                        save_csv(loan_status_df, loan_status_file)
-                        st.session_state.loan_action_taken = True
-
-            if st.session_state.loan_action_taken:
-                st.session_state.loan_action_taken = False
-                st.rerun()
+        # Scoring and the automatic decisions run as a background job; this page only queues it and shows progress
+        job = job_queue.active("auto_decide") or job_queue.submit("auto_decide", key=decision_key())
+        if job["status"] in ("queued", "running"):
+            total = job["total"] or 0
+            st.progress(job["done"] / total if total else 0.0, text=f"Auto-decisioning: {job['message']} ({job['done']} of {total or '?'})")
+            st.button("🔄 Refresh")
+        elif job["status"] == "failed":
+            st.error(f"Auto-decisioning failed: {job['error']}")
+        elif job["result"].get("skipped"):
+            st.warning(job["result"]["skipped"])
+        else:
+            result = job["result"]
+            if result["approved"]:
+                st.success(f"✅ {result['approved']} loan(s) auto-approved (Low Risk)")
+            if result["declined"]:
+                st.error(f"❌ {result['declined']} loan(s) auto-declined (High Risk)")
+
+        st.warning("⚠️ Loans requiring admin review (Average Risk)")
+        # Only one page of the review queue is rendered, however long the queue is
+        page_size = 10
+        pages = max(1, -(-loans_table.count("status", "pending") // page_size))
+        page_no = min(st.session_state.get("review_page", 1), pages)
+        st.session_state.review_page = page_no
+        review_required, _ = loans_table.page((page_no - 1) * page_size, page_size, "status", "pending", sort_by="application_date")
+        st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key="review_page")
+
+        if "loan_action_taken" not in st.session_state:
+            st.session_state.loan_action_taken = False
+
+        for _, row in review_required.iterrows():
+            risk_score = risk_score_from_remarks(row["remarks"])
+            st.markdown(f"### Loan ID: {row['loan_id']}")
+            st.write(row)
+            st.info(f"Predicted Risk Score: {risk_score}%" if risk_score != "n/a" else "Not scored yet")
+
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button(f"Approve {row['loan_id']}", key=f"approve_{row['loan_id']}"):
+                    decision = {"status": "approved", "remarks": decision_remarks("approved", row["remarks"])}
+                    loans_table.update("loan_id", row["loan_id"], decision)
+                    st.session_state.loan_action_taken = True
+            with col2:
+                if st.button(f"Decline {row['loan_id']}", key=f"decline_{row['loan_id']}"):
+                    decision = {"status": "declined", "remarks": decision_remarks("declined", row["remarks"])}
+                    loans_table.update("loan_id", row["loan_id"], decision)
+                    st.session_state.loan_action_taken = True
+
+        # Decisions for the whole page are written by a background job
+        col1, col2 = st.columns(2)
+        for col, status, label in [(col1, "approved", "Approve"), (col2, "declined", "Decline")]:
+            if col.button(f"{label} all on this page", key=f"bulk_{status}"):
+                updates = [{"loan_id": row["loan_id"], "status": status, "remarks": decision_remarks(status, row["remarks"])}
+                           for _, row in review_required.iterrows()]
+                job_queue.submit("bulk_status", {"updates": updates}, key=json.dumps(updates, default=str))
+                st.session_state.loan_action_taken = True
+
+        if st.session_state.loan_action_taken:
+            st.session_state.loan_action_taken = False
+            st.rerun()
 
     elif option == "🔍 Fetch User Info":
         st.subheader("Fetch User Details")
         username_input = st.text_input("Enter Username")
+        # Remember the lookup so paging through the history doesn't clear it
         if st.button("Fetch Info"):
-            user_info = users_df[users_df["username"] == username_input]
+            st.session_state.fetched_username = username_input
+        fetched_username = st.session_state.get("fetched_username")
+        if fetched_username is not None:
+            user_info = users_table.rows("username", fetched_username)
             if user_info.empty:
                 st.error("User not found.")
             else:
                 user_id = user_info.iloc[0]['user_id']
-                account_info = accounts_df[accounts_df['user_id'] == user_id]
-                transaction_info = transactions_df[transactions_df['user_id'] == user_id]
-                loan_info = loans_df[loans_df['user_id'] == user_id]
+                account_info = accounts_table.rows("user_id", user_id)
+                loan_info = loans_table.rows("user_id", user_id)
                 st.write("👤 User Info", user_info.drop(columns=['password'], errors='ignore'))
                 st.write("🏦 Account Info", account_info)
-                st.write("💸 Transaction History", transaction_info)
+                st.write("💸 Transaction History")
+                paged_grid(transactions_table, "user_transactions", "user_id", user_id, sort_by="date", ascending=False)
                 st.write("📄 Loan History", loan_info)
 
     elif option == "📊 Loan Summary & Analytics":
         st.subheader("📊 Loan Analytics Dashboard")
-        loans_df["application_date"] = pd.to_datetime(loans_df["application_date"], errors='coerce')
-        start_date, end_date = st.date_input("Select Date Range", [loans_df["application_date"].min(), loans_df["application_date"].max()])
+        # Metrics and charts are rolled up from the pre-aggregated loan cube, not the loan rows
+        cells = loan_cube.cells()
+        start_date, end_date = st.date_input("Select Date Range", [cells["day"].min(), cells["day"].max()])
 
-        filtered = loans_df[(loans_df["application_date"] >= pd.to_datetime(start_date)) &
-                            (loans_df["application_date"] <= pd.to_datetime(end_date))]
+        filtered = loan_cube.cells(start_date, end_date)
 
         if filtered.empty:
             st.info("No loan applications found in this date range.")
             return
 
         col1, col2, col3 = st.columns(3)
-        col1.metric("Total Loans", len(filtered))
-        col2.metric("Approved", (filtered["status"] == "approved").sum())
-        col3.metric("Declined", (filtered["status"] == "declined").sum())
-
-        csv = filtered.to_csv(index=False)
-        st.download_button("📥 Download Filtered Loan Data", csv, "loan_summary.csv", "text/csv")
-
-        monthly = filtered.groupby([filtered["application_date"].dt.to_period("M"), "status"]).size().unstack().fillna(0)
-        monthly.index = monthly.index.astype(str)
+        col1.metric("Total Loans", int(filtered["count"].sum()))
+        col2.metric("Approved", int(filtered.loc[filtered["status"] == "approved", "count"].sum()))
+        col3.metric("Declined", int(filtered.loc[filtered["status"] == "declined", "count"].sum()))
+
+        # The CSV is only built when the button is clicked
+        st.download_button("📥 Download Filtered Loan Data", lambda: loans_between(start_date, end_date).to_csv(index=False),
+                           "loan_summary.csv", "text/csv")
+
+        # Interactive charts send just the aggregated points and zoom in the browser; static ones are PNGs
+        chart_mode = st.radio("Charts", CHART_MODES, index=CHART_MODES.index(CHART_MODE), horizontal=True,
+                              format_func={"plotly": "Interactive", "matplotlib": "Static"}.get, key="chart_mode")
+        with timed("analytics_groupby"):
+            monthly = filtered.groupby([filtered["day"].dt.to_period("M"), "status"])["count"].sum().unstack().fillna(0)
+            monthly.index = monthly.index.astype(str)
         st.write("### 📈 Monthly Loan Approval Trends")
-        fig1, ax1 = plt.subplots()
-        monthly.plot(ax=ax1, marker='o')
-        ax1.set_title("Loan Status Over Time")
-        st.pyplot(fig1)
+        with timed("chart_render"):
+            chart("line", monthly, "Loan Status Over Time", chart_mode)
 
         st.write("### ✅ Low Risk People (Auto-Approved Loans with Low Risk Score)")
 
 # Filter for auto-approved loans with 'Auto-approved' in remarks
-        low_risk_loans = filtered[
-            (filtered["status"] == "approved") &
-            (filtered["remarks"].str.contains("Auto-approved", na=False))
+        low_risk_loans = loans_table.rows("status", "approved")
+        approved_on = pd.to_datetime(low_risk_loans["application_date"], errors='coerce')
+        low_risk_loans = low_risk_loans[
+            (approved_on >= pd.to_datetime(start_date)) & (approved_on <= pd.to_datetime(end_date)) &
+            (low_risk_loans["remarks"].str.contains("Auto-approved", na=False))
         ]
 
         if low_risk_loans.empty:
@@ -325,11 +289,159 @@ def admin_dashboard():
 
 
         st.write("### 🎯 Loan Status by Purpose")
-        purpose_summary = filtered.groupby(["purpose", "status"]).size().unstack().fillna(0)
-        fig2, ax2 = plt.subplots()
-        purpose_summary.plot(kind="bar", stacked=True, ax=ax2)
-        ax2.set_title("Loan Purpose vs Status")
-        st.pyplot(fig2)
+        with timed("analytics_groupby"):
+            purpose_summary = filtered.groupby(["purpose", "status"])["count"].sum().unstack().fillna(0)
+        with timed("chart_render"):
+            chart("bar", purpose_summary, "Loan Purpose vs Status", chart_mode)
+
+        # Only where storage can read just the months in range (partitioned or SQLite); anywhere
+        # else this would parse every transaction, which the rest of the page never touches
+        if backend.pushes_down(transactions_file, "date"):
+            st.write("### 💸 Monthly Transaction Volume")
+            with timed("analytics_groupby"):
+                tx = transactions_table.between("date", start_date, pd.Timestamp(end_date) + pd.Timedelta(days=1))
+                amount = pd.to_numeric(tx["amount"], errors="coerce")
+                volume = pd.DataFrame({"In": amount.clip(lower=0), "Out": -amount.clip(upper=0)}).groupby(
+                    tx["date"].dt.to_period("M").astype(str).to_numpy()).sum()
+            if volume.empty:
+                st.info("No transactions in this date range.")
+            else:
+                with timed("chart_render"):
+                    chart("line", volume, "Money In and Out by Month", chart_mode)
+
+    elif option == "💼 Loan Portfolio":
+        st.subheader("💼 Loan Portfolio")
+        # Every approved loan is priced at once with array math; nothing is looped per loan
+        with timed("portfolio"):
+            totals, per_loan = portfolio()
+        if per_loan.empty:
+            st.info("No approved loans.")
+            return
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Approved Loans", f"{totals['loans']:,}")
+        col2.metric("Total Outstanding", f"₹{totals['outstanding']:,.2f}")
+        col3.metric("Due in Next 30 Days", f"₹{totals['due_next_days']:,.2f}")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Principal Lent", f"₹{totals['principal']:,.2f}")
+        col2.metric("Monthly EMI Inflow", f"₹{totals['monthly_inflow']:,.2f}")
+        col3.metric("Overdue", f"₹{totals['overdue_amount']:,.2f}", f"{totals['overdue_loans']:,} loans", delta_color="inverse")
+
+        st.write("### Outstanding by Purpose")
+        by_purpose = per_loan.groupby("purpose", observed=True)[["principal", "outstanding", "due_next_30_days", "overdue_amount"]].sum()
+        st.dataframe(by_purpose.round(2))
+
+        st.write("### Largest Overdue Loans")
+        st.dataframe(per_loan.nlargest(25, "overdue_amount").reset_index(drop=True))
+
+    elif option == "🧵 Background Jobs":
+        st.subheader("🧵 Background Jobs")
+        col1, col2, col3 = st.columns(3)
+        if col1.button("Run auto-decisioning"):
+            job_queue.submit("auto_decide", key=decision_key())
+        if col2.button("Compact transaction ledger"):
+            job_queue.submit("compact")
+        col3.button("🔄 Refresh")
+
+        jobs = job_queue.jobs(limit=50)
+        if not jobs:
+            st.info("No jobs yet.")
+            return
+        for job in jobs:
+            if job["status"] in ("queued", "running"):
+                total = job["total"] or 0
+                st.progress(job["done"] / total if total else 0.0, text=f"{job['id']}: {job['message']} ({job['done']} of {total or '?'})")
+        table = pd.DataFrame(jobs)
+        for col in ["created", "started", "finished"]:
+            table[col] = pd.to_datetime(table[col], unit="s").dt.strftime("%Y-%m-%d %H:%M:%S")
+        table["result"] = table["result"].map(lambda r: json.dumps(r, default=str) if r is not None else "")
+        st.dataframe(table[["id", "kind", "status", "done", "total", "message", "attempts", "created", "finished", "result", "error"]])
+
+    elif option == "📦 Import / Export":
+        st.subheader("📦 Import / Export")
+        st.write("### Export")
+        name = st.selectbox("Table", list(bulk_tables), key="export_table")
+        table = bulk_tables[name]
+        columns = st.multiselect("Columns (all if none picked)", list(table.load().columns), key="export_columns")
+        fmt = st.radio("Format", list(bulk_formats), horizontal=True, key="export_format")
+
+        def exported():
+            buffer = io.BytesIO()
+            export_table(table, buffer, columns or None, fmt)
+            return buffer.getvalue()
+
+        # The file is only written when the button is clicked
+        st.download_button("📥 Download", exported, f"{name}{bulk_formats[fmt]}", "application/octet-stream")
+
+        st.write("### Import")
+        name = st.selectbox("Into table", list(bulk_tables), key="import_table")
+        table = bulk_tables[name]
+        upload = st.file_uploader("Parquet or Arrow file", type=["parquet", "arrow", "feather"])
+        if upload is not None:
+            # Saved under its content hash, so uploading the same file again maps to the same import job
+            data = upload.getvalue()
+            os.makedirs(imports_path, exist_ok=True)
+            path = os.path.join(imports_path, hashlib.sha1(data).hexdigest()[:16] + os.path.splitext(upload.name)[1].lower())
+            if not os.path.exists(path):
+                with open(path, "wb") as f:
+                    f.write(data)
+            try:
+                schema, rows = describe(path)
+            except Exception as e:
+                st.error(f"Couldn't read {upload.name}: {e}")
+                return
+            st.caption(f"{rows:,} rows; columns: {', '.join(schema.names)}")
+            columns = st.multiselect("Columns to import (all if none picked)", schema.names, key="import_columns")
+            problems = check_schema(table, schema, columns or None)
+            for problem in problems:
+                st.error(problem)
+            mode = st.radio("Mode", ["append", "replace"], horizontal=True,
+                            help="Append skips rows whose key is already stored; replace swaps the whole table for the file")
+            confirmed = mode == "append" or st.checkbox(f"Replace every row of {name} with the file's rows")
+            if st.button("Import", disabled=bool(problems) or not confirmed):
+                params = {"table": name, "path": path, "columns": columns or None, "mode": mode}
+                st.session_state.import_job = job_queue.submit("bulk_import", params, key=json.dumps(params))["id"]
+
+        job = job_queue.get(st.session_state.get("import_job", ""))
+        if job is not None:
+            if job["status"] in ("queued", "running"):
+                total = job["total"] or 0
+                st.progress(job["done"] / total if total else 0.0, text=f"Importing: {job['done']:,} of {total or '?'} rows")
+                st.button("🔄 Refresh", key="import_refresh")
+            elif job["status"] == "failed":
+                st.error(f"Import failed: {job['error']}")
+            else:
+                st.success(f"{job['result']['imported']:,} rows imported, {job['result']['skipped']:,} already stored or repeated")
+
+    elif option == "⏱️ Performance":
+        st.subheader("⏱️ Performance")
+        snapshot = profiler.snapshot()
+        stages = pd.DataFrame.from_dict(snapshot["stages"], orient="index")
+        if stages.empty:
+            st.info("No timings recorded yet.")
+            return
+        st.caption(f"Process {snapshot['pid']}, percentiles over the last {snapshot['window']} samples of each stage")
+        st.dataframe(stages.round(2))
+        st.bar_chart(stages[["p50_ms", "p95_ms", "p99_ms"]])
+
+        # The panel renders inside the current rerun, so show the one before it
+        last = st.session_state.get("last_request_timings")
+        if last:
+            st.write("### Previous rerun in this session (ms)")
+            st.dataframe(pd.Series(last, name="ms").mul(1000).round(2).sort_values(ascending=False))
+
+        col1, col2, col3 = st.columns(3)
+        col1.download_button("📥 Download JSON", json.dumps(snapshot, indent=2), "timings.json", "application/json")
+        # The target comes from the server's BANK_METRICS_EXPORT setting only; it can't be changed from the browser
+        col2.text_input("Export to file or URL", EXPORT_TARGET or "Set BANK_METRICS_EXPORT to enable", disabled=True)
+        if col2.button("Export now", disabled=not EXPORT_TARGET):
+            try:
+                st.success(f"Exported to {profiler.export()}")
+            except Exception as e:
+                st.error(f"Export failed: {e}")
+        if col3.button("Reset timings"):
+            profiler.reset()
+            st.rerun()
 
 # User Dashboard
 def user_dashboard():
@@ -348,16 +460,24 @@ def user_dashboard():
 
     if choice == "📈 Account Summary":
         st.subheader("Account Summary")
-        acc = accounts_df[accounts_df["user_id"] == user_id]
+        acc = accounts_table.rows("user_id", user_id)
         st.dataframe(acc)
+        summary = account_summary(user_id, DEFAULT_TENURE_MONTHS)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Balance", f"₹{summary['balance']:,.2f}")
+        col2.metric("Active Loans", summary["active_loans"])
+        col3.metric("EMIs Paid", summary["emis_paid"])
 
     elif choice == "📝 Apply for Loan":
         st.subheader("Loan Application Form")
         amount = st.number_input("Loan Amount", min_value=1000)
         purpose = st.selectbox("Purpose", ["Education", "Medical", "Home Renovation", "Vehicle", "Business", "Personal"])
         income = st.number_input("Monthly Income", min_value=0)
+        tenure_options = sorted({6, 12, 24, 36, 60, DEFAULT_TENURE_MONTHS})
+        tenure_months = st.selectbox("Tenure (months)", tenure_options, index=tenure_options.index(DEFAULT_TENURE_MONTHS))
+        st.caption(f"Interest rate: {DEFAULT_ANNUAL_RATE:g}% p.a. · Estimated EMI: ₹{float(compute_emi(amount, DEFAULT_ANNUAL_RATE, tenure_months)):,.2f}")
         if st.button("Submit Application"):
-            loan_id = f"L{len(loans_df)+1:03d}"
+            loan_id = f"L{loans_table.size()+1:03d}"
             new_loan = {
                 "loan_id": loan_id,
                 "user_id": user_id,
@@ -366,170 +486,128 @@ def user_dashboard():
                 "income": income,
                 "status": "pending",
                 "application_date": pd.Timestamp.today().strftime('%Y-%m-%d'),
-                "remarks": "Awaiting review"
+                "remarks": "Awaiting review",
+                "interest_rate": DEFAULT_ANNUAL_RATE,
+                "tenure_months": tenure_months
             }
-            loans_df_updated = pd.concat([loans_df, pd.DataFrame([new_loan])], ignore_index=True)
-            st.session_state.loans_df = loans_df_updated
-            st.session_state.loan_status_df = loans_df_updated
-            save_csv(loans_df_updated, loans_file)
-            save_csv(loans_df_updated, loan_status_file)
+            loans_table.insert([new_loan])
             st.success("Loan Application Submitted!")
 
     elif choice == "📊 Loan Status":
         st.subheader("Your Loan Applications")
-        user_loans = loans_df[loans_df["user_id"] == user_id]
+        user_loans = loans_table.rows("user_id", user_id)
         st.dataframe(user_loans)
 
 
     elif choice == "💵 Transactions":
         st.subheader("Transaction History")
-        tx = transactions_df[transactions_df["user_id"] == user_id]
+        tx = transactions_table.rows("user_id", user_id)
         st.dataframe(tx)
 
     elif choice == "💳 Pay Monthly EMI":
         st.subheader("Pay Monthly EMI")
-        user_loans = loans_df[(loans_df["user_id"] == user_id) & (loans_df["status"] == "approved")]
+        user_loans = loans_table.rows("user_id", user_id)
+        user_loans = user_loans[user_loans["status"] == "approved"]
         if user_loans.empty:
             st.info("No active loans found.")
             return
 
         selected_loan_id = st.selectbox("Select Loan ID", user_loans["loan_id"].values)
-        loan_row = user_loans[user_loans["loan_id"] == selected_loan_id].iloc[0]
+        selected_loan = user_loans[user_loans["loan_id"] == selected_loan_id].iloc[:1]
+        loan_row = selected_loan.iloc[0]
 
         loan_amount = loan_row["amount"]
         application_date = pd.to_datetime(loan_row["application_date"], errors="coerce")
-        annual_interest_rate = 10
-        tenure_months = 12
-        monthly_rate = annual_interest_rate / (12 * 100)
-
-        emi = (loan_amount * monthly_rate * (1 + monthly_rate) ** tenure_months) / ((1 + monthly_rate) ** tenure_months - 1)
-        emi = round(emi, 2)
+        principal, annual_interest_rate, tenure = loan_terms(selected_loan)
+        annual_interest_rate, tenure_months = float(annual_interest_rate[0]), int(tenure[0])
+        emi = float(compute_emi(principal[0], annual_interest_rate, tenure_months))
 
-        loan_payments = transactions_df[
-            (transactions_df["user_id"] == user_id) &
-            (transactions_df["loan_id"] == selected_loan_id)
-        ].sort_values("date")
-
-        paid_emi_count = loan_payments.shape[0]
+        # EMIs paid so far come from the per-user summary, not a scan of the transactions
+        loans = account_summary(user_id, DEFAULT_TENURE_MONTHS)["loans"].set_index("loan_id")
+        paid_emi_count = int(loans.at[selected_loan_id, "emis_paid"]) if selected_loan_id in loans.index else 0
         remaining_emi = max(0, tenure_months - paid_emi_count)
 
         st.write(f"📄 Loan Amount: ₹{loan_amount}")
-        st.write(f"💰 Monthly EMI: ₹{emi}")
+        st.write(f"💰 Monthly EMI: ₹{emi} at {annual_interest_rate:g}% p.a.")
         st.write(f"📆 Remaining EMIs: {remaining_emi} of {tenure_months}")
 
         if remaining_emi == 0:
-            loans_df.loc[loans_df["loan_id"] == selected_loan_id, "status"] = "closed"
-            loans_df.loc[loans_df["loan_id"] == selected_loan_id, "remarks"] = f"Loan fully repaid on {pd.Timestamp.today().date()}"
-            loan_status_df.loc[loan_status_df["loan_id"] == selected_loan_id, "status"] = "closed"
-            loan_status_df.loc[loan_status_df["loan_id"] == selected_loan_id, "remarks"] = f"Loan fully repaid on {pd.Timestamp.today().date()}"
-            save_csv(loans_df, loans_file)
-            save_csv(loan_status_df, loan_status_file)
+            closure = {"status": "closed", "remarks": f"Loan fully repaid on {pd.Timestamp.today().date()}"}
+            loans_table.update("loan_id", selected_loan_id, closure)
             st.success("🎉 This loan has been fully repaid and is now marked as CLOSED.")
             return
 
         method = st.radio("Choose Payment Method", ["UPI", "Net Banking"])
         if st.button("Pay EMI"):
             new_tx = {
+                "transaction_id": new_transaction_id(),
                 "user_id": user_id,
                 "loan_id": selected_loan_id,
                 "amount": emi,
                 "method": method,
                 "date": pd.Timestamp.today().strftime('%Y-%m-%d')
             }
-            transactions_df.loc[len(transactions_df)] = new_tx
-            save_csv(transactions_df, transactions_file)
+            transactions_table.insert([new_tx])
             st.success(f"✅ EMI of ₹{emi} paid successfully for Loan {selected_loan_id}")
             st.rerun()
 
         st.write("### 🗓️ EMI Payment Schedule")
-        emi_schedule = []
-        for i in range(tenure_months):
-            due_date = application_date + pd.DateOffset(months=i)
-            status = "Paid" if i < paid_emi_count else ("Due" if i == paid_emi_count else "Upcoming")
-            emi_schedule.append({
-                "Installment #": i + 1,
-                "Due Date": due_date.date(),
-                "EMI Amount": emi,
-                "Status": status
-            })
-
-        schedule_df = pd.DataFrame(emi_schedule)
-        st.dataframe(schedule_df)
+        if pd.isna(application_date):
+            application_date = pd.Timestamp.today()
+        st.dataframe(schedule(principal[0], annual_interest_rate, tenure_months, application_date, paid_emi_count))
 
     elif choice == "📚 Loan Repayment History":
         st.subheader("Loan Repayment History")
-        user_tx = transactions_df[transactions_df["user_id"] == user_id]
         required_cols = {"loan_id", "amount"}
-        if not required_cols.issubset(user_tx.columns):
+        if not required_cols.issubset(transactions_table.columns):
             st.warning("⚠️ Transactions data is missing 'loan_id' or 'amount' columns.")
             return
-        if user_tx.empty:
+        if transactions_table.count("user_id", user_id) == 0:
             st.info("No repayments made yet.")
         else:
-            st.dataframe(user_tx)
-            summary = user_tx.groupby("loan_id")["amount"].sum().reset_index().rename(columns={"amount": "Total Paid"})
+            paged_grid(transactions_table, "repayment_history", "user_id", user_id, sort_by="date", ascending=False)
+            loans = account_summary(user_id, DEFAULT_TENURE_MONTHS)["loans"]
+            summary = loans.loc[loans["emis_paid"] > 0, ["loan_id", "total_paid"]].rename(columns={"total_paid": "Total Paid"})
             st.write("### Summary of Paid Amount by Loan")
-            st.dataframe(summary)
+            st.dataframe(summary.reset_index(drop=True))
             
     elif choice == "🏦 Transfer ammount":
         st.subheader("Transfer Amount to Another Account")
 
-        sender_account = accounts_df[accounts_df["user_id"] == user_id].iloc[0]
         recipient_account_no = st.text_input("Recipient Account Number")
         transfer_amount = st.number_input("Amount to Transfer", min_value=1.0)
 
         if st.button("Transfer"):
             if not recipient_account_no:
                 st.warning("Please enter a valid recipient account number.")
-            elif sender_account["account_no"] == recipient_account_no:
-                st.error("You cannot transfer to your own account.")
-            elif transfer_amount > sender_account["balance"]:
-                st.error("Insufficient balance.")
-            elif recipient_account_no not in accounts_df["account_no"].values:
-                st.error("Recipient account not found.")
             else:
-            # Deduct from sender
-                accounts_df.loc[accounts_df["user_id"] == user_id, "balance"] -= transfer_amount
-            # Add to recipient
-                accounts_df.loc[accounts_df["account_no"] == recipient_account_no, "balance"] += transfer_amount
-
-            # Save updated balances
-                save_csv(accounts_df, accounts_file)
-
-            # Log transactions for both sender and recipient (optional)
-                sender_tx = {
-                  "user_id": user_id,
-                  "loan_id": "",
-                  "amount": -transfer_amount,
-                  "method": "Transfer Out",
-                  "date": pd.Timestamp.today().strftime('%Y-%m-%d')
-                }
-                recipient_user_id = accounts_df[accounts_df["account_no"] == recipient_account_no].iloc[0]["user_id"]
-                recipient_tx = {
-                   "user_id": recipient_user_id,
-                   "loan_id": "",
-                   "amount": transfer_amount,
-                   "method": "Transfer In",
-                   "date": pd.Timestamp.today().strftime('%Y-%m-%d')
-                }
-
-                transactions_df.loc[len(transactions_df)] = sender_tx
-                transactions_df.loc[len(transactions_df)] = recipient_tx
-                save_csv(transactions_df, transactions_file)
-
-                st.success(f"₹{transfer_amount} transferred successfully to account {recipient_account_no}")
+                # Debit, credit and both transaction rows are stored together under the account locks
+                try:
+                    transfer(user_id, recipient_account_no, transfer_amount)
+                except TransferError as e:
+                    st.error(str(e))
+                else:
+                    st.success(f"₹{transfer_amount} transferred successfully to account {recipient_account_no}")
 
 
 
 # Main App Logic
-if st.session_state.user:
-    st.sidebar.write(f"👋 Welcome, {st.session_state.user['username']}")
-    if st.sidebar.button("Logout"):
-        st.session_state.user = None
-        st.rerun()
-    if st.session_state.user.get("role") == "admin":
-        admin_dashboard()
+try:
+    # The session token is checked on every rerun without touching the password again;
+    # it stops working on logout, expiry or a password reset
+    if st.session_state.user:
+        st.session_state.user = auth.sessions.user(st.session_state.get("auth_token"))
+    if st.session_state.user:
+        st.sidebar.write(f"👋 Welcome, {st.session_state.user['username']}")
+        if st.sidebar.button("Logout"):
+            auth.sessions.revoke(st.session_state.auth_token)
+            st.session_state.user = None
+            st.rerun()
+        if st.session_state.user.get("role") == "admin":
+            admin_dashboard()
+        else:
+            user_dashboard()
     else:
-        user_dashboard()
-else:
-    login()
+        login()
+finally:
+    st.session_state.last_request_timings = profiler.end_request()
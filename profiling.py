@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import atexit
+import threading
+import contextlib
+import functools
+import urllib.request
+from collections import deque
+import numpy as np
+
+# Set BANK_PROFILING=0 to turn the timers into no-ops
+ENABLED = os.environ.get("BANK_PROFILING", "1") != "0"
+
+# Where to push snapshots: a file path (appended as JSON lines) or an http(s) URL (POSTed as JSON)
+EXPORT_TARGET = os.environ.get("BANK_METRICS_EXPORT")
+EXPORT_SECONDS = float(os.environ.get("BANK_METRICS_EXPORT_SECONDS", "60"))
+
+# Latency samples kept per stage; percentiles are over this rolling window
+WINDOW = int(os.environ.get("BANK_METRICS_WINDOW", "2048"))
+
+
+class StageStats:
+    """Latencies of one stage: lifetime count/total/max plus a rolling window for percentiles."""
+
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        p50, p95, p99 = np.percentile(np.fromiter(self.samples, float), [50, 95, 99]) if self.samples else (0.0, 0.0, 0.0)
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": p50 * 1000,
+            "p95_ms": p95 * 1000,
+            "p99_ms": p99 * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class Profiler:
+    """Per-process stage timings shared by every session.
+
+    ``timed(stage)`` records one sample for ``stage`` into the process-wide
+    stats and into the breakdown of the request (Streamlit rerun) running on
+    the current thread, which ``begin_request``/``end_request`` delimit.
+    """
+
+    def __init__(self, enabled=ENABLED, window=WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self.started = time.time()
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._exporter = None
+
+    def record(self, stage, seconds):
+        with self._lock:
+            stats = self._stats.get(stage)
+            if stats is None:
+                stats = self._stats[stage] = StageStats(self.window)
+            stats.add(seconds)
+        request = getattr(self._local, "request", None)
+        if request is not None:
+            request[stage] = request.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def timed(self, stage):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def timer(self, stage):
+        """Decorator form of ``timed``."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timed(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    # Requests
+    def begin_request(self):
+        self._local.request = {}
+        self._local.request_start = time.perf_counter()
+
+    def end_request(self, stage="rerun"):
+        """Finish the current request; returns its stage -> seconds breakdown."""
+        request = getattr(self._local, "request", None)
+        if request is None:
+            return {}
+        self._local.request = None
+        if self.enabled:
+            seconds = time.perf_counter() - self._local.request_start
+            self.record(stage, seconds)
+            request[stage] = seconds
+        return request
+
+    # Reporting
+    def snapshot(self):
+        with self._lock:
+            stages = {stage: stats.summary() for stage, stats in sorted(self._stats.items())}
+        return {"pid": os.getpid(), "started": self.started, "at": time.time(), "window": self.window, "stages": stages}
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def export(self, target=None):
+        """Write a snapshot to ``target``: JSON lines appended to a file, or a POST to an http(s) URL."""
+        target = target or EXPORT_TARGET
+        if not target:
+            return None
+        payload = json.dumps(self.snapshot())
+        if target.startswith(("http://", "https://")):
+            request = urllib.request.Request(target, payload.encode(), {"Content-Type": "application/json"})
+            with urllib.request.urlopen(request, timeout=5):
+                pass
+        else:
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            with open(target, "a") as f:
+                f.write(payload + "\n")
+        return target
+
+    def _export_quietly(self):
+        try:
+            self.export()
+        except Exception:
+            # A metrics sink being down must never take the app with it
+            pass
+
+    def _export_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            self._export_quietly()
+
+    def start_exporter(self, interval=EXPORT_SECONDS):
+        if not EXPORT_TARGET or self._exporter is not None:
+            return
+        self._exporter = threading.Thread(target=self._export_loop, args=(interval,), daemon=True)
+        self._exporter.start()
+        atexit.register(self._export_quietly)
+
+
+profiler = Profiler()
+profiler.start_exporter()
+timed = profiler.timed
@@ -0,0 +1,115 @@
+"""Column types for the in-memory tables.
+
+CSV has no types, so every table is conformed to its declared column kinds
+right after it is read:
+
+    id        integer-encoded identifier: int64, or nullable Int64 if some are missing
+    category  low-cardinality label (status, purpose, role...) as a pandas categorical
+    date      parsed once into datetime64
+    money     float64
+
+Columns that don't fully convert (e.g. user ids like "U0012") are left as
+they are rather than losing values. Other text columns use pandas' Arrow-backed
+string dtype, which is the default from pandas 3 and opted into on 2.x.
+"""
+import pandas as pd
+
+if int(pd.__version__.split(".")[0]) < 3:
+    try:
+        pd.set_option("future.infer_string", True)
+    except (KeyError, pd.errors.OptionError):  # pandas < 2.1 keeps object strings
+        pass
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+
+def read_csv(path):
+    # The multithreaded pyarrow parser is several times faster on big files;
+    # fall back to the C parser for anything it rejects (e.g. ragged rows)
+    if CSV_ENGINE == "pyarrow":
+        try:
+            return pd.read_csv(path, engine="pyarrow")
+        except pd.errors.EmptyDataError:
+            raise
+        except Exception:
+            pass
+    return pd.read_csv(path)
+
+
+def _as_id(s):
+    if pd.api.types.is_integer_dtype(s.dtype) or pd.api.types.is_bool_dtype(s.dtype):
+        return s
+    numbers = pd.to_numeric(s, errors="coerce")
+    present = numbers.notna()
+    if present.sum() != s.notna().sum() or (numbers[present] % 1 != 0).any():
+        return s
+    return numbers.astype("int64") if present.all() else numbers.astype("Int64")
+
+
+def _as_category(s):
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s
+    return s.astype("category")
+
+
+def _as_date(s):
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return s
+    return pd.to_datetime(s, errors="coerce", format="ISO8601")
+
+
+def _as_money(s):
+    if s.dtype == "float64":
+        return s
+    numbers = pd.to_numeric(s, errors="coerce")
+    if numbers.notna().sum() != s.notna().sum():
+        return s
+    return numbers.astype("float64")
+
+
+converters = {"id": _as_id, "category": _as_category, "date": _as_date, "money": _as_money}
+
+
+def conform(df, dtypes):
+    """Convert the columns of ``df`` named in ``dtypes`` (column -> kind) in place."""
+    for col, kind in (dtypes or {}).items():
+        if col in df.columns:
+            df[col] = converters[kind](df[col])
+    return df
+
+
+def _add_categories(s, values):
+    new = pd.Index(pd.unique(pd.Series(values).dropna())).difference(s.cat.categories)
+    if len(new):
+        s = s.cat.set_categories(s.cat.categories.union(new))
+    return s
+
+
+def set_values(df, rows, col, values):
+    """``df.loc[rows, col] = values``, growing a categorical's categories as needed.
+
+    A column whose dtype can't hold the values (e.g. strings into a column
+    that was all NaN floats) is widened to object first.
+    """
+    if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+        df[col] = _add_categories(df[col], values)
+    try:
+        df.loc[rows, col] = values
+    except (TypeError, ValueError):
+        df[col] = df[col].astype(object)
+        df.loc[rows, col] = values
+
+
+def concat_rows(df, new_rows, dtypes, **kwargs):
+    """Append ``new_rows`` to ``df`` keeping the declared column types."""
+    new_rows = conform(new_rows, dtypes)
+    for col in df.columns[[isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes]]:
+        if col in new_rows.columns:
+            # Both sides need identical categories, or concat falls back to object
+            df = df.assign(**{col: _add_categories(df[col], new_rows[col])})
+            new_rows[col] = pd.Categorical(new_rows[col], categories=df[col].cat.categories)
+    return pd.concat([df, new_rows], **kwargs)
@@ -0,0 +1,161 @@
+import os
+import re
+import copy
+import json
+import pickle
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from storage import data_path
+from profiling import timed
+
+# Risk score thresholds (percent) for automatic decisions
+AUTO_APPROVE_MAX_RISK = 39
+AUTO_DECLINE_MIN_RISK = 61
+
+feature_columns = ["amount", "income"]
+
+models_path = os.path.join(data_path, "models")
+
+# Retrain once this many loans have been decided since the current model was fitted
+RETRAIN_AFTER = int(os.environ.get("BANK_MODEL_RETRAIN_AFTER", "50"))
+
+
+# Risk score for every loan in one predict_proba call: (1 - P(approved)) as a percentage
+def score_loans(model, loans):
+    with timed("model_score"):
+        prob = model.predict_proba(loans[feature_columns].astype(float))[:, 1]
+    return np.round((1 - prob) * 100, 2)
+
+
+# Bucket risk scores into "approved", "declined" or "review"
+def bucket_loans(risk_scores):
+    return np.select(
+        [risk_scores <= AUTO_APPROVE_MAX_RISK, risk_scores >= AUTO_DECLINE_MIN_RISK],
+        ["approved", "declined"],
+        "review",
+    )
+
+
+# Status/remarks updates for the automatically decided loans, ready for Table.update_many
+def auto_decisions(loans, risk_scores):
+    buckets = bucket_loans(risk_scores)
+    decided = buckets != "review"
+    status = pd.Series(buckets[decided])
+    scores = pd.Series(risk_scores[decided]).astype(str)
+    prefix = status.map({"approved": "Auto-approved. ", "declined": "Auto-declined. "})
+    return pd.DataFrame({
+        "loan_id": loans["loan_id"].to_numpy()[decided],
+        "status": status,
+        "remarks": prefix + "Predicted Risk Score: " + scores + "%",
+    }), buckets
+
+
+# Risk score noted in a loan's remarks ("... Risk Score: 40%. ..."), as text; "n/a" if there's none
+def risk_score_from_remarks(remarks):
+    match = re.search(r"Risk Score: ([\d.]+)%", str(remarks))
+    return match.group(1) if match else "n/a"
+
+
+def decision_remarks(status, remarks):
+    """Remarks for an admin decision, carrying over the risk score if the loan was scored."""
+    risk_score = risk_score_from_remarks(remarks)
+    return f"Admin-{status}." + (f" Risk Score: {risk_score}%" if risk_score != "n/a" else "")
+
+
+# Fingerprint of the rows a model is trained on
+def training_hash(train_df):
+    hashed = pd.util.hash_pandas_object(train_df[feature_columns + ["status"]], index=False)
+    return hashlib.sha256(hashed.to_numpy().tobytes()).hexdigest()
+
+
+class ModelRegistry:
+    """Fitted risk models persisted under ``data/models`` with their training-data hash.
+
+    The current model is loaded lazily and kept in memory for the whole
+    process. It is refitted (warm-started from the previous coefficients)
+    only when at least ``retrain_after`` loans have been decided since it
+    was trained and the training data actually changed.
+    """
+
+    def __init__(self, directory=models_path, retrain_after=RETRAIN_AFTER):
+        self.directory = directory
+        self.manifest = os.path.join(directory, "risk_model.json")
+        self.retrain_after = retrain_after
+        self._lock = threading.Lock()
+        self._model = None
+        self._meta = None
+        self._manifest_mtime = None
+
+    def _load(self):
+        # Pick up the latest model on disk, e.g. one trained by another worker
+        try:
+            mtime = os.stat(self.manifest).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        with open(self.manifest) as f:
+            meta = json.load(f)
+        with open(os.path.join(self.directory, meta["file"]), "rb") as f:
+            self._model = pickle.load(f)
+        self._meta = meta
+        self._manifest_mtime = mtime
+
+    def _save(self, model, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, meta["file"])
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(model, f)
+        os.replace(path + ".tmp", path)
+        with open(self.manifest + ".tmp", "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(self.manifest + ".tmp", self.manifest)
+        self._manifest_mtime = os.stat(self.manifest).st_mtime_ns
+
+    def get(self, loans_table):
+        """Current risk model for ``loans_table``, or None if there isn't enough history."""
+        with self._lock:
+            self._load()
+            df = loans_table.load()
+            n_decided = len(df) - loans_table.count("status", "pending")
+            if self._model is not None and abs(n_decided - self._meta["n_decided"]) < self.retrain_after:
+                return self._model
+
+            train_df = df[df["status"] != "pending"]
+            if train_df.empty or len(train_df["status"].unique()) < 2:
+                return self._model
+            train_df = train_df[feature_columns + ["status"]].dropna()
+            data_hash = training_hash(train_df)
+            if self._meta is not None and data_hash == self._meta["data_hash"]:
+                self._meta["n_decided"] = n_decided
+                return self._model
+
+            # sklearn is only imported once a model is actually fitted; it is slow to import
+            from sklearn.linear_model import LogisticRegression
+            # Warm start from the previous fit so retraining converges in a few iterations
+            model = copy.deepcopy(self._model) if self._model is not None else LogisticRegression(warm_start=True)
+            with timed("model_fit"):
+                model.fit(train_df[feature_columns].astype(float), (train_df["status"] == "approved").astype(int))
+
+            version = self._meta["version"] + 1 if self._meta else 1
+            meta = {
+                "version": version,
+                "file": f"risk_model-v{version}.pkl",
+                "data_hash": data_hash,
+                "n_decided": n_decided,
+                "n_train": len(train_df),
+                "trained_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+            }
+            self._save(model, meta)
+            self._model, self._meta = model, meta
+            return model
+
+    def info(self):
+        with self._lock:
+            self._load()
+            return dict(self._meta) if self._meta else None
+
+
+risk_models = ModelRegistry()
@@ -0,0 +1,1249 @@
+import os
+import re
+import json
+import uuid
+import atexit
+import argparse
+import sqlite3
+import threading
+import time
+import contextlib
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+import pandas as pd
+import numpy as np
+from profiling import timed
+from schema import read_csv, conform, set_values, concat_rows
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks then only cover the threads of one process
+    fcntl = None
+
+# Paths to CSV files
+data_path = "data"
+users_file = os.path.join(data_path, "users.csv")
+accounts_file = os.path.join(data_path, "accounts.csv")
+loans_file = os.path.join(data_path, "loan_applications.csv")
+loan_status_file = os.path.join(data_path, "loan_status.csv")
+transactions_file = os.path.join(data_path, "transactions.csv")
+
+transaction_columns = ["transaction_id", "user_id", "loan_id", "amount", "method", "date"]
+loan_columns = ["loan_id", "user_id", "amount", "purpose", "income", "status", "application_date", "remarks",
+                "interest_rate", "tenure_months", "risk_level"]
+
+# Declared types of the columns that have one (see schema.py)
+loan_dtypes = {"user_id": "id", "amount": "money", "income": "money", "purpose": "category",
+               "status": "category", "application_date": "date", "risk_level": "category"}
+
+# Columns the app expects in each table, the columns it looks rows up by, and column types
+table_specs = {
+    users_file: {"columns": ["user_id", "username", "password", "role"], "key": "user_id", "indexes": ["username"],
+                 "dtypes": {"user_id": "id", "role": "category"}},
+    accounts_file: {"columns": ["user_id", "account_no", "address", "mobile", "balance"], "key": None, "indexes": ["user_id", "account_no"],
+                    "dtypes": {"user_id": "id", "balance": "money", "account_opened": "date"}},
+    loans_file: {"columns": loan_columns, "key": "loan_id", "indexes": ["user_id", "status"], "dtypes": loan_dtypes},
+    transactions_file: {"columns": transaction_columns, "key": "transaction_id", "indexes": ["user_id", "loan_id"],
+                        "dtypes": {"user_id": "id", "amount": "money", "method": "category", "type": "category", "date": "date"}},
+}
+
+# "csv" keeps the flat files in data/, "sqlite" keeps every table in one embedded database
+STORAGE_BACKEND = os.environ.get("BANK_STORAGE_BACKEND", "csv")
+SQLITE_PATH = os.environ.get("BANK_SQLITE_PATH", os.path.join(data_path, "bank.db"))
+
+# With the csv backend: "ledger" appends new transactions to segment files,
+# "partitioned" keeps them in Parquet partitions by user bucket and month,
+# "csv" rewrites transactions.csv on every write
+TRANSACTIONS_STORAGE = os.environ.get("BANK_TRANSACTIONS_STORAGE", "ledger")
+# User buckets of a new partitioned store, and threads reading its partitions
+PARTITION_BUCKETS = int(os.environ.get("BANK_TRANSACTION_BUCKETS", "16"))
+_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+PARTITION_READERS = int(os.environ.get("BANK_PARTITION_READERS", str(min(8, _cpus))))
+
+
+# Parsed CSV tables are cached as Parquet (typed, columnar) so the next process
+# to load an unchanged file skips the CSV parse; only files above this size
+PARQUET_CACHE = os.environ.get("BANK_PARQUET_CACHE", "1") != "0"
+PARQUET_CACHE_MIN_BYTES = 1 << 20
+cache_path = os.path.join(data_path, "cache")
+
+
+# Commits that touch several CSV files are serialized by this lock and journaled here first
+commit_lock_file = os.path.join(data_path, "commit.lock")
+commit_journal_file = os.path.join(data_path, "commit.journal")
+
+
+def new_transaction_id():
+    return f"TX{uuid.uuid4().hex[:16].upper()}"
+
+
+class FileLock:
+    """Exclusive lock held across threads (RLock) and processes (flock on ``path``).
+
+    Re-entrant within a thread; the file lock is only taken by the outermost
+    acquisition.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._handle = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            if self._depth == 0 and fcntl is not None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._handle = open(self.path, "a")
+                fcntl.flock(self._handle, fcntl.LOCK_EX)
+        except BaseException:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+            self._lock.release()
+            raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._handle is not None:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
+        self._lock.release()
+
+
+# CSV has no column types, so an object column holding both ints and strings
+# (e.g. user_id 12 next to "U0012") reads back as all strings. Do the same in
+# memory so ledger reads match a plain CSV round trip and Parquet can store it.
+def normalize_mixed_columns(df):
+    for col in df.columns[df.dtypes == object]:
+        # infer_dtype scans in C; only genuinely mixed columns pay for the per-value map
+        if pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed"):
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+    return df
+
+
+def stable_bucket(key, buckets):
+    # crc32 rather than hash(): a key's bucket must agree between processes
+    return zlib.crc32(str(key).encode()) % buckets
+
+
+def retire_path(path):
+    # Kept next to the data rather than deleted, in case it's needed again
+    os.replace(path, path + ".migrated")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Ledger:
+    """Append-only storage for a CSV table.
+
+    New rows are appended to small segment files in ``<name>.ledger/`` next to
+    the base CSV. Each segment has ``columns`` plus any other columns its rows
+    brought (e.g. from a bulk import), so nothing an append carries is lost.
+    ``compact()`` folds sealed segments into a Parquet snapshot, and
+    ``read()`` returns snapshot (or base CSV) plus the segments after it.
+    Compaction runs inline once ``compact_after`` segments are sealed, unless
+    ``on_compact_due`` is set, in which case that is called to schedule it.
+
+    ``lock`` is shared by every process using the ledger. Appends take it,
+    and so does installing a snapshot. A process whose active segment has
+    been covered by a newer snapshot (another process rewrote the table)
+    drops that segment and starts a new one before appending.
+    """
+
+    segment_re = re.compile(r"seg-(\d+)-(\d+)\.csv(\.active)?$")
+    snapshot_re = re.compile(r"snapshot-(\d+)\.parquet$")
+
+    def __init__(self, file, columns, segment_rows=5000, compact_after=8, fsync_rows=64, fsync_seconds=1.0):
+        self.file = file
+        self.dir = os.path.splitext(file)[0] + ".ledger"
+        self.columns = list(columns)
+        self.segment_rows = segment_rows
+        self.compact_after = compact_after
+        self.fsync_rows = fsync_rows
+        self.fsync_seconds = fsync_seconds
+        self.lock = FileLock(os.path.join(self.dir, "ledger.lock"))
+        self._lock = threading.RLock()
+        self._handle = None
+        self._active = None
+        self._active_seq = 0
+        self._active_columns = []
+        self._active_rows = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._timer = None
+        self._recovered = False
+        self.on_compact_due = None
+        atexit.register(self.close)
+
+    # Directory listing
+    def _segments(self):
+        if not os.path.isdir(self.dir):
+            return []
+        segments = []
+        for name in os.listdir(self.dir):
+            m = self.segment_re.match(name)
+            if m:
+                segments.append((int(m.group(1)), int(m.group(2)), bool(m.group(3)), os.path.join(self.dir, name)))
+        return sorted(segments)
+
+    def _snapshot(self):
+        if not os.path.isdir(self.dir):
+            return None, 0
+        best = (None, 0)
+        for name in os.listdir(self.dir):
+            m = self.snapshot_re.match(name)
+            if m and int(m.group(1)) >= best[1]:
+                best = (os.path.join(self.dir, name), int(m.group(1)))
+        return best
+
+    def _next_seq(self):
+        seqs = [seq for seq, _, _, _ in self._segments()]
+        return max(seqs + [self._snapshot()[1]]) + 1
+
+    def _recover(self):
+        # Seal segments left active by writers that are no longer running
+        if self._recovered:
+            return
+        self._recovered = True
+        for seq, pid, active, path in self._segments():
+            if active and (pid == os.getpid() or not _pid_alive(pid)) and path != self._active:
+                os.replace(path, path[:-len(".active")])
+
+    def sealed_seq(self):
+        """Sequence number of the newest sealed segment (0 if none)."""
+        return max([seq for seq, _, active, _ in self._segments() if not active] + [0])
+
+    def has_data(self):
+        return os.path.exists(self.file) or bool(self._segments()) or self._snapshot()[0] is not None
+
+    def version(self):
+        # Changes whenever a segment grows or a snapshot replaces segments
+        snapshot, seq = self._snapshot()
+        parts = [(seq,)]
+        for _, _, _, path in self._segments():
+            try:
+                parts.append((os.path.basename(path), os.path.getsize(path)))
+            except FileNotFoundError:
+                pass
+        if snapshot is None and os.path.exists(self.file):
+            stat = os.stat(self.file)
+            parts.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(parts)
+
+    # Reads
+    def read(self, attempts=10):
+        # Reads take no lock. A compaction or rewrite can replace the snapshot or remove
+        # segments after they were listed; then the listing is stale and the read starts over.
+        for attempt in range(attempts):
+            try:
+                return self._read()
+            except FileNotFoundError:
+                if attempt == attempts - 1:
+                    raise
+
+    def _read(self):
+        snapshot, snap_seq = self._snapshot()
+        if snapshot is not None:
+            frames = [pd.read_parquet(snapshot)]
+        elif os.path.exists(self.file):
+            frames = [read_csv(self.file)]
+        else:
+            frames = []
+        for seq, _, _, path in self._segments():
+            if seq > snap_seq:
+                try:
+                    frames.append(read_csv(path))
+                except pd.errors.EmptyDataError:
+                    # A segment just opened, its header not written yet
+                    pass
+        frames = [f for f in frames if not f.empty] or frames[:1]
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        return normalize_mixed_columns(df)
+
+    # Writes
+    def _open_segment(self, columns):
+        os.makedirs(self.dir, exist_ok=True)
+        self._recover()
+        self._active_seq = self._next_seq()
+        self._active = os.path.join(self.dir, f"seg-{self._active_seq:08d}-{os.getpid()}.csv.active")
+        self._handle = open(self._active, "a", newline="")
+        self._active_columns = columns
+        self._active_rows = 0
+        pd.DataFrame(columns=columns).to_csv(self._handle, index=False)
+
+    def _sync(self):
+        if self._handle is not None and self._unsynced:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        # Make every row appended so far durable, e.g. before a commit is acknowledged
+        with self._lock:
+            self._sync()
+
+    def _sync_later(self):
+        with self._lock:
+            self._timer = None
+            self._sync()
+
+    def _seal(self):
+        if self._handle is None:
+            return
+        self._sync()
+        self._handle.close()
+        os.replace(self._active, self._active[:-len(".active")])
+        self._handle = None
+        self._active = None
+
+    def _discard(self):
+        # The active segment's rows are all in a newer snapshot already
+        self._handle.close()
+        os.remove(self._active)
+        self._handle = None
+        self._active = None
+        self._unsynced = 0
+
+    def append(self, rows):
+        rows = pd.DataFrame(rows)
+        columns = self.columns + [col for col in rows.columns if col not in self.columns]
+        with self.lock, self._lock:
+            if self._handle is not None and self._snapshot()[1] >= self._active_seq:
+                self._discard()
+            if self._handle is not None and not set(columns) <= set(self._active_columns):
+                # The segment's header can't hold these rows' extra columns; they start a new one
+                self._seal()
+            if self._handle is None:
+                self._open_segment(columns)
+            rows.reindex(columns=self._active_columns).to_csv(self._handle, header=False, index=False)
+            self._handle.flush()
+            self._active_rows += len(rows)
+            self._unsynced += len(rows)
+
+            # Batch fsyncs: sync every fsync_rows rows, or fsync_seconds after the first unsynced write
+            if self._unsynced >= self.fsync_rows or time.monotonic() - self._last_sync >= self.fsync_seconds:
+                self._sync()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.fsync_seconds, self._sync_later)
+                self._timer.daemon = True
+                self._timer.start()
+
+            if self._active_rows >= self.segment_rows:
+                self._seal()
+                if sum(1 for s in self._segments() if not s[2]) >= self.compact_after:
+                    if self.on_compact_due is not None:
+                        self.on_compact_due(self)
+                    else:
+                        self.compact()
+
+    def compact(self):
+        """Fold sealed segments into a new Parquet snapshot."""
+        with self._lock:
+            self._recover()
+        # Sealed segments and snapshots never change, so they're read without holding up appends
+        segments = self._segments()
+        active_seqs = [seq for seq, _, active, _ in segments if active]
+        limit = min(active_seqs) if active_seqs else float("inf")
+        sealed = [s for s in segments if not s[2] and s[0] < limit]
+        snapshot, snap_seq = self._snapshot()
+        sealed = [s for s in sealed if s[0] > snap_seq]
+        if not sealed:
+            return snapshot
+
+        if snapshot is not None:
+            frames = [pd.read_parquet(snapshot)]
+        elif os.path.exists(self.file):
+            frames = [read_csv(self.file)]
+        else:
+            frames = []
+        frames += [read_csv(path) for _, _, _, path in sealed]
+        df = normalize_mixed_columns(pd.concat([f for f in frames if not f.empty] or frames[:1], ignore_index=True))
+        return self._write_snapshot(df, max(seq for seq, _, _, _ in sealed))
+
+    def rewrite(self, df):
+        """Replace the whole table with ``df``.
+
+        Callers that build ``df`` from the stored rows hold ``lock`` from the
+        read through the rewrite, so no append lands in between.
+        """
+        with self.lock, self._lock:
+            self._seal()
+            seq = max([s[0] for s in self._segments()] + [self._snapshot()[1], 0])
+            return self._write_snapshot(normalize_mixed_columns(df.copy()), seq + 1)
+
+    def _write_snapshot(self, df, seq):
+        os.makedirs(self.dir, exist_ok=True)
+        path = os.path.join(self.dir, f"snapshot-{seq:08d}.parquet")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df.to_parquet(tmp, index=False)
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+
+        with self.lock:
+            current, current_seq = self._snapshot()
+            if current_seq >= seq:
+                # A rewrite or another compaction already covers these segments
+                os.remove(tmp)
+                return current
+            os.replace(tmp, path)
+
+            # The new snapshot covers everything up to seq; older files are now redundant
+            for old_seq, _, active, old_path in self._segments():
+                if old_seq <= seq and not active:
+                    os.remove(old_path)
+            for name in os.listdir(self.dir):
+                m = self.snapshot_re.match(name)
+                if m and int(m.group(1)) < seq:
+                    os.remove(os.path.join(self.dir, name))
+        return path
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._seal()
+
+
+class PartitionedStore:
+    """A table split into small Parquet partitions by user bucket and month.
+
+    Rows go to ``<name>.parts/b<bucket>-<YYYY-MM>.parquet``, where the bucket
+    is a stable hash of ``user_id`` (``buckets`` of them) and the month comes
+    from ``date``. ``manifest.json`` lists every partition with its row count
+    and is replaced on every write, so its stat is the store's version. Reads
+    for one user or a date range open only the partitions that can hold
+    matching rows; full reads open all of them on a thread pool. A write
+    rewrites just the partitions it touches.
+
+    The first time the store is used, an existing flat CSV (or ledger) is
+    split into partitions and renamed to ``*.migrated``.
+    """
+
+    prunes = ("user_id", "date")
+
+    def __init__(self, file, columns, dtypes=None, buckets=PARTITION_BUCKETS, readers=PARTITION_READERS):
+        self.file = file
+        self.dir = os.path.splitext(file)[0] + ".parts"
+        self.manifest_file = os.path.join(self.dir, "manifest.json")
+        self.columns = list(columns)
+        # Categories are left to the table: each partition has its own set
+        self.dtypes = {col: kind for col, kind in (dtypes or {}).items() if kind != "category"}
+        self.buckets = buckets
+        self.readers = readers
+        self.lock = FileLock(os.path.join(self.dir, "manifest.lock"))
+        self._ready = False
+
+    # Manifest
+    def has_data(self):
+        return os.path.exists(self.manifest_file)
+
+    def version(self):
+        try:
+            stat = os.stat(self.manifest_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _manifest(self):
+        try:
+            with open(self.manifest_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"buckets": self.buckets, "partitions": {}}
+
+    def _write_manifest(self, manifest):
+        tmp = f"{self.manifest_file}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_file)
+
+    # Partition keys
+    def bucket(self, user_id, buckets=None):
+        # 12, 12.0 and "12" are the same user wherever they came from
+        if isinstance(user_id, (float, np.floating)) and float(user_id).is_integer():
+            user_id = int(user_id)
+        return stable_bucket(user_id, buckets or self.buckets)
+
+    def _keys(self, df, buckets):
+        # Partition of every row as one integer (bucket * 1e6 + yyyymm, 0 for no date);
+        # hashing and formatting only happen once per distinct user and partition
+        codes, users = pd.factorize(df["user_id"], use_na_sentinel=False)
+        bucket = np.array([self.bucket(user, buckets) for user in users], dtype=np.int64)[codes]
+        dates = pd.DatetimeIndex(pd.to_datetime(df["date"], errors="coerce", format="ISO8601"))
+        month = np.where(dates.isna(), 0, dates.year.to_numpy(na_value=0) * 100 + dates.month.to_numpy(na_value=0)).astype(np.int64)
+        return bucket * 1_000_000 + month
+
+    @staticmethod
+    def _name(key):
+        bucket, month = divmod(int(key), 1_000_000)
+        return f"b{bucket:03d}-" + (f"{month // 100:04d}-{month % 100:02d}" if month else "none")
+
+    def _selected(self, manifest, user_id=None, start=None, end=None):
+        # Partitions that can hold rows of user_id / dated in [start, end)
+        names = sorted(manifest["partitions"])
+        if user_id is not None:
+            prefix = f"b{self.bucket(user_id, manifest['buckets']):03d}-"
+            names = [name for name in names if name.startswith(prefix)]
+        if start is not None or end is not None:
+            first = pd.Timestamp(start).strftime("%Y-%m") if start is not None else ""
+            last = (pd.Timestamp(end) - pd.Timedelta(1, "ns")).strftime("%Y-%m") if end is not None else "9999-99"
+            names = [name for name in names if first <= manifest["partitions"][name]["month"] <= last]
+        return names
+
+    # Reads
+    def _path(self, name):
+        return os.path.join(self.dir, name + ".parquet")
+
+    def _read_partition(self, name):
+        import pyarrow.parquet as pq
+        try:
+            return pq.ParquetFile(self._path(name)).read(use_threads=False)
+        except FileNotFoundError:
+            # Rewritten away since the manifest was read
+            return None
+
+    def _partition_frame(self, name):
+        table = self._read_partition(name)
+        return pd.DataFrame(columns=self.columns) if table is None else table.to_pandas()
+
+    def read(self, user_id=None, start=None, end=None):
+        """Rows of the partitions that can match; the caller filters the rows themselves."""
+        self._ensure()
+        names = self._selected(self._manifest(), user_id, start, end)
+        if len(names) > 1 and self.readers > 1:
+            # Parquet decoding releases the GIL, so partitions load in parallel
+            with ThreadPoolExecutor(min(self.readers, len(names))) as pool:
+                tables = list(pool.map(self._read_partition, names))
+        else:
+            tables = [self._read_partition(name) for name in names]
+        tables = [table for table in tables if table is not None and table.num_rows]
+        if not tables:
+            return pd.DataFrame(columns=self.columns)
+        # Joined as Arrow and converted once: far cheaper than a pandas concat of many small frames
+        import pyarrow as pa
+        return normalize_mixed_columns(pa.concat_tables(tables, promote_options="permissive").to_pandas())
+
+    # Writes
+    def _prepare(self, df):
+        df = conform(df.copy(), self.dtypes)
+        for col in df.columns[[isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes]]:
+            df[col] = df[col].astype(object)
+        return normalize_mixed_columns(df)
+
+    def _write_partition(self, name, df):
+        path = self._path(name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        self._prepare(df).to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+
+    def _put(self, manifest, df, replace=()):
+        # Write the rows of df into their partitions: added to what's stored,
+        # except for partitions in ``replace``, whose rows df holds in full
+        if df.empty:
+            for name in replace:
+                self._drop(manifest, name)
+            return
+        keys = self._keys(df, manifest["buckets"])
+        # One sort brings each partition's rows together; each is then a slice
+        order = np.argsort(keys, kind="stable")
+        df, keys = df.take(order).reset_index(drop=True), keys[order]
+        distinct, starts = np.unique(keys, return_index=True)
+        names = [self._name(key) for key in distinct]
+        for name in set(replace) - set(names):
+            self._drop(manifest, name)
+        for name, start, end in zip(names, starts, list(starts[1:]) + [len(df)]):
+            rows = df.iloc[start:end]
+            if name in manifest["partitions"] and name not in replace:
+                rows = pd.concat([self._partition_frame(name), rows], ignore_index=True)
+            self._write_partition(name, rows)
+            manifest["partitions"][name] = {"bucket": int(name[1:4]), "month": name[5:], "rows": len(rows)}
+
+    def _drop(self, manifest, name):
+        manifest["partitions"].pop(name, None)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path(name))
+
+    def append(self, rows):
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+        if df.empty:
+            return
+        self._ensure()
+        with self.lock:
+            manifest = self._manifest()
+            self._put(manifest, df.reindex(columns=list(dict.fromkeys(self.columns + list(df.columns)))))
+            self._write_manifest(manifest)
+
+    def update(self, column, frame):
+        """Apply ``apply_updates(column, frame)``, rewriting only partitions with a matching row."""
+        self._ensure()
+        with self.lock:
+            manifest = self._manifest()
+            user_id = None
+            if column == "user_id" and frame["user_id"].nunique() == 1:
+                user_id = frame["user_id"].iloc[0]
+            keys = set(frame[column].dropna().tolist())
+            changed = {}
+            for name in self._selected(manifest, user_id):
+                df = self._partition_frame(name)
+                if df[column].isin(keys).any():
+                    changed[name] = apply_updates(df, column, frame)
+            if changed:
+                # Rows whose user or date changed move to their new partitions
+                self._put(manifest, pd.concat(changed.values(), ignore_index=True), replace=changed)
+                self._write_manifest(manifest)
+
+    def rewrite(self, df):
+        self._ensure()
+        with self.lock:
+            manifest = self._manifest()
+            self._put(manifest, df, replace=list(manifest["partitions"]))
+            self._write_manifest(manifest)
+
+    # First use: split the flat table into partitions
+    def _ensure(self):
+        if self._ready:
+            return
+        with self.lock:
+            if not self.has_data():
+                ledger = Ledger(self.file, self.columns)
+                df = ledger.read() if ledger.has_data() else pd.DataFrame(columns=self.columns)
+                manifest = {"buckets": self.buckets, "partitions": {}}
+                self._put(manifest, df)
+                self._write_manifest(manifest)
+                if os.path.exists(self.file):
+                    retire_path(self.file)
+                if os.path.isdir(ledger.dir):
+                    retire_path(ledger.dir)
+        self._ready = True
+
+
+def _with_columns(df, expected_columns):
+    if expected_columns:
+        for col in expected_columns:
+            if col not in df.columns:
+                df[col] = np.nan
+    return df
+
+
+def _empty(expected_columns):
+    return pd.DataFrame(columns=expected_columns if expected_columns else [])
+
+
+# Expected columns added and declared column types applied, for every backend read
+def _conform(df, file, expected_columns):
+    return conform(_with_columns(df, expected_columns), table_specs.get(file, {}).get("dtypes"))
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# Set the columns of ``frame`` on the rows of ``df`` whose ``column`` matches, last update wins
+def apply_updates(df, column, frame):
+    frame = frame.drop_duplicates(column, keep="last")
+    positions = pd.Index(frame[column]).get_indexer(df[column])
+    hit = positions >= 0
+    for col in frame.columns.drop(column):
+        set_values(df, hit, col, frame[col].to_numpy()[positions[hit]])
+    return df
+
+
+def _parse_cache_file(file):
+    return os.path.join(cache_path, os.path.basename(file) + ".parquet")
+
+
+def _read_parse_cache(file, version):
+    if not PARQUET_CACHE or version is None:
+        return None
+    try:
+        import pyarrow.parquet as pq
+        path = _parse_cache_file(file)
+        metadata = pq.read_schema(path).metadata or {}
+        if metadata.get(b"bank_source_version") != json.dumps(version).encode():
+            return None
+        return pd.read_parquet(path)
+    except Exception:
+        # Missing, stale or unreadable: fall back to parsing the CSV
+        return None
+
+
+def _write_parse_cache(file, version, df):
+    if not PARQUET_CACHE or version is None or version[2] < PARQUET_CACHE_MIN_BYTES:
+        return
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               b"bank_source_version": json.dumps(version).encode()})
+        os.makedirs(cache_path, exist_ok=True)
+        path = _parse_cache_file(file)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+    except Exception:
+        # The cache is only an optimization; a frame pyarrow can't store is just parsed again next time
+        with contextlib.suppress(NameError, OSError):
+            os.remove(tmp)
+
+
+class CsvBackend:
+    """Flat CSV files in data/, with transactions optionally kept in an append-only Ledger.
+
+    Rewrites take a lock shared by every worker and re-read the file first,
+    so concurrent writers never overwrite each other's rows. ``write_atomic``
+    journals a multi-file commit before applying it; a commit left half
+    applied by a crash is replayed by the next writer.
+    """
+
+    name = "csv"
+
+    def __init__(self, transactions_storage=TRANSACTIONS_STORAGE):
+        self.ledgers = {}
+        self.partitions = {}
+        if transactions_storage == "ledger":
+            self.ledgers[transactions_file] = Ledger(transactions_file, transaction_columns)
+        elif transactions_storage == "partitioned":
+            self.partitions[transactions_file] = PartitionedStore(transactions_file, transaction_columns,
+                                                                  table_specs[transactions_file]["dtypes"])
+        self.commit_lock = FileLock(commit_lock_file)
+
+    def pushes_down(self, file, column=None, write=False):
+        # Partitioned tables serve writes and reads by user or date without loading the table
+        store = self.partitions.get(file)
+        return store is not None and (write or column in store.prunes)
+
+    def version(self, file):
+        store = self.partitions.get(file)
+        if store is not None:
+            store._ensure()
+            return store.version()
+        ledger = self.ledgers.get(file)
+        if ledger is not None:
+            return ledger.version()
+        try:
+            stat = os.stat(file)
+        except FileNotFoundError:
+            return None
+        # Rewrites replace the file, so the inode changes even within one mtime tick
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def exists(self, file):
+        if file in self.partitions:
+            return self.partitions[file].has_data() or os.path.exists(file)
+        ledger = self.ledgers.get(file)
+        return ledger.has_data() if ledger is not None else os.path.exists(file)
+
+    def retire(self, file):
+        retire_path(file)
+
+    def load(self, file, expected_columns=None, cache_parse=True):
+        # Write paths, and reads that check rows before a write (rows(..., cache_parse=False)),
+        # skip the cache: the file is about to be replaced, so a cache of it would be stale at once
+        ledger = self.ledgers.get(file)
+        if file in self.partitions:
+            df = self.partitions[file].read()
+        elif ledger is not None and ledger.has_data():
+            df = ledger.read()
+        elif os.path.exists(file):
+            version = self.version(file)
+            df = _read_parse_cache(file, version)
+            if df is None:
+                df = _conform(read_csv(file), file, expected_columns)
+                if cache_parse:
+                    _write_parse_cache(file, version, df)
+                return df
+        else:
+            return _empty(expected_columns)
+        return _conform(df, file, expected_columns)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self.commit_lock:
+            self._recover()
+            yield
+
+    def _save(self, df, file):
+        if file in self.partitions:
+            self.partitions[file].rewrite(df)
+            return
+        ledger = self.ledgers.get(file)
+        if ledger is not None:
+            ledger.rewrite(df)
+            return
+        # Write a temp file and rename it over the old one, so readers never see half a table
+        tmp = f"{file}.{os.getpid()}.tmp"
+        df.to_csv(tmp, index=False)
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, file)
+
+    def _apply(self, file, inserted, updates):
+        store = self.partitions.get(file)
+        if store is not None:
+            store.append(list(inserted))
+            for column, frame in updates:
+                store.update(column, frame)
+            return
+        ledger = self.ledgers.get(file)
+        if ledger is not None and not updates:
+            ledger.append(list(inserted))
+            return
+        # Ledger appends skip the commit lock; the ledger's own lock holds them off until the rewrite is in
+        with ledger.lock if ledger is not None else contextlib.nullcontext():
+            df = self.load(file, table_specs.get(file, {}).get("columns"), cache_parse=False)
+            if inserted:
+                df = normalize_mixed_columns(concat_rows(df, pd.DataFrame(list(inserted)), table_specs.get(file, {}).get("dtypes"), ignore_index=True))
+            for column, frame in updates:
+                df = apply_updates(df, column, frame)
+            self._save(df, file)
+
+    def save(self, df, file):
+        with self._locked():
+            self._save(df, file)
+
+    def write(self, file, df, inserted=(), updates=()):
+        # Ledger-backed files only append the new rows; anything else is re-read and rewritten
+        if not inserted and not updates:
+            return
+        if file in self.ledgers and not updates:
+            self.ledgers[file].append(list(inserted))
+            return
+        if file in self.partitions and not updates:
+            self.partitions[file].append(list(inserted))
+            return
+        with self._locked():
+            self._apply(file, inserted, updates)
+
+    def append_frames(self, file, frames):
+        """Append the rows of each frame in ``frames`` (an iterable, consumed once)."""
+        ledger = self.ledgers.get(file)
+        if ledger is not None:
+            # Streamed: each frame becomes rows of a ledger segment as it arrives
+            for frame in frames:
+                ledger.append(frame)
+            ledger.flush()
+            return
+        store = self.partitions.get(file)
+        if store is not None:
+            # Each frame is added to the partitions its rows fall in
+            for frame in frames:
+                store.append(frame)
+            return
+        # A flat CSV can only be replaced whole, so the new rows are written in one rewrite
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return
+        with self._locked():
+            df = self.load(file, table_specs.get(file, {}).get("columns"), cache_parse=False)
+            new_rows = pd.concat(frames, ignore_index=True)
+            self._save(normalize_mixed_columns(concat_rows(df, new_rows, table_specs.get(file, {}).get("dtypes"), ignore_index=True)), file)
+
+    def write_atomic(self, changes):
+        changes = [(file, list(inserted), list(updates)) for file, inserted, updates in changes if inserted or updates]
+        if not changes:
+            return
+        with self._locked():
+            self._write_journal([
+                {"file": file, "inserted": inserted,
+                 "updates": [[column, frame.to_dict("records")] for column, frame in updates]}
+                for file, inserted, updates in changes
+            ])
+            for file, inserted, updates in changes:
+                self._apply(file, inserted, updates)
+            for ledger in self.ledgers.values():
+                ledger.flush()
+            self._write_journal(None)
+
+    # Commit journal
+    def _write_journal(self, entry):
+        with open(commit_journal_file, "w") as f:
+            if entry is not None:
+                f.write(json.dumps(entry, default=_json_value) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _recover(self):
+        # Replay a commit whose writer died after journaling it. Updates hold
+        # absolute values and inserts are skipped if their key is already
+        # stored, so replaying a partly applied commit is safe.
+        try:
+            with open(commit_journal_file) as f:
+                text = f.read()
+        except FileNotFoundError:
+            return
+        if not text:
+            return
+        if text.endswith("\n"):
+            for change in json.loads(text):
+                file, inserted = change["file"], change["inserted"]
+                key = table_specs.get(file, {}).get("key")
+                if inserted and key:
+                    stored = set(self.load(file, [key], cache_parse=False)[key].dropna().astype(str))
+                    inserted = [row for row in inserted if str(row.get(key)) not in stored]
+                updates = [(column, pd.DataFrame(records)) for column, records in change["updates"]]
+                self._apply(file, inserted, updates)
+            for ledger in self.ledgers.values():
+                ledger.flush()
+        # A journal without its trailing newline was cut off before the commit started
+        self._write_journal(None)
+
+    def rows(self, file, column, key, expected_columns=None, cache_parse=True):
+        store = self.partitions.get(file)
+        if store is not None and column == "user_id":
+            df = _conform(store.read(user_id=key), file, expected_columns)
+        else:
+            df = self.load(file, expected_columns, cache_parse)
+        return df[df[column] == key]
+
+    def between(self, file, column, start, end, expected_columns=None, cache_parse=True):
+        store = self.partitions.get(file)
+        if store is not None and column == "date":
+            df = _conform(store.read(start=start, end=end), file, expected_columns)
+        else:
+            df = self.load(file, expected_columns, cache_parse)
+        return df[(df[column] >= pd.Timestamp(start)) & (df[column] < pd.Timestamp(end))]
+
+    def page(self, file, offset, limit, column=None, key=None, sort_by=None, ascending=True, expected_columns=None,
+             cache_parse=True):
+        if column is not None:
+            df = self.rows(file, column, key, expected_columns, cache_parse)
+        else:
+            df = self.load(file, expected_columns, cache_parse)
+        if sort_by in df.columns:
+            df = df.sort_values(sort_by, ascending=ascending, kind="stable", na_position="last")
+        return df.iloc[offset:offset + limit], len(df)
+
+    def count(self, file, column, key):
+        return len(self.rows(file, column, key))
+
+
+def _sql_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if value is not None and not isinstance(value, str) and pd.isna(value):
+        return None
+    return value
+
+
+def _sql_bound(value):
+    # Dates are stored as ISO text; a bare date sorts before that day's timestamps, so it bounds both
+    value = pd.Timestamp(value)
+    return value.strftime("%Y-%m-%d") if value == value.normalize() else value.isoformat(sep=" ")
+
+
+class SqliteBackend:
+    """All tables in one embedded SQLite database, indexed on each table's lookup columns.
+
+    ``rows()``/``count()`` push the key predicate down to an indexed query, so
+    per-user pages read only that user's rows. Writes are applied as row-level
+    INSERT/UPDATE statements in a single transaction, also when one commit
+    spans several tables (``write_atomic``).
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def pushes_down(self, file, column=None, write=False):
+        return True
+
+    @staticmethod
+    def table_name(file):
+        return os.path.splitext(os.path.basename(file))[0]
+
+    def connect(self):
+        # sqlite3 connections can't be shared between Streamlit's script threads
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            con.commit()
+        return con
+
+    def _columns(self, con, name):
+        return [row[1] for row in con.execute(f'PRAGMA table_info("{name}")')]
+
+    def _bump(self, con, name):
+        con.execute("INSERT INTO table_versions VALUES (?, 1) "
+                    "ON CONFLICT(name) DO UPDATE SET version = version + 1", (name,))
+
+    def version(self, file):
+        row = self.connect().execute("SELECT version FROM table_versions WHERE name = ?", (self.table_name(file),)).fetchone()
+        return row[0] if row else None
+
+    def exists(self, file):
+        return bool(self._columns(self.connect(), self.table_name(file)))
+
+    def retire(self, file):
+        con, name = self.connect(), self.table_name(file)
+        with con:
+            con.execute(f'DROP TABLE IF EXISTS "{name}_migrated"')
+            con.execute(f'ALTER TABLE "{name}" RENAME TO "{name}_migrated"')
+            con.execute("DELETE FROM table_versions WHERE name = ?", (name,))
+
+    def load(self, file, expected_columns=None):
+        con, name = self.connect(), self.table_name(file)
+        if not self._columns(con, name):
+            return _empty(expected_columns)
+        return _conform(pd.read_sql_query(f'SELECT * FROM "{name}"', con), file, expected_columns)
+
+    def save(self, df, file):
+        con, name = self.connect(), self.table_name(file)
+        df.to_sql(name, con, if_exists="replace", index=False)
+        with con:
+            self._create_indexes(con, file, name)
+            self._bump(con, name)
+
+    @staticmethod
+    def _create_indexes(con, file, name):
+        spec = table_specs.get(file, {})
+        for col in ([spec["key"]] if spec.get("key") else []) + spec.get("indexes", []):
+            con.execute(f'CREATE INDEX IF NOT EXISTS "ix_{name}_{col}" ON "{name}" ("{col}")')
+
+    def _apply(self, con, file, inserted, updates):
+        # Runs inside a BEGIN IMMEDIATE transaction, so creating a missing
+        # table here can't race another worker doing the same
+        count, name = 0, self.table_name(file)
+        columns = self._columns(con, name)
+        if not columns:
+            sample = pd.DataFrame(list(inserted) or [dict.fromkeys(updates[0][1].columns)]).iloc[:0]
+            con.execute(pd.io.sql.get_schema(sample, name).replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+            self._create_indexes(con, file, name)
+            columns = self._columns(con, name)
+        new_columns = {c for row in inserted for c in row} | {c for _, frame in updates for c in frame.columns}
+        for col in sorted(new_columns - set(columns)):
+            con.execute(f'ALTER TABLE "{name}" ADD COLUMN "{col}"')
+        if inserted:
+            cols = list(dict.fromkeys(c for row in inserted for c in row))
+            col_list = ", ".join(f'"{c}"' for c in cols)
+            placeholders = ", ".join("?" * len(cols))
+            con.executemany(f'INSERT INTO "{name}" ({col_list}) VALUES ({placeholders})',
+                            [[_sql_value(row.get(c)) for c in cols] for row in inserted])
+        for column, frame in updates:
+            set_cols = [c for c in frame.columns if c != column]
+            assignments = ", ".join(f'"{c}" = ?' for c in set_cols)
+            params = [[_sql_value(v) for v in values] for values in frame[set_cols + [column]].itertuples(index=False)]
+            count += con.executemany(f'UPDATE "{name}" SET {assignments} WHERE "{column}" = ?', params).rowcount
+        self._bump(con, name)
+        return count
+
+    def write(self, file, df, inserted=(), updates=()):
+        if not inserted and not updates:
+            return 0
+        con = self.connect()
+        with con:
+            con.execute("BEGIN IMMEDIATE")
+            return self._apply(con, file, inserted, updates)
+
+    def append_frames(self, file, frames):
+        """Append the rows of each frame in ``frames``, one transaction per frame."""
+        con = self.connect()
+        for frame in frames:
+            if frame.empty:
+                continue
+            with con:
+                con.execute("BEGIN IMMEDIATE")
+                self._apply(con, file, frame.to_dict("records"), [])
+
+    def write_atomic(self, changes):
+        changes = [(file, list(inserted), list(updates)) for file, inserted, updates in changes if inserted or updates]
+        con = self.connect()
+        # One write transaction across every table: all of the changes land or none do
+        with con:
+            con.execute("BEGIN IMMEDIATE")
+            for file, inserted, updates in changes:
+                self._apply(con, file, inserted, updates)
+
+    def rows(self, file, column, key, expected_columns=None, cache_parse=True):
+        con, name = self.connect(), self.table_name(file)
+        if not self._columns(con, name):
+            return _empty(expected_columns)
+        df = pd.read_sql_query(f'SELECT * FROM "{name}" WHERE "{column}" = ?', con, params=(_sql_value(key),))
+        return _conform(df, file, expected_columns)
+
+    def page(self, file, offset, limit, column=None, key=None, sort_by=None, ascending=True, expected_columns=None):
+        con, name = self.connect(), self.table_name(file)
+        columns = self._columns(con, name)
+        if not columns or (column is not None and column not in columns):
+            return _empty(expected_columns), 0
+        where, params = (f'WHERE "{column}" = ?', [_sql_value(key)]) if column is not None else ("", [])
+        total = con.execute(f'SELECT COUNT(*) FROM "{name}" {where}', params).fetchone()[0]
+        order = "ORDER BY rowid"
+        if sort_by in columns:
+            order = f'ORDER BY "{sort_by}" IS NULL, "{sort_by}" {"ASC" if ascending else "DESC"}, rowid'
+        df = pd.read_sql_query(f'SELECT * FROM "{name}" {where} {order} LIMIT ? OFFSET ?', con,
+                               params=params + [int(limit), int(offset)])
+        return _conform(df, file, expected_columns), total
+
+    def between(self, file, column, start, end, expected_columns=None):
+        con, name = self.connect(), self.table_name(file)
+        if column not in self._columns(con, name):
+            return _empty(expected_columns)
+        df = pd.read_sql_query(f'SELECT * FROM "{name}" WHERE "{column}" >= ? AND "{column}" < ?', con,
+                               params=(_sql_bound(start), _sql_bound(end)))
+        return _conform(df, file, expected_columns)
+
+    def count(self, file, column, key):
+        con, name = self.connect(), self.table_name(file)
+        if not self._columns(con, name):
+            return 0
+        return con.execute(f'SELECT COUNT(*) FROM "{name}" WHERE "{column}" = ?', (_sql_value(key),)).fetchone()[0]
+
+
+backends = {"csv": CsvBackend, "sqlite": SqliteBackend}
+backend = backends[STORAGE_BACKEND]()
+
+
+# Load and Save CSV (through whichever backend is configured)
+def load_csv(file, expected_columns=None):
+    try:
+        with timed("storage_load"):
+            return backend.load(file, expected_columns)
+    except Exception as e:
+        st.error(f"Error loading {file}: {e}")
+        return _empty(expected_columns)
+
+def save_csv(df, file):
+    try:
+        with timed("storage_write"):
+            backend.save(df, file)
+    except Exception as e:
+        st.error(f"Error saving {file}: {e}")
+
+# Persist a batch of changes: inserted row dicts plus (key column, updates frame)
+# pairs. df is the full table after the changes, for backends that rewrite files.
+def write_changes(file, df, inserted=(), updates=()):
+    try:
+        with timed("storage_write"):
+            return backend.write(file, df, inserted, updates)
+    except Exception as e:
+        st.error(f"Error saving {file}: {e}")
+
+# Persist (file, inserted, updates) changes to several tables as one commit:
+# either all of them are stored or none. Errors are raised to the caller.
+def write_atomic(changes):
+    with timed("storage_write"):
+        return backend.write_atomic(changes)
+
+
+def _status_from_flags(status):
+    # Status rows that only carry the approved flag
+    if "status" in status.columns:
+        return status["status"]
+    if "approved" in status.columns:
+        approved = status["approved"].astype(str).str.lower().isin(["true", "1", "yes"])
+        return pd.Series(np.where(approved, "approved", "declined"), index=status.index)
+    return pd.Series("pending", index=status.index)
+
+
+def reconcile_loan_status(target=None):
+    """Fold the old loan_status table into the loan applications and retire it.
+
+    Loan status used to be written to both tables, which drifted apart. The
+    applications are kept as the source of truth: their status wins where
+    the two disagree. What only the status table has (its risk levels, and
+    loans missing from the applications) is carried over. The status table
+    is then renamed out of the way (loan_status.csv.migrated, or
+    loan_status_migrated in SQLite). Returns a summary dict, or None if
+    there was nothing to reconcile.
+
+    It only runs when asked to: ``python storage.py reconcile-loans``, or as
+    the first step of ``python storage.py migrate``.
+    """
+    target = target or backend
+    with getattr(target, "commit_lock", None) or contextlib.nullcontext():
+        if not target.exists(loan_status_file):
+            return None
+        status = target.load(loan_status_file)
+        loans = target.load(loans_file, loan_columns)
+        summary = {"status_rows": len(status), "added": 0, "conflicts": 0, "risk_levels": 0}
+        if "loan_id" in status.columns and not status.empty:
+            status = status.drop_duplicates("loan_id", keep="last").set_index("loan_id", drop=False)
+            derived = _status_from_flags(status)
+            known = loans["loan_id"].isin(status.index)
+            loan_ids = loans.loc[known, "loan_id"]
+            summary["conflicts"] = int((loans.loc[known, "status"].astype(str).to_numpy()
+                                        != derived.loc[loan_ids].astype(str).to_numpy()).sum())
+
+            if "risk_level" in status.columns:
+                risk = loans["loan_id"].map(status["risk_level"])
+                fill = loans["risk_level"].isna() & risk.notna()
+                summary["risk_levels"] = int(fill.sum())
+                if fill.any():
+                    set_values(loans, fill, "risk_level", risk[fill].to_numpy())
+
+            missing = status[~status.index.isin(loans["loan_id"])]
+            if not missing.empty:
+                added = missing[[c for c in loan_columns if c in missing.columns]].reset_index(drop=True)
+                added["status"] = _status_from_flags(missing).to_numpy()
+                if "remarks" not in missing.columns:
+                    added["remarks"] = "Recovered from loan_status"
+                loans = normalize_mixed_columns(concat_rows(loans, added, loan_dtypes, ignore_index=True))
+                summary["added"] = len(added)
+
+        target.save(loans, loans_file)
+        target.retire(loan_status_file)
+        return summary
+
+
+# One-shot copy of the CSV tables (including any ledger segments) into SQLite
+def migrate_to_sqlite(path=SQLITE_PATH):
+    transactions = "partitioned" if PartitionedStore(transactions_file, transaction_columns).has_data() else "ledger"
+    source, target = CsvBackend(transactions), SqliteBackend(path)
+    reconcile_loan_status(source)
+    for file, spec in table_specs.items():
+        df = source.load(file, spec["columns"])
+        if df.empty:
+            # Without rows every column would be typed TEXT; the first write creates the table
+            print(f"{file}: no rows, skipped")
+            continue
+        target.save(df, file)
+        print(f"{file} -> {path} table {target.table_name(file)} ({len(df)} rows)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Storage maintenance for the bank app")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("compact", help="fold ledger segments into a Parquet snapshot")
+    migrate = commands.add_parser("migrate", help="copy data/*.csv into a SQLite database")
+    migrate.add_argument("--db", default=SQLITE_PATH)
+    commands.add_parser("reconcile-loans", help="fold loan_status into loan_applications and retire it")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        for ledger in getattr(backend, "ledgers", {}).values():
+            print(f"{ledger.file}: {ledger.compact() or 'nothing to compact'}")
+    elif args.command == "migrate":
+        migrate_to_sqlite(args.db)
+    elif args.command == "reconcile-loans":
+        print(reconcile_loan_status() or "nothing to reconcile")
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+from tables import TableView, accounts_table, loans_table, transactions_table
+
+# Loans in these states still have EMIs to pay
+active_statuses = ("approved",)
+
+
+def _repayments(rows):
+    # Loan repayments only: transfers and deposits have no loan_id
+    loan_ids = rows["loan_id"]
+    return rows[loan_ids.notna() & (loan_ids.astype(str) != "")]
+
+
+class LoanPayments(TableView):
+    """Number of payments and total paid per user and loan.
+
+    Built with one groupby over the transactions, then adjusted as payments
+    are stored, so the EMI pages never filter the transaction rows.
+    """
+
+    def __init__(self, table):
+        super().__init__(table)
+        self._paid = {}
+        self._counts = None
+
+    def build(self, df):
+        self._paid = {}
+        if "loan_id" not in df.columns:
+            return
+        grouped = _repayments(df).groupby(["user_id", "loan_id"], observed=True)["amount"].agg(["size", "sum"])
+        for (user_id, loan_id), count, total in zip(grouped.index, grouped["size"], grouped["sum"]):
+            self._paid.setdefault(user_id, {})[loan_id] = [int(count), float(total)]
+        self._counts = None
+
+    def _apply(self, rows, sign):
+        if "loan_id" not in rows.columns:
+            return
+        paid = _repayments(rows)
+        for user_id, loan_id, amount in zip(paid["user_id"].tolist(), paid["loan_id"].tolist(),
+                                            pd.to_numeric(paid["amount"], errors="coerce").tolist()):
+            loans = self._paid.setdefault(user_id, {})
+            entry = loans.setdefault(loan_id, [0, 0.0])
+            entry[0] += sign
+            entry[1] += sign * (0.0 if pd.isna(amount) else amount)
+            if entry[0] <= 0:
+                del loans[loan_id]
+                if not loans:
+                    del self._paid[user_id]
+        self._counts = None
+
+    def inserted(self, rows):
+        self._apply(rows, 1)
+
+    def updated(self, before, after):
+        self._apply(before, -1)
+        self._apply(after, 1)
+
+    def for_user(self, user_id):
+        """``{loan_id: (payments, total paid)}`` for one user."""
+        with self.table._lock:
+            if not self.ready and self.table._pushdown("user_id"):
+                # Only this user's rows are read (their partitions, or an indexed query)
+                paid = _repayments(self.table.rows("user_id", user_id))
+                grouped = paid.groupby("loan_id", observed=True)["amount"].agg(["size", "sum"])
+                return {loan_id: (int(count), float(total)) for loan_id, count, total in
+                        zip(grouped.index, grouped["size"], grouped["sum"])}
+            self.ensure()
+            return {loan_id: tuple(entry) for loan_id, entry in self._paid.get(user_id, {}).items()}
+
+
+    def counts(self, user_ids, loan_ids):
+        """Payment counts for many (user, loan) pairs at once, as an int array."""
+        with self.table._lock:
+            self.ensure()
+            if self._counts is None:
+                self._counts = pd.DataFrame(
+                    [(user_id, loan_id, entry[0]) for user_id, loans in self._paid.items() for loan_id, entry in loans.items()],
+                    columns=["user_id", "loan_id", "count"],
+                )
+            paid = self._counts
+        user_ids, loan_ids = np.asarray(user_ids), pd.Series(loan_ids).reset_index(drop=True)
+        # One factorize over both sides turns the string join into integer indexing
+        codes, uniques = pd.factorize(pd.concat([loan_ids, paid["loan_id"]], ignore_index=True))
+        position = np.full(len(uniques) + 1, -1)
+        position[codes[:len(loan_ids)]] = np.arange(len(loan_ids))
+        rows = position[codes[len(loan_ids):]]
+        match = rows >= 0
+        match[match] = user_ids[rows[match]] == paid["user_id"].to_numpy()[match]
+        result = np.zeros(len(loan_ids), dtype=int)
+        np.add.at(result, rows[match], paid["count"].to_numpy()[match])
+        return result
+
+
+class UserLoans(TableView):
+    """Each user's loans as ``{loan_id: (status, amount, application_date, tenure_months)}``."""
+
+    def __init__(self, table):
+        super().__init__(table)
+        self._loans = {}
+
+    def build(self, df):
+        self._loans = {}
+        self._apply_rows(df)
+
+    def _apply_rows(self, rows):
+        tenures = rows["tenure_months"].tolist() if "tenure_months" in rows.columns else [None] * len(rows)
+        for user_id, loan_id, status, amount, applied, tenure in zip(
+            rows["user_id"].tolist(), rows["loan_id"].tolist(), rows["status"].tolist(),
+            rows["amount"].tolist(), rows["application_date"].tolist(), tenures,
+        ):
+            self._loans.setdefault(user_id, {})[loan_id] = (status, amount, applied, tenure)
+
+    def _remove_rows(self, rows):
+        for user_id, loan_id in zip(rows["user_id"].tolist(), rows["loan_id"].tolist()):
+            loans = self._loans.get(user_id)
+            if loans is not None:
+                loans.pop(loan_id, None)
+                if not loans:
+                    del self._loans[user_id]
+
+    def inserted(self, rows):
+        self._apply_rows(rows)
+
+    def updated(self, before, after):
+        self._remove_rows(before)
+        self._apply_rows(after)
+
+    def for_user(self, user_id):
+        with self.table._lock:
+            self.ensure()
+            return dict(self._loans.get(user_id, {}))
+
+
+loan_payments = LoanPayments(transactions_table)
+user_loans = UserLoans(loans_table)
+
+
+def account_summary(user_id, tenure_months=12):
+    """One user's balance and loans, read from the precomputed views.
+
+    Returns ``{"balance", "active_loans", "emis_paid", "total_paid", "loans"}``
+    where ``loans`` has one row per loan with its status, EMIs paid and
+    remaining and the total paid towards it. ``tenure_months`` is used for
+    loans that don't have their own.
+    """
+    account = accounts_table.rows("user_id", user_id)
+    balance = float(account["balance"].iloc[0]) if not account.empty and pd.notna(account["balance"].iloc[0]) else 0.0
+    paid = loan_payments.for_user(user_id)
+    loans = pd.DataFrame(
+        [
+            (loan_id, status, amount, applied, tenure, *paid.get(loan_id, (0, 0.0)))
+            for loan_id, (status, amount, applied, tenure) in user_loans.for_user(user_id).items()
+        ],
+        columns=["loan_id", "status", "amount", "application_date", "tenure_months", "emis_paid", "total_paid"],
+    )
+    tenure = pd.to_numeric(loans["tenure_months"], errors="coerce").fillna(tenure_months)
+    loans["tenure_months"] = tenure.astype(int)
+    loans["emis_remaining"] = (tenure - loans["emis_paid"]).clip(lower=0).astype(int)
+    # Payments against loan ids that aren't (or are no longer) in the loan table
+    known = set(loans["loan_id"])
+    orphans = [(loan_id, None, None, None, tenure_months, count, total, 0) for loan_id, (count, total) in paid.items()
+               if loan_id not in known]
+    if orphans:
+        loans = pd.concat([loans, pd.DataFrame(orphans, columns=loans.columns)], ignore_index=True)
+    active = loans["status"].isin(active_statuses)
+    return {
+        "balance": balance,
+        "active_loans": int(active.sum()),
+        "emis_paid": int(loans["emis_paid"].sum()),
+        "total_paid": float(loans["total_paid"].sum()),
+        "loans": loans,
+    }
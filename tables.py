@@ -0,0 +1,387 @@
+import threading
+import contextlib
+import numpy as np
+import pandas as pd
+from storage import (
+    users_file, accounts_file, loans_file, transactions_file,
+    table_specs, backend, normalize_mixed_columns, load_csv, save_csv, write_changes, write_atomic,
+)
+from schema import set_values, concat_rows
+
+# Sessions read shared frames and write to shallow copies, so every write
+# must copy the touched data first. pandas >= 3 always behaves this way.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Sorted row orders kept per table for paging, one per (filter, sort) combination
+max_cached_orders = 16
+
+
+def file_version(file):
+    return backend.version(file)
+
+
+class HashIndex:
+    """Maps each value of one column to the row labels holding it."""
+
+    def __init__(self, df, column):
+        self.column = column
+        # Group labels by key with one stable sort; NaN keys get code -1 and sort first
+        codes, uniques = pd.factorize(df[column])
+        order = np.argsort(codes, kind="stable")
+        labels = df.index.to_numpy()[order].tolist()
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1)).tolist()
+        # Each key maps to an insertion-ordered set (dict) of labels, so removal is O(1)
+        self._map = {key: dict.fromkeys(labels[bounds[i]:bounds[i + 1]]) for i, key in enumerate(list(uniques))}
+
+    def get(self, key):
+        return list(self._map.get(key, ()))
+
+    def count(self, key):
+        return len(self._map.get(key, ()))
+
+    def add(self, label, key):
+        if not pd.isna(key):
+            self._map.setdefault(key, {})[label] = None
+
+    def remove(self, label, key):
+        labels = self._map.get(key)
+        if labels is not None:
+            labels.pop(label, None)
+            if not labels:
+                del self._map[key]
+
+
+class TableView:
+    """Data derived from a Table and kept in step with its writes.
+
+    Subclasses implement ``build(df)`` for a full rebuild, and
+    ``inserted(rows)`` / ``updated(before, after)`` to apply a write
+    incrementally. Views are built lazily on first use and thrown away
+    whenever the table is re-read from disk or replaced wholesale.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.ready = False
+        table.views.append(self)
+
+    def reset(self):
+        self.ready = False
+
+    def ensure(self):
+        with self.table._lock:
+            df = self.table.load()
+            if not self.ready:
+                self.build(df)
+                self.ready = True
+
+    def build(self, df):
+        raise NotImplementedError
+
+    def inserted(self, rows):
+        raise NotImplementedError
+
+    def updated(self, before, after):
+        raise NotImplementedError
+
+
+class Table:
+    """One parsed copy of a CSV table, shared read-only by every session in the process.
+
+    The table is re-read only when the backend reports a new version (file
+    mtime/size, ledger segments or SQLite table version) or ``invalidate()``
+    is called. Writes go through ``insert()``/``update()``/``update_many()``/
+    ``save()``, which swap in a new frame, keep the hash indexes on ``key``
+    and ``indexes`` columns up to date incrementally and persist only the
+    changed rows where the backend allows.
+    ``page()`` serves one sorted, filtered page at a time for the data grids.
+
+    With a backend that supports pushdown (SQLite, or the partitioned
+    transaction store for reads by user or date), lookups and writes on a
+    table that hasn't been loaded go straight to storage instead of loading
+    the whole table.
+    """
+
+    def __init__(self, file, columns, key=None, indexes=(), dtypes=None):
+        self.file = file
+        self.columns = columns
+        self.dtypes = dtypes or {}
+        self.key = key
+        self.indexed = ([key] if key else []) + list(indexes)
+        self._lock = threading.RLock()
+        self._df = None
+        self._version = None
+        self._indexes = {}
+        self._pending = []
+        self._pending_updates = []
+        self._orders = {}
+        self.views = []
+
+    def _reset_views(self):
+        for view in self.views:
+            view.reset()
+
+    def _ready_views(self):
+        return [view for view in self.views if view.ready]
+
+    def _set(self, df, version):
+        self._df = df
+        self._version = version
+        self._indexes = {}
+        self._pending = []
+        self._pending_updates = []
+        self._orders = {}
+        self._reset_views()
+
+    @property
+    def loaded(self):
+        return self._df is not None
+
+    def _pushdown(self, column=None, write=False):
+        # Whether a read filtered on ``column`` (or a write) can go to the backend instead of loading the table
+        return self._df is None and backend.pushes_down(self.file, column, write)
+
+    def load(self):
+        version = file_version(self.file)
+        with self._lock:
+            if self._df is None or version != self._version:
+                self._set(load_csv(self.file, self.columns), version)
+            return self._df
+
+    def invalidate(self):
+        with self._lock:
+            self._set(None, None)
+
+    # Indexed reads
+    def _index(self, column):
+        index = self._indexes.get(column)
+        if index is None:
+            index = self._indexes[column] = HashIndex(self._df, column)
+        return index
+
+    def rows(self, column, key):
+        """Rows where ``column == key``, via the column's hash index."""
+        with self._lock:
+            if self._pushdown(column):
+                return backend.rows(self.file, column, key, self.columns)
+            df = self.load()
+            if column not in self.indexed:
+                return df[df[column] == key]
+            return df.loc[self._index(column).get(key)]
+
+    def count(self, column, key):
+        with self._lock:
+            if self._pushdown(column):
+                return backend.count(self.file, column, key)
+            df = self.load()
+            if column not in self.indexed:
+                return int((df[column] == key).sum())
+            return self._index(column).count(key)
+
+    def between(self, column, start, end):
+        """Rows with ``start <= column < end``, for date range queries."""
+        with self._lock:
+            if self._pushdown(column):
+                return backend.between(self.file, column, start, end, self.columns)
+            df = self.load()
+            return df[(df[column] >= pd.Timestamp(start)) & (df[column] < pd.Timestamp(end))]
+
+    def size(self):
+        """Number of rows; counted in the database, without loading the table, where possible."""
+        return self.page(0, 0)[1]
+
+    # Paged reads
+    def _ordered(self, column, key, sort_by, ascending):
+        # Row labels matching the filter in display order, cached until the next write
+        cache_key = (column, key, sort_by, ascending)
+        labels = self._orders.get(cache_key)
+        if labels is not None:
+            return labels
+        df = self._df
+        if column is None:
+            labels = df.index.to_numpy()
+        elif column in self.indexed:
+            labels = np.asarray(self._index(column).get(key), dtype=df.index.dtype)
+        else:
+            labels = df.index.to_numpy()[(df[column] == key).to_numpy()]
+        if sort_by is not None:
+            values = df.loc[labels, sort_by]
+            try:
+                labels = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+            except TypeError:
+                # Mixed ints and strings: order them as text
+                labels = values.astype(str).sort_values(ascending=ascending, kind="stable").index.to_numpy()
+        if len(self._orders) >= max_cached_orders:
+            self._orders.pop(next(iter(self._orders)))
+        self._orders[cache_key] = labels
+        return labels
+
+    def page(self, offset, limit, column=None, key=None, sort_by=None, ascending=True):
+        """Rows ``offset`` to ``offset + limit`` of the table (or of ``column == key``),
+        ordered by ``sort_by``. Returns ``(rows, total matching rows)``.
+
+        Only the requested page is copied out of the table.
+        """
+        with self._lock:
+            if self._pushdown(column):
+                return backend.page(self.file, offset, limit, column, key, sort_by, ascending, self.columns)
+            self.load()
+            labels = self._ordered(column, key, sort_by, ascending)
+            return self._df.loc[labels[offset:offset + limit]], len(labels)
+
+    def fresh_rows(self, column, key):
+        """Rows where ``column == key`` as currently stored, for read-check-write paths."""
+        # Always asks the backend: a same-size rewrite within one mtime tick
+        # doesn't change the cached version. A write follows, so no parse cache is written.
+        return backend.rows(self.file, column, key, self.columns, cache_parse=False)
+
+    # Writes
+    def save(self, df):
+        with self._lock:
+            save_csv(df, self.file)
+            self._set(df.copy(deep=False), file_version(self.file))
+
+    def persist(self):
+        with self._lock:
+            if not self._pending and not self._pending_updates:
+                return
+            # If someone else wrote since we loaded, drop the cached version so
+            # their changes are read next time
+            unchanged = file_version(self.file) == self._version
+            write_changes(self.file, self._df, self._pending, self._pending_updates)
+            self._pending = []
+            self._pending_updates = []
+            self._version = file_version(self.file) if unchanged else None
+
+    def _apply_insert(self, rows):
+        self._orders = {}
+        df = self._df
+        start = int(df.index.max()) + 1 if len(df) else 0
+        new_rows = pd.DataFrame(rows, index=range(start, start + len(rows))).reindex(columns=df.columns)
+        df = normalize_mixed_columns(concat_rows(df, new_rows, self.dtypes))
+        self._df = df
+        for column, index in self._indexes.items():
+            for label, key in zip(new_rows.index, new_rows[column].tolist()):
+                index.add(label, key)
+        for view in self._ready_views():
+            view.inserted(df.loc[new_rows.index])
+
+    def _apply_updates(self, column, updates):
+        self._orders = {}
+        index = self._index(column) if column in self.indexed else HashIndex(self._df, column)
+        matches = [index.get(key) for key in updates[column].tolist()]
+        counts = np.fromiter((len(m) for m in matches), dtype=int, count=len(matches))
+        labels = [label for m in matches for label in m]
+        if not labels:
+            return 0
+        values = updates.drop(columns=[column]).iloc[np.repeat(np.arange(len(updates)), counts)]
+
+        views = self._ready_views()
+        before = self._df.loc[labels] if views else None
+        df = self._df.copy(deep=False)
+        for col in values.columns:
+            if col in self._indexes:
+                index = self._indexes[col]
+                for label, old, new in zip(labels, df.loc[labels, col].tolist(), values[col].tolist()):
+                    index.remove(label, old)
+                    index.add(label, new)
+            set_values(df, labels, col, values[col].to_numpy())
+        self._df = df
+        for view in views:
+            view.updated(before, df.loc[labels])
+        return len(labels)
+
+    def insert(self, rows, persist=True):
+        with self._lock:
+            if self._pushdown(write=True):
+                write_changes(self.file, None, rows)
+                return
+            self.load()
+            self._apply_insert(rows)
+            self._pending.extend(rows)
+            if persist:
+                self.persist()
+
+    def update(self, column, key, values, persist=True):
+        """Set ``values`` (a column -> value dict) on rows where ``column == key``."""
+        return self.update_many(column, pd.DataFrame([{column: key, **values}]), persist=persist)
+
+    def update_many(self, column, updates, persist=True):
+        """Bulk update: ``updates`` holds ``column`` plus the columns to set, one row per key."""
+        with self._lock:
+            if self._pushdown(write=True):
+                return write_changes(self.file, None, updates=[(column, updates)])
+            self.load()
+            count = self._apply_updates(column, updates)
+            if not count:
+                return 0
+            self._pending_updates.append((column, updates))
+            if persist:
+                self.persist()
+            return count
+
+
+def commit(changes):
+    """Store ``(table, inserted_rows, updates)`` changes to several tables atomically.
+
+    ``updates`` is a list of ``(column, frame)`` pairs as taken by
+    ``Table.update_many``. Table locks are taken in file order; tables that
+    are loaded apply the same changes in memory once the commit is stored.
+    """
+    tables = sorted({table.file: table for table, _, _ in changes}.values(), key=lambda t: t.file)
+    with contextlib.ExitStack() as stack:
+        for table in tables:
+            stack.enter_context(table._lock)
+        unchanged = {table.file: table.loaded and file_version(table.file) == table._version for table in tables}
+        write_atomic([(table.file, inserted, updates) for table, inserted, updates in changes])
+        for table, inserted, updates in changes:
+            if unchanged[table.file]:
+                if inserted:
+                    table._apply_insert(inserted)
+                for column, frame in updates:
+                    table._apply_updates(column, frame)
+        for table in tables:
+            if table.loaded:
+                table._version = file_version(table.file) if unchanged[table.file] else None
+
+
+class LoanStatusProjection(TableView):
+    """Each loan's current status, derived from the loan table.
+
+    Loan status is stored once, on the loan rows; this is the read-only
+    ``loan_id, user_id, status, approved, risk_level, remarks`` view that
+    used to be kept as a second table. It is rebuilt lazily after a write.
+    """
+
+    columns = ["loan_id", "user_id", "status", "approved", "risk_level", "remarks"]
+
+    def __init__(self, table):
+        super().__init__(table)
+        self._frame = None
+
+    def build(self, df):
+        self._frame = None
+
+    def inserted(self, rows):
+        self._frame = None
+
+    def updated(self, before, after):
+        self._frame = None
+
+    def frame(self):
+        with self.table._lock:
+            self.ensure()
+            if self._frame is None:
+                df = self.table.load()
+                self._frame = df[[c for c in self.columns if c in df.columns and c != "approved"]].assign(
+                    approved=df["status"] == "approved")[self.columns]
+            return self._frame
+
+
+users_table = Table(users_file, **table_specs[users_file])
+accounts_table = Table(accounts_file, **table_specs[accounts_file])
+loans_table = Table(loans_file, **table_specs[loans_file])
+transactions_table = Table(transactions_file, **table_specs[transactions_file])
+
+loan_status = LoanStatusProjection(loans_table)
@@ -0,0 +1,48 @@
+"""EMIs, balances and repayment schedules."""
+import numpy as np
+import pandas as pd
+import pytest
+from amortization import emi, balance_after, due_dates, schedule
+
+
+def _closed_form(principal, annual_rate, n):
+    r = annual_rate / 1200
+    return principal * r * (1 + r) ** n / ((1 + r) ** n - 1)
+
+
+@pytest.mark.parametrize("principal, annual_rate, n", [(100000, 10, 12), (250000, 8.5, 60), (5000, 24, 6), (1, 1, 1)])
+def test_emi_matches_the_closed_form(principal, annual_rate, n):
+    assert emi(principal, annual_rate, n) == round(_closed_form(principal, annual_rate, n), 2)
+
+
+def test_emi_prices_many_loans_at_once():
+    principal, rate, n = np.array([100000, 50000, 1200]), np.array([10, 12, 0]), np.array([12, 24, 12])
+    expected = [round(_closed_form(p, r, k), 2) if r else p / k for p, r, k in zip(principal, rate, n)]
+    assert emi(principal, rate, n).tolist() == expected
+
+
+def test_zero_interest_loan_is_repaid_in_equal_parts():
+    assert emi(1200, 0, 12) == 100.0
+    assert balance_after(1200, 0, 12, [0, 1, 6, 12, 20]).tolist() == [1200.0, 1100.0, 600.0, 0.0, 0.0]
+    plan = schedule(1200, 0, 12, "2024-01-15")
+    assert (plan["Interest"] == 0).all() and (plan["Principal"] == 100.0).all()
+    assert plan["Balance"].iloc[-1] == 0
+
+
+@pytest.mark.parametrize("principal, annual_rate, n", [(100000, 10, 12), (99999.99, 13.7, 37), (1000, 7, 5)])
+def test_last_installment_clears_the_rounding(principal, annual_rate, n):
+    plan = schedule(principal, annual_rate, n, "2024-01-31")
+    assert len(plan) == n
+    assert plan["Balance"].iloc[-1] == 0 and (plan["Balance"].iloc[:-1] > 0).all()
+    assert plan["Principal"].sum() == pytest.approx(principal, abs=0.01)
+    # Every earlier installment splits the EMI exactly; the last is off by at most the accumulated rounding
+    paid = plan["Principal"] + plan["Interest"]
+    assert (paid.iloc[:-1].round(2) == plan["EMI Amount"].iloc[0]).all()
+    assert abs(paid.iloc[-1] - plan["EMI Amount"].iloc[0]) < 0.01 * n
+
+
+def test_schedule_status_and_month_end_due_dates():
+    plan = schedule(1000, 12, 4, "2024-01-31", paid=2)
+    assert plan["Status"].tolist() == ["Paid", "Paid", "Due", "Upcoming"]
+    assert [str(d) for d in plan["Due Date"]] == ["2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30"]
+    assert str(due_dates(pd.Timestamp("2023-01-31"), 1)[0]) == "2023-02-28"
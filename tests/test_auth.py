@@ -0,0 +1,122 @@
+"""Password hashing and upgrades, login rate limits and session tokens."""
+import os
+import pandas as pd
+import pytest
+import auth
+import storage
+from tables import users_table
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def users(tmp_path, monkeypatch):
+    # Table paths are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(storage.data_path)
+    pd.DataFrame({"user_id": [1, 2, 3], "username": ["alice", "bob", "carol"],
+                  "password": ["plain-a", auth.hash_password("pw-b", 1000), auth.hash_password("pw-c", 1000)],
+                  "role": ["user", "user", "admin"]}).to_csv(storage.users_file, index=False)
+    clock = Clock()
+    monkeypatch.setattr(auth, "time", clock)
+    # Cheap hashes; the stored ones above use the same count, so they don't need a rehash
+    monkeypatch.setattr(auth, "PASSWORD_ITERATIONS", 1000)
+    monkeypatch.setattr(auth, "user_attempts", auth.RateLimiter(3, 60))
+    monkeypatch.setattr(auth, "ip_attempts", auth.RateLimiter(5, 60))
+    monkeypatch.setattr(auth, "sessions", auth.SessionTokens(auth.credentials, seconds=3600))
+    users_table.invalidate()
+    yield clock
+    users_table.invalidate()
+
+
+def _stored(username):
+    return storage.backend.load(storage.users_file).set_index("username").loc[username, "password"]
+
+
+def test_verify_password(monkeypatch):
+    monkeypatch.setattr(auth, "PASSWORD_ITERATIONS", 1000)
+    stored = auth.hash_password("secret")
+    assert auth.is_hashed(stored) and "secret" not in stored
+    # Salted: the same password hashes differently every time
+    assert auth.hash_password("secret") != stored
+    assert auth.verify_password("secret", stored) == (True, False)
+    assert auth.verify_password("wrong", stored) == (False, False)
+    assert auth.verify_password("secret", "secret") == (True, True)
+    assert auth.verify_password("secret", None) == (False, False)
+    assert auth.verify_password("secret", "pbkdf2_sha256$garbage") == (False, False)
+
+
+def test_plaintext_password_is_hashed_at_login(users):
+    token = auth.login("alice", "plain-a")
+    assert auth.sessions.user(token) == {"user_id": 1, "username": "alice", "role": "user"}
+    stored = _stored("alice")
+    assert auth.is_hashed(stored) and auth.verify_password("plain-a", stored) == (True, False)
+
+
+def test_legacy_hash_is_upgraded_at_login(users, monkeypatch):
+    monkeypatch.setattr(auth, "PASSWORD_ITERATIONS", 2000)
+    assert auth.verify_password("pw-b", _stored("bob")) == (True, True)
+    auth.login("bob", "pw-b")
+    assert _stored("bob").split("$")[1] == "2000"
+    assert auth.verify_password("pw-b", _stored("bob")) == (True, False)
+
+
+def test_lockout_after_failures_and_release_after_the_window(users):
+    for _ in range(3):
+        with pytest.raises(auth.LoginError, match="Invalid"):
+            auth.login("bob", "wrong")
+    # Locked out: even the right password is turned away
+    with pytest.raises(auth.LoginError, match="Too many"):
+        auth.login("bob", "pw-b")
+    users.now += 61
+    assert auth.login("bob", "pw-b")
+
+
+def test_unknown_usernames_are_limited_too(users):
+    for _ in range(3):
+        with pytest.raises(auth.LoginError, match="Invalid"):
+            auth.login("mallory", "x")
+    with pytest.raises(auth.LoginError, match="Too many"):
+        auth.login("mallory", "x")
+
+
+def test_successful_logins_dont_count_against_the_address(users):
+    for _ in range(10):
+        for username, password in (("bob", "pw-b"), ("carol", "pw-c")):
+            assert auth.login(username, password, ip="10.0.0.1")
+
+
+def test_failed_logins_lock_out_the_address(users):
+    for username in ("bob", "carol", "bob", "carol", "dave"):
+        with pytest.raises(auth.LoginError, match="Invalid"):
+            auth.login(username, "wrong", ip="10.0.0.1")
+    with pytest.raises(auth.LoginError, match="Too many"):
+        auth.login("carol", "pw-c", ip="10.0.0.1")
+    assert auth.login("carol", "pw-c", ip="10.0.0.2")
+
+
+def test_token_rejected_after_logout(users):
+    token = auth.login("bob", "pw-b")
+    auth.sessions.revoke(token)
+    assert auth.sessions.user(token) is None
+
+
+def test_token_rejected_after_password_change(users):
+    token = auth.login("bob", "pw-b")
+    other = auth.login("carol", "pw-c")
+    auth.set_password("bob", "new-pw")
+    assert auth.sessions.user(token) is None
+    assert auth.sessions.user(other)["username"] == "carol"
+    assert auth.sessions.user(auth.login("bob", "new-pw"))["username"] == "bob"
+
+
+def test_token_expires(users):
+    token = auth.login("bob", "pw-b")
+    users.now += 3601
+    assert auth.sessions.user(token) is None
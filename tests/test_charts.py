@@ -0,0 +1,28 @@
+"""Chart cache and chart mode setting."""
+import pandas as pd
+import pytest
+from charts import ChartCache, CHART_MODES, _chart_mode, data_hash
+
+
+def test_unknown_chart_mode_falls_back_to_the_default():
+    assert _chart_mode("matplotlib") == "matplotlib"
+    with pytest.warns(UserWarning, match="BANK_CHART_MODE"):
+        assert _chart_mode("svg") == CHART_MODES[0]
+
+
+def test_data_hash_follows_values_and_labels():
+    df = pd.DataFrame({"approved": [1, 2]}, index=["2024-01", "2024-02"])
+    assert data_hash(df) == data_hash(df.copy())
+    assert data_hash(df) != data_hash(df.assign(approved=[1, 3]))
+    assert data_hash(df) != data_hash(df.rename(columns={"approved": "declined"}))
+
+
+def test_chart_cache_renders_once_and_evicts_the_least_recently_used():
+    cache, renders = ChartCache(size=2), []
+
+    def render(key):
+        return lambda: renders.append(key) or key
+
+    for key in ("a", "b", "a", "c", "a", "b"):
+        cache.get(key, render(key))
+    assert renders == ["a", "b", "c", "b"]
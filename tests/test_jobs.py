@@ -0,0 +1,106 @@
+"""Job queue: idempotent submits, one claim per job, and recovery from dead workers."""
+import os
+import multiprocessing as mp
+import pytest
+import jobs
+from jobs import JobQueue
+
+fork = mp.get_context("fork")
+
+
+def _queue(directory):
+    # No worker threads: the tests claim and run jobs themselves
+    queue = JobQueue(str(directory), workers=0)
+    queue.handler("echo")(lambda params, progress: params)
+    return queue
+
+
+def _claim_and_exit(directory, conn):
+    # A worker that claims a job and dies before finishing it
+    job = _queue(directory)._claim()
+    conn.send(job and job["id"])
+    os._exit(0)
+
+
+def _claim_once(directory, conn):
+    job = _queue(directory)._claim()
+    conn.send(job and job["id"])
+    # Stay alive until every worker has tried, or the job would look abandoned
+    conn.recv()
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return tmp_path / "jobs"
+
+
+def test_submit_with_a_key_is_idempotent(directory):
+    queue = _queue(directory)
+    job = queue.submit("echo", {"n": 1}, key="k")
+    assert queue.submit("echo", {"n": 2}, key="k")["id"] == job["id"]
+    assert queue.submit("echo", {"n": 3})["id"] != job["id"]
+    assert len(queue.jobs("echo")) == 2
+    with pytest.raises(ValueError):
+        queue.submit("missing")
+
+
+def test_failed_job_is_queued_again_under_its_key(directory):
+    queue = _queue(directory)
+    job = queue.submit("echo", key="k")
+    queue._write({**job, "status": "failed"})
+    assert queue.submit("echo", key="k")["status"] == "queued"
+
+
+def test_a_job_is_claimed_once(directory):
+    queue, other = _queue(directory), _queue(directory)
+    job = queue.submit("echo", {"n": 1})
+    assert queue._claim()["id"] == job["id"]
+    assert other._claim() is None and queue._claim() is None
+    assert queue.get(job["id"])["status"] == "running"
+
+
+def test_a_job_is_claimed_once_across_processes(directory):
+    job = _queue(directory).submit("echo")
+    pipes = [fork.Pipe() for _ in range(4)]
+    processes = [fork.Process(target=_claim_once, args=(directory, child)) for _, child in pipes]
+    for process in processes:
+        process.start()
+    claimed = [conn.recv() for conn, _ in pipes]
+    for (conn, _), process in zip(pipes, processes):
+        conn.send(None)
+        process.join()
+    assert claimed.count(job["id"]) == 1 and claimed.count(None) == 3
+
+
+def test_job_of_a_dead_worker_is_requeued_and_run(directory):
+    queue = _queue(directory)
+    job = queue.submit("echo", {"n": 1})
+    conn, child = fork.Pipe()
+    process = fork.Process(target=_claim_and_exit, args=(directory, child))
+    process.start()
+    assert conn.recv() == job["id"]
+    process.join()
+
+    claimed = queue._claim()
+    assert claimed["id"] == job["id"] and claimed["attempts"] == 2
+    assert claimed["owner"]["pid"] == os.getpid()
+    queue._run(claimed)
+    assert queue.get(job["id"])["status"] == "done"
+    assert queue.get(job["id"])["result"] == {"n": 1}
+
+
+def test_job_without_heartbeats_is_requeued_until_it_gives_up(directory, monkeypatch):
+    queue = _queue(directory)
+    job = queue.submit("echo")
+    now = jobs._now()
+    for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+        monkeypatch.setattr(jobs, "_now", lambda: now)
+        claimed = queue._claim()
+        assert claimed["id"] == job["id"] and claimed["attempts"] == attempt
+        # Its worker, on another host, goes quiet
+        queue._write({**claimed, "owner": {"host": "elsewhere", "pid": 1}})
+        assert queue._claim() is None
+        now += jobs.STALE_SECONDS + 1
+    monkeypatch.setattr(jobs, "_now", lambda: now)
+    assert queue._claim() is None
+    assert queue.get(job["id"])["status"] == "failed"
@@ -0,0 +1,10 @@
+"""Risk scores carried in loan remarks."""
+from scoring import risk_score_from_remarks, decision_remarks
+
+
+def test_decision_remarks_keep_the_risk_score_only_when_there_is_one():
+    scored = "Average Risk. Risk Score: 42.5%. Awaiting review."
+    assert risk_score_from_remarks(scored) == "42.5"
+    assert decision_remarks("approved", scored) == "Admin-approved. Risk Score: 42.5%"
+    assert decision_remarks("declined", "") == "Admin-declined."
+    assert decision_remarks("declined", float("nan")) == "Admin-declined."
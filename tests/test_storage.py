@@ -0,0 +1,303 @@
+"""Ledger recovery, compaction and rewrites, partitioned storage, and commit-journal replay."""
+import os
+import json
+import multiprocessing as mp
+import pandas as pd
+import pytest
+import storage
+from storage import Ledger, PartitionedStore, CsvBackend, transaction_columns, table_specs
+
+fork = mp.get_context("fork")
+
+
+def _row(tx_id, user_id=1, amount=10.0):
+    return {"transaction_id": tx_id, "user_id": user_id, "loan_id": "L1", "amount": amount,
+            "method": "UPI", "date": "2024-01-01"}
+
+
+def _ids(df):
+    return sorted(df["transaction_id"].tolist())
+
+
+def _appender(file, conn):
+    # Another app process: appends what it's sent, keeping its segment open between appends
+    ledger = Ledger(file, transaction_columns)
+    for tx_id in iter(conn.recv, None):
+        ledger.append([_row(tx_id)])
+        conn.send(tx_id)
+    ledger.close()
+    conn.send("closed")
+
+
+def _crash_after_append(file, tx_id):
+    Ledger(file, transaction_columns).append([_row(tx_id)])
+    # Exit without sealing the segment, as if the process was killed
+    os._exit(0)
+
+
+@pytest.fixture
+def file(tmp_path):
+    return str(tmp_path / "transactions.csv")
+
+
+@pytest.fixture
+def other_process(file):
+    conn, child = fork.Pipe()
+    process = fork.Process(target=_appender, args=(file, child))
+    process.start()
+
+    def append(tx_id):
+        conn.send(tx_id)
+        assert conn.recv() == tx_id
+
+    yield append
+    conn.send(None)
+    conn.recv()
+    process.join()
+
+
+def test_read_returns_base_csv_and_segments(file):
+    pd.DataFrame([_row("T1")]).to_csv(file, index=False)
+    ledger = Ledger(file, transaction_columns)
+    ledger.append([_row("T2"), _row("T3")])
+    assert _ids(Ledger(file, transaction_columns).read()) == ["T1", "T2", "T3"]
+
+
+def test_appends_keep_columns_outside_the_ledger_columns(file):
+    ledger = Ledger(file, transaction_columns)
+    ledger.append([_row("T1")])
+    ledger.append([{**_row("T2"), "type": "deposit", "description": "Imported"}])
+    ledger.append([_row("T3")])
+    df = Ledger(file, transaction_columns).read().set_index("transaction_id")
+    assert df.loc["T2", "description"] == "Imported"
+    assert df["type"].isna().tolist() == [True, False, True]
+
+
+def test_segments_of_dead_writers_are_recovered(file):
+    process = fork.Process(target=_crash_after_append, args=(file, "T1"))
+    process.start()
+    process.join()
+    ledger = Ledger(file, transaction_columns)
+    assert any(active for _, _, active, _ in ledger._segments())
+
+    ledger.append([_row("T2")])
+    assert not any(active for _, pid, active, _ in ledger._segments() if pid == process.pid)
+    assert _ids(Ledger(file, transaction_columns).read()) == ["T1", "T2"]
+
+
+def test_compaction_folds_sealed_segments_into_a_snapshot(file):
+    ledger = Ledger(file, transaction_columns, segment_rows=2, compact_after=100)
+    for i in range(7):
+        ledger.append([_row(f"T{i}")])
+    snapshot = ledger.compact()
+
+    assert snapshot is not None and os.path.exists(snapshot)
+    assert [seq for seq, _, active, _ in ledger._segments() if not active] == []
+    assert _ids(Ledger(file, transaction_columns).read()) == [f"T{i}" for i in range(7)]
+    # Nothing new sealed: the same snapshot is kept
+    assert ledger.compact() == snapshot
+
+
+def test_compaction_leaves_other_processes_active_segments(file, other_process):
+    other_process("TB1")
+    ledger = Ledger(file, transaction_columns, segment_rows=1)
+    ledger.append([_row("TA1")])
+    ledger.append([_row("TA2")])
+    ledger.compact()
+    other_process("TB2")
+    assert _ids(Ledger(file, transaction_columns).read()) == ["TA1", "TA2", "TB1", "TB2"]
+
+
+def test_read_starts_over_when_compaction_removes_a_listed_segment(file, monkeypatch):
+    ledger = Ledger(file, transaction_columns, segment_rows=1, compact_after=100)
+    for i in range(3):
+        ledger.append([_row(f"T{i}")])
+    read_csv = storage.read_csv
+
+    def compact_first(path):
+        # Compaction runs after the reader has listed the segments, but before it opens them
+        monkeypatch.setattr(storage, "read_csv", read_csv)
+        ledger.compact()
+        return read_csv(path)
+
+    monkeypatch.setattr(storage, "read_csv", compact_first)
+    assert _ids(Ledger(file, transaction_columns).read()) == ["T0", "T1", "T2"]
+    assert ledger._snapshot()[0] is not None
+
+
+def test_rewrite_replaces_the_table(file):
+    ledger = Ledger(file, transaction_columns)
+    ledger.append([_row("T1"), _row("T2")])
+    df = ledger.read()
+    ledger.rewrite(df[df["transaction_id"] == "T2"])
+    ledger.append([_row("T3")])
+    assert _ids(Ledger(file, transaction_columns).read()) == ["T2", "T3"]
+
+
+def test_rewrite_keeps_rows_other_processes_append_afterwards(file, other_process):
+    other_process("TB1")
+    ledger = Ledger(file, transaction_columns)
+    with ledger.lock:
+        df = ledger.read()
+        ledger.rewrite(df.assign(amount=df["amount"] * 2))
+    other_process("TB2")
+
+    df = Ledger(file, transaction_columns).read()
+    assert _ids(df) == ["TB1", "TB2"]
+    assert df.set_index("transaction_id")["amount"].to_dict() == {"TB1": 20.0, "TB2": 10.0}
+    ledger.compact()
+    assert _ids(Ledger(file, transaction_columns).read()) == ["TB1", "TB2"]
+
+
+def _dated(tx_id, user_id, date):
+    return {**_row(tx_id, user_id), "date": date}
+
+
+def _store(file, readers=1):
+    return PartitionedStore(file, transaction_columns, table_specs[storage.transactions_file]["dtypes"],
+                            buckets=4, readers=readers)
+
+
+def _check_manifest(store):
+    # Every partition listed holds exactly its rows, and nothing is stored outside the manifest
+    partitions = store._manifest()["partitions"]
+    for name, info in partitions.items():
+        df = pd.read_parquet(store._path(name))
+        assert len(df) == info["rows"] > 0
+        assert {store._name(key) for key in store._keys(df, 4)} == {name}
+        assert name == f"b{info['bucket']:03d}-{info['month']}"
+    stored = {f[:-len(".parquet")] for f in os.listdir(store.dir) if f.endswith(".parquet")}
+    assert stored == set(partitions)
+
+
+sample = [_dated("T1", 1, "2024-01-05"), _dated("T2", 1, "2024-02-10"), _dated("T3", 2, "2024-01-20"),
+          _dated("T4", 3, "2024-03-01"), _dated("T5", 2, None)]
+
+
+def test_partitions_route_rows_by_user_bucket_and_month(file):
+    store = _store(file)
+    store.append(sample)
+    _check_manifest(store)
+    bucket = store.bucket
+    expected = {f"b{bucket(1):03d}-2024-01", f"b{bucket(1):03d}-2024-02", f"b{bucket(2):03d}-2024-01",
+                f"b{bucket(3):03d}-2024-03", f"b{bucket(2):03d}-none"}
+    assert set(store._manifest()["partitions"]) == expected
+    # The same user however its id is typed
+    assert bucket(2) == bucket(2.0) == bucket("2")
+    assert _ids(_store(file, readers=4).read()) == ["T1", "T2", "T3", "T4", "T5"]
+
+
+def test_reads_open_only_the_partitions_that_can_match(file, monkeypatch):
+    store = _store(file)
+    store.append(sample)
+    opened = []
+    read_partition = store._read_partition
+    monkeypatch.setattr(store, "_read_partition", lambda name: opened.append(name) or read_partition(name))
+
+    df = store.read(user_id=1)
+    assert {name[:4] for name in opened} == {f"b{store.bucket(1):03d}"}
+    assert set(_ids(df[df["user_id"] == 1])) == {"T1", "T2"}
+
+    opened.clear()
+    df = store.read(start="2024-01-01", end="2024-02-01")
+    assert {name[5:] for name in opened} == {"2024-01"}
+    assert _ids(df) == ["T1", "T3"]
+
+    opened.clear()
+    df = store.read(user_id=2, start="2024-01-01", end="2024-03-01")
+    assert opened == [f"b{store.bucket(2):03d}-2024-01"]
+    assert _ids(df) == ["T3"]
+
+
+def test_update_moves_rows_to_their_new_partition(file):
+    store = _store(file)
+    store.append(sample)
+    store.update("transaction_id", pd.DataFrame({"transaction_id": ["T4"], "date": ["2024-05-15"], "amount": [99.0]}))
+    _check_manifest(store)
+    partitions = store._manifest()["partitions"]
+    assert f"b{store.bucket(3):03d}-2024-03" not in partitions
+    assert f"b{store.bucket(3):03d}-2024-05" in partitions
+
+    store.update("transaction_id", pd.DataFrame({"transaction_id": ["T1"], "user_id": [3]}))
+    _check_manifest(store)
+    df = _store(file).read().set_index("transaction_id")
+    assert sorted(df.index) == ["T1", "T2", "T3", "T4", "T5"]
+    assert df.loc["T4", "amount"] == 99.0 and str(df.loc["T4", "date"].date()) == "2024-05-15"
+    assert df.loc["T1", "user_id"] == 3
+    assert "T1" in _ids(_store(file).read(user_id=3))
+
+
+def test_rewrite_replaces_every_partition(file):
+    store = _store(file)
+    store.append(sample)
+    store.rewrite(pd.DataFrame([_dated("T9", 4, "2025-06-01")]))
+    _check_manifest(store)
+    assert list(store._manifest()["partitions"]) == [f"b{store.bucket(4):03d}-2025-06"]
+    assert _ids(store.read()) == ["T9"]
+
+
+def test_first_use_splits_the_flat_csv(file):
+    pd.DataFrame(sample).to_csv(file, index=False)
+    store = _store(file)
+    assert _ids(store.read()) == ["T1", "T2", "T3", "T4", "T5"]
+    _check_manifest(store)
+    assert not os.path.exists(file) and os.path.exists(file + ".migrated")
+
+
+def test_first_use_splits_the_ledger(file):
+    pd.DataFrame(sample[:2]).to_csv(file, index=False)
+    ledger = Ledger(file, transaction_columns)
+    ledger.append(sample[2:])
+    ledger.close()
+    store = _store(file)
+    assert _ids(store.read()) == ["T1", "T2", "T3", "T4", "T5"]
+    _check_manifest(store)
+    assert not os.path.exists(ledger.dir) and os.path.isdir(ledger.dir + ".migrated")
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    # The backend's paths are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(storage.data_path)
+    pd.DataFrame([{"user_id": 1, "account_no": "A1", "address": "x", "mobile": "1", "balance": 100.0}]).to_csv(
+        storage.accounts_file, index=False)
+    backend = CsvBackend("ledger")
+    yield backend
+    for ledger in backend.ledgers.values():
+        ledger.close()
+
+
+def _journal(changes, complete=True):
+    with open(storage.commit_journal_file, "w") as f:
+        f.write(json.dumps(changes) + ("\n" if complete else ""))
+
+
+def _balance(backend):
+    return backend.load(storage.accounts_file)["balance"].tolist()
+
+
+def test_journaled_commit_is_replayed_once(backend):
+    changes = [
+        {"file": storage.transactions_file, "inserted": [_row("T1", amount=40.0)], "updates": []},
+        {"file": storage.accounts_file, "inserted": [], "updates": [["user_id", [{"user_id": 1, "balance": 60.0}]]]},
+    ]
+    _journal(changes)
+    backend.write_atomic([(storage.transactions_file, [_row("T2")], [])])
+    assert _ids(backend.load(storage.transactions_file)) == ["T1", "T2"]
+    assert _balance(backend) == [60.0]
+    assert open(storage.commit_journal_file).read() == ""
+
+    # Replaying a commit that was already (partly) applied changes nothing
+    _journal(changes)
+    backend.save(backend.load(storage.accounts_file), storage.accounts_file)
+    assert _ids(backend.load(storage.transactions_file)) == ["T1", "T2"]
+    assert _balance(backend) == [60.0]
+
+
+def test_cut_off_journal_is_discarded(backend):
+    _journal([{"file": storage.accounts_file, "inserted": [],
+               "updates": [["user_id", [{"user_id": 1, "balance": 0.0}]]]}], complete=False)
+    backend.write_atomic([(storage.transactions_file, [_row("T1")], [])])
+    assert _balance(backend) == [100.0]
+    assert open(storage.commit_journal_file).read() == ""
@@ -0,0 +1,56 @@
+"""Transfers: balances, the ledger rows they write, and what they leave on disk."""
+import os
+import pandas as pd
+import pytest
+import storage
+from storage import backend, accounts_file, transactions_file
+from tables import accounts_table, transactions_table
+from transfers import transfer, TransferError
+
+
+@pytest.fixture
+def bank(tmp_path, monkeypatch):
+    # Table and backend paths are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(storage.data_path)
+    pd.DataFrame({"user_id": [1, 2], "account_no": ["A1", "A2"], "address": "x", "mobile": "1",
+                  "balance": [100.0, 50.0]}).to_csv(accounts_file, index=False)
+    for table in (accounts_table, transactions_table):
+        table.invalidate()
+    yield
+    for ledger in getattr(backend, "ledgers", {}).values():
+        ledger.close()
+    for table in (accounts_table, transactions_table):
+        table.invalidate()
+
+
+def test_transfer_moves_money_and_records_both_sides(bank):
+    assert transfer(1, "A2", 30.0) == 2
+    assert backend.load(accounts_file).set_index("user_id")["balance"].to_dict() == {1: 70.0, 2: 80.0}
+    tx = backend.load(transactions_file)
+    assert sorted(tx["amount"].tolist()) == [-30.0, 30.0]
+
+
+def test_transfer_rejects_overdraft_and_own_account(bank):
+    with pytest.raises(TransferError):
+        transfer(2, "A1", 500.0)
+    with pytest.raises(TransferError):
+        transfer(1, "A1", 10.0)
+    assert backend.load(accounts_file)["balance"].tolist() == [100.0, 50.0]
+
+
+def test_transfer_writes_no_parse_cache(bank, monkeypatch):
+    # Every table is big enough to cache; a transfer replaces accounts.csv, so a cache of it would be stale at once
+    monkeypatch.setattr(storage, "PARQUET_CACHE_MIN_BYTES", 0)
+    written = []
+    write_parse_cache = storage._write_parse_cache
+
+    def recording(file, *args):
+        written.append(file)
+        return write_parse_cache(file, *args)
+
+    monkeypatch.setattr(storage, "_write_parse_cache", recording)
+    for _ in range(3):
+        transfer(1, "A2", 1.0)
+    assert written == []
+    assert not os.path.exists(storage._parse_cache_file(accounts_file))
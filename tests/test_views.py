@@ -0,0 +1,93 @@
+"""Incrementally maintained views agree with a fresh groupby after writes."""
+import os
+import pandas as pd
+import pytest
+import storage
+from storage import backend, loans_file, loan_columns, transactions_file
+from tables import loans_table, transactions_table
+from analytics import loan_cube
+from summaries import loan_payments, user_loans, _repayments
+
+
+def _loan(loan_id, user_id, amount, purpose, status, date):
+    return {"loan_id": loan_id, "user_id": user_id, "amount": amount, "purpose": purpose, "income": 50000.0,
+            "status": status, "application_date": date, "remarks": "", "interest_rate": 10.0, "tenure_months": 12,
+            "risk_level": "Low"}
+
+
+def _payment(tx_id, user_id, loan_id, amount):
+    return {"transaction_id": tx_id, "user_id": user_id, "loan_id": loan_id, "amount": amount, "method": "UPI",
+            "date": "2024-02-01"}
+
+
+@pytest.fixture
+def bank(tmp_path, monkeypatch):
+    # Table and backend paths are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(storage.data_path)
+    pd.DataFrame([_loan("L1", 1, 1000.0, "Car", "approved", "2024-01-05"),
+                  _loan("L2", 1, 500.0, "Home", "pending", "2024-01-05"),
+                  _loan("L3", 2, 800.0, "Car", "pending", "2024-01-09")], columns=loan_columns).to_csv(loans_file, index=False)
+    pd.DataFrame([_payment("T1", 1, "L1", 90.0), _payment("T2", 1, "L1", 90.0), _payment("T3", 2, "", 5.0)],
+                 columns=storage.transaction_columns).to_csv(transactions_file, index=False)
+    for table in (loans_table, transactions_table):
+        table.invalidate()
+    # Build every view first, so the writes below are applied to them incrementally
+    loan_cube.cells(), loan_payments.for_user(1), user_loans.for_user(1)
+    yield
+    for ledger in getattr(backend, "ledgers", {}).values():
+        ledger.close()
+    for table in (loans_table, transactions_table):
+        table.invalidate()
+
+
+def _write(monkeypatch):
+    # A rebuild would hide a wrong incremental update
+    for view in (loan_cube, loan_payments, user_loans):
+        monkeypatch.setattr(view, "build", lambda df: pytest.fail("view rebuilt"))
+    loans_table.insert([_loan("L4", 2, 300.0, "Education", "pending", "2024-01-09")])
+    loans_table.update_many("loan_id", pd.DataFrame({"loan_id": ["L2", "L3"], "status": ["approved", "declined"]}))
+    loans_table.update("loan_id", "L1", {"amount": 1200.0, "purpose": "Home", "application_date": "2024-01-06"})
+    loans_table.update("loan_id", "L4", {"user_id": 1})
+    transactions_table.insert([_payment("T4", 1, "L2", 40.0), _payment("T5", 2, "L4", 25.0)])
+    transactions_table.update("transaction_id", "T2", {"loan_id": "L2", "amount": 45.0})
+    transactions_table.update("transaction_id", "T3", {"loan_id": "L3"})
+
+
+def _cube_cells(df):
+    cells = loan_cube._cell_rows(df).groupby(["day", "status", "purpose"], observed=True)["amount"].agg(["size", "sum"])
+    return {(str(day.date()), str(status), str(purpose)): (int(count), round(total, 2))
+            for (day, status, purpose), count, total in zip(cells.index, cells["size"], cells["sum"])}
+
+
+def test_loan_cube_matches_a_fresh_groupby(bank, monkeypatch):
+    _write(monkeypatch)
+    frame = loan_cube.cells()
+    assert {(str(day.date()), str(status), str(purpose)): (int(count), round(amount, 2))
+            for day, status, purpose, count, amount in frame.itertuples(index=False)} == _cube_cells(loans_table.load())
+    assert ("2024-01-05", "approved", "Car") not in _cube_cells(loans_table.load())
+
+
+def test_loan_payments_match_a_fresh_groupby(bank, monkeypatch):
+    _write(monkeypatch)
+    df = transactions_table.load()
+    paid = _repayments(df).groupby(["user_id", "loan_id"], observed=True)["amount"].agg(["size", "sum"])
+    expected = {key: (int(count), float(total)) for key, count, total in zip(paid.index, paid["size"], paid["sum"])}
+    assert {(user_id, loan_id): entry for user_id in (1, 2)
+            for loan_id, entry in loan_payments.for_user(user_id).items()} == expected
+    assert expected == {(1, "L1"): (1, 90.0), (1, "L2"): (2, 85.0), (2, "L3"): (1, 5.0), (2, "L4"): (1, 25.0)}
+    loans = loans_table.load()
+    assert loan_payments.counts(loans["user_id"], loans["loan_id"]).tolist() == [
+        expected.get((user_id, loan_id), (0,))[0] for user_id, loan_id in zip(loans["user_id"], loans["loan_id"])]
+
+
+def test_user_loans_match_the_loan_rows(bank, monkeypatch):
+    _write(monkeypatch)
+    df = loans_table.load()
+    for user_id in (1, 2):
+        rows = df[df["user_id"] == user_id]
+        assert user_loans.for_user(user_id) == {
+            loan_id: (status, amount, applied, tenure) for loan_id, status, amount, applied, tenure in zip(
+                rows["loan_id"], rows["status"], rows["amount"], rows["application_date"], rows["tenure_months"])}
+    assert user_loans.for_user(1)["L1"][0:2] == ("approved", 1200.0)
+    assert user_loans.for_user(2)["L3"][0] == "declined" and "L4" not in user_loans.for_user(2)
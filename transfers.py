@@ -0,0 +1,81 @@
+import os
+import contextlib
+import pandas as pd
+from profiling import profiler
+from storage import data_path, FileLock, new_transaction_id, stable_bucket
+from tables import accounts_table, transactions_table, commit
+
+# Accounts hash onto this many lock stripes; each stripe is one lock file shared by every worker
+LOCK_STRIPES = 64
+locks_path = os.path.join(data_path, "locks")
+
+_stripes = [FileLock(os.path.join(locks_path, f"account-{i:02d}.lock")) for i in range(LOCK_STRIPES)]
+
+
+class TransferError(ValueError):
+    """A transfer that was rejected; the message is shown to the user."""
+
+
+def _stripe(key):
+    return stable_bucket(key, LOCK_STRIPES)
+
+
+@contextlib.contextmanager
+def account_locks(keys):
+    """Hold the locks of every account in ``keys``.
+
+    Stripes are always acquired in ascending order, so two transfers between
+    the same accounts in opposite directions can't deadlock.
+    """
+    with contextlib.ExitStack() as stack:
+        for stripe in sorted({_stripe(key) for key in keys}):
+            stack.enter_context(_stripes[stripe])
+        yield
+
+
+def _balance(user_id):
+    account = accounts_table.fresh_rows("user_id", user_id)
+    if account.empty:
+        raise TransferError("Account not found.")
+    return float(account["balance"].iloc[0])
+
+
+@profiler.timer("transfer")
+def transfer(sender_user_id, recipient_account_no, amount):
+    """Move ``amount`` from the sender's account to ``recipient_account_no``.
+
+    Both balances are re-read under the account locks, and the debit, the
+    credit and both transaction rows are stored as one commit. Returns the
+    recipient's user id.
+    """
+    if amount <= 0:
+        raise TransferError("Please enter a positive amount.")
+    recipient = accounts_table.fresh_rows("account_no", recipient_account_no)
+    if recipient.empty:
+        raise TransferError("Recipient account not found.")
+    recipient_user_id = recipient["user_id"].iloc[0]
+    if recipient_user_id == sender_user_id:
+        raise TransferError("You cannot transfer to your own account.")
+
+    with account_locks([sender_user_id, recipient_user_id]):
+        sender_balance = _balance(sender_user_id)
+        recipient_balance = _balance(recipient_user_id)
+        if amount > sender_balance:
+            raise TransferError("Insufficient balance.")
+
+        today = pd.Timestamp.today().strftime('%Y-%m-%d')
+        balances = pd.DataFrame({
+            "user_id": [sender_user_id, recipient_user_id],
+            "balance": [sender_balance - amount, recipient_balance + amount],
+        })
+        ledger_rows = [
+            {"transaction_id": new_transaction_id(), "user_id": sender_user_id, "loan_id": "",
+             "amount": -amount, "method": "Transfer Out", "date": today},
+            {"transaction_id": new_transaction_id(), "user_id": recipient_user_id, "loan_id": "",
+             "amount": amount, "method": "Transfer In", "date": today},
+        ]
+        try:
+            commit([(accounts_table, [], [("user_id", balances)]), (transactions_table, ledger_rows, [])])
+        except Exception as e:
+            raise TransferError(f"Transfer failed, no money was moved: {e}") from e
+    return recipient_user_id